@@ -0,0 +1,315 @@
+"""核心路径基准测试
+
+不需要显示器和硬件（使用 trigger_device_sim 模拟设备），测量：
+  - encode: 参数帧编码吞吐量（帧/秒）
+  - lookup: get_weapon_trigger_config 随配置大小（武器数量）变化的查找耗时
+  - apply: 一次完整武器切换（模式+全部参数）的CPU开销，不含帧间延时
+  - udp_rate: UDP监听线程可持续处理的最大消息速率（丢包率低于1%）
+  - udp_to_hid: 端到端延迟，从发出UDP数据报到模拟设备收到最后一帧（默认帧间延时）
+
+用法:
+    python benchmarks/run_benchmarks.py                     # 运行并与基准比较
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --update-baseline   # 用本次结果更新 baseline.json
+    python benchmarks/run_benchmarks.py --only encode lookup
+
+任一指标比基准差超过 --threshold（默认 25%）时退出码为1；带有 tolerance（多次测量的差距）的指标
+使用 tolerance 和 --threshold 中较大的一个。
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from trigger_core import TriggerDevice, TriggerPipeline, encode_report, get_weapon_trigger_config  # noqa: E402
+from trigger_device_sim import SimulatedHid  # noqa: E402
+from trigger_schema import CMD_TYPE_PARAM, PARAMS  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CONFIG_PATH = os.path.join(ROOT_DIR, "Sniper5_dx12.default.json")
+
+
+def _null_log(message):
+    pass
+
+
+def _result(value, unit, better, tolerance=None):
+    """tolerance: 指标本身的测量误差（相对值），比较时阈值不小于它"""
+    result = {"value": value, "unit": unit, "better": better}
+    if tolerance is not None:
+        result["tolerance"] = tolerance
+    return result
+
+
+def _make_pipeline(frame_delay=0, param_delay=0, udp_port=0):
+    sim = SimulatedHid()
+    device = TriggerDevice(_null_log, backend=sim)
+    device.frame_delay = frame_delay
+    pipeline = TriggerPipeline(device=device, log_handlers=[_null_log], udp_port=udp_port)
+    pipeline.param_delay = param_delay
+    pipeline.load_config(CONFIG_PATH)
+    device.connect()
+    return pipeline, sim
+
+
+def _make_config(weapon_count):
+    """生成包含 weapon_count 把武器的配置"""
+    return {
+        "vFilters": [
+            {"name": f"武器{i}", "trigger": {"right": {"mode": 1 + i % 4, "param": [10, 20, 30, 40]}}}
+            for i in range(weapon_count)
+        ],
+        "trigger_default": {"right": {"mode": 0, "param": [0, 0, 0, 0]}},
+    }
+
+
+def _best_rate(fn, iterations, repeats=15):
+    """重复测量 fn 执行 iterations 次的最快速率（次/秒）"""
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(iterations)
+        elapsed = time.perf_counter() - start
+        best = max(best, iterations / elapsed)
+    return best
+
+
+def bench_encode():
+    """参数帧编码吞吐量"""
+    spec = PARAMS["VIB_INTENSITY"]
+
+    def encode_compiled(n):
+        encode = spec.encode
+        for i in range(n):
+            encode(i & 0xFF)
+
+    def encode_generic(n):
+        for i in range(n):
+            encode_report(CMD_TYPE_PARAM, [spec.id, 0, i & 0xFF])
+
+    return {
+        "encode_param_frames_per_s": _result(_best_rate(encode_compiled, 20000), "frames/s", "higher"),
+        "encode_report_frames_per_s": _result(_best_rate(encode_generic, 20000), "frames/s", "higher"),
+    }
+
+
+def bench_lookup():
+    """get_weapon_trigger_config 查找耗时随配置大小的变化（查找最后一把武器）"""
+    results = {}
+    for size in (10, 100, 1000, 10000):
+        config = _make_config(size)
+        name = f"武器{size - 1}"
+        iterations = max(10, 50000 // size)
+
+        def lookup(n):
+            for _ in range(n):
+                get_weapon_trigger_config(config, name, _null_log)
+
+        rate = _best_rate(lookup, iterations)
+        results[f"lookup_{size}_us"] = _result(1e6 / rate, "us", "lower")
+    return results
+
+
+def bench_apply():
+    """完整武器切换的CPU开销（不含帧间延时）"""
+    pipeline, sim = _make_pipeline()
+    weapons = pipeline.weapon_names
+    iterations = 500
+
+    def apply(n):
+        for i in range(n):
+            pipeline.apply_weapon(weapons[i % len(weapons)])
+
+    rate = _best_rate(apply, iterations)
+    pipeline.device.close()
+    return {"apply_weapon_us": _result(1e6 / rate, "us", "lower")}
+
+
+UDP_RATE_STEP = 1.25
+
+
+def bench_udp_rate(step_seconds=0.3, runs=5):
+    """UDP监听线程可持续处理的最大消息速率
+
+    武器切换替换为空操作，只测量接收、解码、查找和状态来源的排队；
+    发送速率从1000条/秒起每级提高25%，直到丢包率超过1%。单次结果受调度影响很大，
+    重复 runs 次取中位数，各次之间的差距（至少两级速率）作为比较时的容差。
+    """
+    pipeline, sim = _make_pipeline()
+    processed = [0]
+
+    def apply_weapon(weapon_name):
+        processed[0] += 1
+        return False
+
+    pipeline.apply_weapon = apply_weapon
+    # 空操作的切换直接在UDP线程中执行，只测量UDP线程（使用执行线程时排队中的重复武器会被丢弃）
+    pipeline.dispatch = lambda fn: fn()
+    pipeline.start()
+    deadline = time.monotonic() + 2.0
+    while pipeline.udp_socket is None or pipeline.udp_socket.getsockname()[1] == 0:
+        if time.monotonic() > deadline:
+            raise RuntimeError("UDP服务器未启动")
+        time.sleep(0.01)
+    address = ("127.0.0.1", pipeline.udp_socket.getsockname()[1])
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    payload = pipeline.weapon_names[0].encode("utf-8")
+
+    def ramp():
+        best = 0
+        rate = 1000
+        while rate <= 500000:
+            processed[0] = 0
+            count = int(rate * step_seconds)
+            interval = 1.0 / rate
+            start = time.perf_counter()
+            for i in range(count):
+                target = start + i * interval
+                while time.perf_counter() < target:
+                    pass
+                sender.sendto(payload, address)
+            time.sleep(0.2)  # 等待处理完剩余的数据报
+            loss = 1 - processed[0] / count
+            if loss > 0.01:
+                break
+            best = rate
+            rate = int(rate * UDP_RATE_STEP)
+        return best
+
+    rates = [ramp() for _ in range(runs)]
+    sender.close()
+    pipeline.stop()
+    median = statistics.median(rates)
+    tolerance = 1 - 1 / UDP_RATE_STEP ** 2
+    if median:
+        tolerance = max(tolerance, (max(rates) - min(rates)) / median)
+    return {"udp_max_rate_per_s": _result(median, "msgs/s", "higher", round(tolerance, 3))}
+
+
+def bench_udp_to_hid(switches=10):
+    """端到端UDP→HID延迟（默认帧间延时10ms、参数间延时50ms，与实际运行一致）"""
+    pipeline, sim = _make_pipeline(frame_delay=0.01, param_delay=0.05)
+    pipeline.start()
+    while pipeline.udp_socket is None or pipeline.udp_socket.getsockname()[1] == 0:
+        time.sleep(0.01)
+    address = ("127.0.0.1", pipeline.udp_socket.getsockname()[1])
+
+    done = threading.Event()
+    expected = [0]
+
+    def on_frame(timestamp, report):
+        if len(sim.frames) >= expected[0]:
+            done.set()
+
+    sim.frame_listeners.append(on_frame)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    weapons = pipeline.weapon_names
+    latencies = []
+    for i in range(switches):
+        weapon = weapons[i % len(weapons)]
+        mode_name = get_weapon_trigger_config(pipeline.current_config_data, weapon, _null_log)[0]
+        frame_count = 1 + len(pipeline.mode_values(mode_name))
+        # 每次都测量发送全部参数的切换（同一模式之间只发送差异时帧数不固定）
+        pipeline.applied_profile = None
+        done.clear()
+        expected[0] = len(sim.frames) + frame_count
+        sent_at = time.perf_counter_ns()
+        sender.sendto(weapon.encode("utf-8"), address)
+        if not done.wait(5.0):
+            raise RuntimeError("等待设备帧超时")
+        latencies.append((sim.frames[-1][0] - sent_at) / 1e6)
+        # 最后一帧写入后切换才结束（之后才记录当前武器和已应用的配置）
+        while pipeline.current_weapon != weapon:
+            time.sleep(0.001)
+    sender.close()
+    pipeline.stop()
+    return {
+        "udp_to_hid_median_ms": _result(statistics.median(latencies), "ms", "lower"),
+        "udp_to_hid_max_ms": _result(max(latencies), "ms", "lower"),
+    }
+
+
+BENCHMARKS = {
+    "encode": bench_encode,
+    "lookup": bench_lookup,
+    "apply": bench_apply,
+    "udp_rate": bench_udp_rate,
+    "udp_to_hid": bench_udp_to_hid,
+}
+
+
+def check_baseline(results, baseline, threshold):
+    """返回比基准差超过阈值的指标列表（指标带有容差时阈值取两者中较大的）"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("value"):
+            continue
+        if result["better"] == "higher":
+            change = (base["value"] - result["value"]) / base["value"]
+        else:
+            change = (result["value"] - base["value"]) / base["value"]
+        if change > max(threshold, base.get("tolerance", 0), result.get("tolerance", 0)):
+            regressions.append((name, base["value"], result["value"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="运行核心路径基准测试并与基准比较")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="只运行指定的基准测试")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基准文件 (默认 benchmarks/baseline.json)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的相对退化 (默认 0.25)")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果更新基准文件")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"运行 {name}...", file=sys.stderr)
+        results.update(BENCHMARKS[name]())
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "results": results,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f).get("results", {})
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": report["python"], "platform": report["platform"], "results": baseline},
+                      f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"已更新基准: {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("没有基准文件，跳过比较", file=sys.stderr)
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+
+    regressions = check_baseline(results, baseline, args.threshold)
+    for name, base, value, change in regressions:
+        print(f"性能退化: {name} 基准 {base:.3f} -> {value:.3f} ({change:+.0%})", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
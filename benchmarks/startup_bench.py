@@ -0,0 +1,184 @@
+"""启动时间基准测试
+
+在全新的子进程中启动程序，测量：
+  - time-to-first-window: 从启动进程到主窗口可见（GUI）
+  - time-to-pipeline-ready: 从启动进程到管线线程启动（守护进程，无Tk）
+  - time-to-device-ready: 从启动进程到设备连接成功（没有设备时记为 null）
+
+用法:
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --budget-window 1.5 --budget-device 3.0 --output startup.json
+
+任一中位数超过预算时退出码为1，可用于在CI中发现启动回归。
+没有显示器时跳过GUI测量。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程输出的标记行
+MARK_PREFIX = "@@STARTUP "
+
+
+def _mark(name):
+    print(MARK_PREFIX + name, flush=True)
+
+
+def child_gui(timeout):
+    """子进程：启动GUI，窗口可见和设备连接时输出标记"""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        _mark("NO_DISPLAY")
+        return
+
+    from trigger_config_gui import TriggerConfigApp
+
+    app = TriggerConfigApp(root)
+    while not root.winfo_viewable():
+        root.update()
+    _mark("WINDOW_READY")
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        root.update()
+        if app.device.connected:
+            _mark("DEVICE_READY")
+            break
+        time.sleep(0.005)
+    else:
+        _mark("DEVICE_TIMEOUT")
+    app.pipeline.stop()
+    root.destroy()
+
+
+def child_daemon(timeout):
+    """子进程：不启动Tk，只启动管线"""
+    from trigger_core import TriggerPipeline
+
+    pipeline = TriggerPipeline(log_handlers=[lambda message: None], udp_port=0)
+    pipeline.start()
+    _mark("PIPELINE_READY")
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pipeline.device.connected:
+            _mark("DEVICE_READY")
+            break
+        time.sleep(0.005)
+    else:
+        _mark("DEVICE_TIMEOUT")
+    pipeline.stop()
+
+
+def run_child(kind, timeout):
+    """运行一次子进程，返回 {标记: 距离启动的秒数}"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", kind, "--timeout", str(timeout)],
+        cwd=ROOT_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        encoding="utf-8",
+    )
+    marks = {}
+    for line in proc.stdout:
+        if line.startswith(MARK_PREFIX):
+            marks[line[len(MARK_PREFIX):].strip()] = time.perf_counter() - start
+    proc.wait()
+    return marks
+
+
+def summarize(samples):
+    """返回样本的统计（秒）"""
+    if not samples:
+        return None
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "runs": len(samples),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量启动到窗口显示、设备就绪的时间")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的运行次数 (默认 5)")
+    parser.add_argument("--timeout", type=float, default=5.0, help="等待设备连接的秒数 (默认 5)")
+    parser.add_argument("--budget-window", type=float, help="time-to-first-window 中位数预算（秒）")
+    parser.add_argument("--budget-pipeline", type=float, help="time-to-pipeline-ready 中位数预算（秒）")
+    parser.add_argument("--budget-device", type=float, help="time-to-device-ready 中位数预算（秒）")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    parser.add_argument("--child", choices=["gui", "daemon"], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        sys.path.insert(0, ROOT_DIR)
+        if args.child == "gui":
+            child_gui(args.timeout)
+        else:
+            child_daemon(args.timeout)
+        return 0
+
+    window, gui_device, pipeline, daemon_device = [], [], [], []
+    gui_available = True
+    for _ in range(args.runs):
+        marks = run_child("daemon", args.timeout)
+        if "PIPELINE_READY" in marks:
+            pipeline.append(marks["PIPELINE_READY"])
+        if "DEVICE_READY" in marks:
+            daemon_device.append(marks["DEVICE_READY"])
+
+        if gui_available:
+            marks = run_child("gui", args.timeout)
+            if "NO_DISPLAY" in marks:
+                gui_available = False
+                continue
+            if "WINDOW_READY" in marks:
+                window.append(marks["WINDOW_READY"])
+            if "DEVICE_READY" in marks:
+                gui_device.append(marks["DEVICE_READY"])
+
+    results = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "time_to_first_window": summarize(window),
+        "time_to_device_ready_gui": summarize(gui_device),
+        "time_to_pipeline_ready": summarize(pipeline),
+        "time_to_device_ready_daemon": summarize(daemon_device),
+    }
+    if not gui_available:
+        results["note"] = "没有显示器，跳过GUI测量"
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    # 检查预算
+    failed = False
+    budgets = [
+        ("time_to_first_window", args.budget_window),
+        ("time_to_pipeline_ready", args.budget_pipeline),
+        ("time_to_device_ready_gui", args.budget_device),
+        ("time_to_device_ready_daemon", args.budget_device),
+    ]
+    for key, budget in budgets:
+        if budget is None or results[key] is None:
+            continue
+        if results[key]["median"] > budget:
+            print(f"超出预算: {key} 中位数 {results[key]['median']:.3f}s > {budget:.3f}s")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""批量分析武器配置文件
+
+一次加载很多游戏配置JSON，把所有武器（右扳机）的模式和参数放进 NumPy 数组，
+向量化地计算每个配置的力/阻力-扳机位置曲线，标出超出范围、多余参数和重复的配置，
+并可以绘制对比图：
+
+    python trigger_analyze.py configs/                          # 目录下所有 .json（递归）
+    python trigger_analyze.py a.json b.json --output report.json
+    python trigger_analyze.py configs/ --plot curves.png --jobs 8
+
+JSON解析在进程池中并行进行。需要 numpy；绘图需要 matplotlib（可选）。
+
+力曲线是按参数含义构造的近似模型（固件的实际曲线未公开），用于比较配置之间的差异：
+    RACING  阻尼开始位置之后为阻尼强度
+    RECOIL  振动开始位置之后从初始强度线性增加到振动强度
+    SNIPER  开始位置到开始位置+触发行程之间为阻力，之后断开（为0）
+    LOCK    阻尼开始位置之后为最大阻力
+参数为0（保留设备当前值）时按默认值计算。
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from trigger_schema import MODE_LIST
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PARAM_SLOTS = 4         # 配置文件中 param 数组的长度
+POSITIONS = 256         # 扳机位置 0-255
+MAX_FORCE = 255
+CJK_FONTS = ["Microsoft YaHei", "SimHei", "PingFang SC", "Noto Sans CJK SC", "WenQuanYi Micro Hei"]
+
+
+def find_config_files(paths):
+    """展开命令行中的文件和目录（目录递归查找 .json）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                files.extend(os.path.join(directory, name) for name in sorted(names) if name.endswith(".json"))
+        else:
+            files.append(path)
+    return files
+
+
+def load_profiles(file_path):
+    """解析一个配置文件，返回 (文件, [(武器名称, 模式取值, 参数列表), ...], 错误信息)
+
+    在进程池中执行，只返回基本类型。trigger_default 作为名为 None 的配置返回。
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            config_data = json.load(f)
+    except (OSError, ValueError) as e:
+        return file_path, [], str(e)
+    # 结构错误和无法读取的文件一样按文件报告，不中断整批分析
+    if not isinstance(config_data, dict):
+        return file_path, [], "配置文件的顶层不是对象"
+    weapon_filters = config_data.get("vFilters", [])
+    if not isinstance(weapon_filters, list):
+        return file_path, [], "vFilters 不是数组"
+
+    profiles = []
+
+    def add(name, trigger):
+        if trigger is None:
+            trigger = {}
+        right = trigger.get("right", {}) if isinstance(trigger, dict) else None
+        if not isinstance(right, dict):
+            return f"{'trigger_default' if name is None else name} 的 trigger 格式错误"
+        params = right.get("param", [])
+        profiles.append((name, right.get("mode", 0), list(params) if isinstance(params, list) else []))
+        return None
+
+    for index, weapon_filter in enumerate(weapon_filters):
+        if not isinstance(weapon_filter, dict):
+            return file_path, [], f"vFilters[{index}] 不是对象"
+        if "name" in weapon_filter:
+            error = add(weapon_filter["name"], weapon_filter.get("trigger"))
+            if error:
+                return file_path, [], error
+    if config_data.get("trigger_default"):
+        error = add(None, config_data["trigger_default"])
+        if error:
+            return file_path, [], error
+    return file_path, profiles, None
+
+
+def load_all(files, jobs=None):
+    """并行解析所有配置文件"""
+    if jobs == 1 or len(files) < 2:
+        return [load_profiles(file_path) for file_path in files]
+    workers = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(load_profiles, files, chunksize=chunksize))
+
+
+class ProfileTable:
+    """所有配置的数组表示
+
+    Attributes:
+        files, names: 每行对应的文件和武器名称（默认配置的名称为 None）
+        modes: (n,) 模式取值
+        params: (n, 4) 参数数组（不足补0，超过部分截断并在 extra 中标记）
+        extra: (n,) 参数数组长度是否超过4
+    """
+
+    def __init__(self, results):
+        files, names, modes, rows, extra = [], [], [], [], []
+        self.errors = []
+        self.file_count = len(results)
+        for file_path, profiles, error in results:
+            if error:
+                self.errors.append((file_path, error))
+            for name, mode, params in profiles:
+                files.append(file_path)
+                names.append(name)
+                modes.append(mode if isinstance(mode, int) else -1)
+                values = [value if isinstance(value, (int, float)) else -1 for value in params[:PARAM_SLOTS]]
+                rows.append(values + [0] * (PARAM_SLOTS - len(values)))
+                extra.append(len(params) > PARAM_SLOTS)
+        self.files = files
+        self.names = names
+        self.modes = np.array(modes, dtype=np.int32)
+        self.params = np.array(rows, dtype=np.float64).reshape(-1, PARAM_SLOTS).astype(np.int32)
+        self.extra = np.array(extra, dtype=bool)
+
+    def __len__(self):
+        return len(self.names)
+
+    def label(self, index):
+        name = self.names[index]
+        return f"{os.path.basename(self.files[index])}:{'默认' if name is None else name}"
+
+
+def _schema_arrays():
+    """按模式取值和参数位置排列的范围和默认值 (模式数, 4)，不存在的位置 used 为 False"""
+    count = len(MODE_LIST)
+    minimum = np.zeros((count, PARAM_SLOTS), dtype=np.int32)
+    maximum = np.zeros((count, PARAM_SLOTS), dtype=np.int32)
+    default = np.zeros((count, PARAM_SLOTS), dtype=np.int32)
+    used = np.zeros((count, PARAM_SLOTS), dtype=bool)
+    for mode in MODE_LIST:
+        for spec in mode.params:
+            minimum[mode.value, spec.position] = spec.minimum
+            maximum[mode.value, spec.position] = spec.maximum
+            default[mode.value, spec.position] = spec.default
+            used[mode.value, spec.position] = True
+    return minimum, maximum, default, used
+
+
+def validate(table):
+    """返回每行的问题标记字典 {名称: (n,) bool 数组}"""
+    minimum, maximum, _, used = _schema_arrays()
+    modes, params = table.modes, table.params
+    known = (modes >= 0) & (modes < len(MODE_LIST))
+    mode_index = np.where(known, modes, 0)
+
+    nonzero = params != 0
+    row_used = used[mode_index]
+    out_of_range = nonzero & row_used & ((params < minimum[mode_index]) | (params > maximum[mode_index]))
+    return {
+        "unknown_mode": ~known,
+        "out_of_range": known & out_of_range.any(axis=1),
+        "unused_params": known & (nonzero & ~row_used).any(axis=1),
+        "extra_params": table.extra,
+        "no_effect": known & (modes > 0) & ~(nonzero & row_used).any(axis=1),
+    }
+
+
+def find_duplicates(table):
+    """返回内容相同（模式和参数都相同）的配置组 [[行号, ...], ...]，只包含不同名称的武器"""
+    if not len(table):
+        return []
+    rows = np.column_stack([table.modes, table.params])
+    _, inverse, counts = np.unique(rows, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    groups = []
+    for group in np.flatnonzero(counts > 1):
+        members = np.flatnonzero(inverse == group).tolist()
+        if len({(table.files[i], table.names[i]) for i in members}) > 1:
+            groups.append(members)
+    return groups
+
+
+def find_duplicate_names(table):
+    """返回同一文件中重复的武器名称 [(文件, 名称, 次数), ...]（管线只使用第一个）"""
+    seen = {}
+    for file_path, name in zip(table.files, table.names):
+        if name is not None:
+            seen[(file_path, name)] = seen.get((file_path, name), 0) + 1
+    return [(file_path, name, count) for (file_path, name), count in seen.items() if count > 1]
+
+
+def force_curves(table):
+    """计算所有配置的力曲线，返回 (n, 256) 数组"""
+    _, maximum, default, used = _schema_arrays()
+    modes = table.modes
+    known = (modes >= 0) & (modes < len(MODE_LIST))
+    mode_index = np.where(known, modes, 0)
+
+    # 0 表示保留当前值，按默认值计算；超出范围的值按范围限制
+    params = np.where(table.params != 0, table.params, default[mode_index])
+    params = np.clip(params, 0, np.where(used[mode_index], maximum[mode_index], 0))
+    p0, p1, p2 = (params[:, i:i + 1].astype(np.float64) for i in range(3))
+
+    x = np.arange(POSITIONS, dtype=np.float64)[None, :]
+    curves = np.zeros((len(table), POSITIONS))
+
+    racing = modes == 1
+    if racing.any():
+        curves[racing] = np.where(x >= p0[racing], p1[racing], 0)
+
+    recoil = modes == 2
+    if recoil.any():
+        start, initial, intensity = p0[recoil], p1[recoil], p2[recoil]
+        ramp = (x - start) / np.maximum(POSITIONS - 1 - start, 1)
+        curves[recoil] = np.where(x >= start, initial + (intensity - initial) * ramp, 0)
+
+    sniper = modes == 3
+    if sniper.any():
+        start, end = p0[sniper], p0[sniper] + p1[sniper]
+        curves[sniper] = np.where((x >= start) & (x < end), p2[sniper], 0)
+
+    lock = modes == 4
+    if lock.any():
+        curves[lock] = np.where(x >= p0[lock], MAX_FORCE, 0)
+
+    return curves
+
+
+def plot_curves(table, curves, file_path, max_lines=20):
+    """按模式分图绘制力曲线（每个模式最多 max_lines 条，超过时只画前面的）"""
+    import warnings
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # 图例中的武器名称是中文，优先使用系统中的中文字体；没有中文字体时不输出缺字警告
+    plt.rcParams["font.sans-serif"] = CJK_FONTS + plt.rcParams["font.sans-serif"]
+    warnings.filterwarnings("ignore", message="Glyph .* missing from font")
+
+    modes = [mode for mode in MODE_LIST if mode.params and (table.modes == mode.value).any()]
+    if not modes:
+        return False
+    figure, axes = plt.subplots(len(modes), 1, figsize=(10, 3.5 * len(modes)), squeeze=False)
+    for axis, mode in zip(axes[:, 0], modes):
+        rows = np.flatnonzero(table.modes == mode.value)
+        for index in rows[:max_lines]:
+            axis.plot(curves[index], label=table.label(index), linewidth=1)
+        title = mode.name if len(rows) <= max_lines else f"{mode.name} ({max_lines}/{len(rows)})"
+        axis.set_title(title)
+        axis.set_xlim(0, POSITIONS - 1)
+        axis.set_ylim(0, MAX_FORCE + 5)
+        axis.set_xlabel("position")
+        axis.set_ylabel("force")
+        axis.legend(fontsize=6, ncol=2, loc="upper left")
+    figure.tight_layout()
+    figure.savefig(file_path, dpi=120)
+    plt.close(figure)
+    return True
+
+
+def analyze(table):
+    """返回分析结果字典"""
+    flags = validate(table)
+    counts = np.bincount(np.where(table.modes >= 0, table.modes, len(MODE_LIST)), minlength=len(MODE_LIST) + 1)
+    mode_counts = {mode.name: int(counts[mode.value]) for mode in MODE_LIST}
+    if counts[len(MODE_LIST)]:
+        mode_counts["UNKNOWN"] = int(counts[len(MODE_LIST)])
+
+    problems = np.zeros(len(table), dtype=bool)
+    for mask in flags.values():
+        problems |= mask
+
+    flagged = []
+    for index in np.flatnonzero(problems):
+        flagged.append({
+            "file": table.files[index],
+            "weapon": table.names[index],
+            "mode": int(table.modes[index]),
+            "param": table.params[index].tolist(),
+            "problems": [name for name, mask in flags.items() if mask[index]],
+        })
+
+    return {
+        "files": table.file_count,
+        "profiles": len(table),
+        "modes": mode_counts,
+        "errors": [{"file": file_path, "error": error} for file_path, error in table.errors],
+        "flagged": flagged,
+        "duplicates": [[table.label(i) for i in group] for group in find_duplicates(table)],
+        "duplicate_names": [{"file": file_path, "weapon": name, "count": count}
+                            for file_path, name, count in find_duplicate_names(table)],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量分析武器配置文件（模式、参数范围、重复配置和力曲线）")
+    parser.add_argument("paths", nargs="+", help="配置文件或目录（递归查找 .json）")
+    parser.add_argument("--jobs", type=int, help="解析进程数 (默认 CPU 核数，1 表示不使用进程池)")
+    parser.add_argument("--output", help="把分析结果写入JSON文件")
+    parser.add_argument("--plot", metavar="FILE", help="绘制力曲线对比图（需要 matplotlib）")
+    parser.add_argument("--curves", metavar="FILE", help="把力曲线保存为 .npy 文件")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("需要 numpy: pip install numpy", file=sys.stderr)
+        return 2
+
+    files = find_config_files(args.paths)
+    if not files:
+        print("没有找到配置文件", file=sys.stderr)
+        return 2
+
+    table = ProfileTable(load_all(files, args.jobs))
+    result = analyze(table)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.plot or args.curves:
+        curves = force_curves(table)
+        if args.curves:
+            np.save(args.curves, curves)
+        if args.plot:
+            try:
+                if plot_curves(table, curves, args.plot):
+                    print(f"已保存力曲线图: {args.plot}", file=sys.stderr)
+            except ImportError:
+                print("绘图需要 matplotlib: pip install matplotlib", file=sys.stderr)
+                return 2
+
+    return 1 if result["flagged"] or result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""多客户端命令代理
+
+游戏钩子、叠加层和测试工具都向同一个UDP端口发送武器切换命令。代理按来源主机跟踪客户端
+（每个数据报使用新的临时端口的发送方仍是同一个客户端）；规则中指定了端口时，来自该端口的命令
+是单独的客户端：
+
+  - 每个客户端一个令牌桶，超过速率的命令直接丢弃，不进入设备写入
+  - 每个客户端只保留最新的一条待执行命令（旧命令被替换，不会积压）
+  - 执行线程按优先级选择待执行命令，同一优先级的客户端轮流执行（公平排队），
+    一次只执行一条，等它写完设备再取下一条
+  - 按客户端统计收到、限流、替换和执行的命令数量（trigger_client_commands_total）
+
+客户端规则格式（--client 或环境变量 TRIGGER_CLIENTS，多条用 ; 分隔）:
+
+    名称@主机[:端口][,priority=优先级][,rate=每秒命令数][,burst=突发数量]
+
+例如 hook@127.0.0.1:40000,priority=10,rate=60 表示来自该地址的命令优先于同一主机的其他命令和其他客户端。
+不匹配任何规则的客户端使用默认规则，按主机地址命名。
+"""
+import threading
+import time
+import traceback
+
+import trigger_metrics as metrics
+
+DEFAULT_RATE = 20.0         # 默认每个客户端每秒命令数
+DEFAULT_BURST = 5           # 默认令牌桶容量
+IDLE_TIMEOUT = 60.0         # 客户端空闲多久后清除（秒）
+TASK_TIMEOUT = 5.0          # 等待一条命令执行完成的最长时间（秒）
+
+
+class ClientPolicy:
+    """客户端规则：匹配的地址、优先级和速率限制（rate 为0表示不限速）"""
+
+    def __init__(self, name=None, host=None, port=None, priority=0, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.priority = priority
+        self.rate = rate
+        self.burst = max(1, burst)
+
+    def matches(self, addr):
+        if self.host is not None and addr[0] != self.host:
+            return False
+        return self.port is None or addr[1] == self.port
+
+    def __repr__(self):
+        address = f"{self.host or '*'}:{self.port or '*'}"
+        return f"{self.name}@{address} priority={self.priority} rate={self.rate:g} burst={self.burst}"
+
+
+def parse_client_rule(text):
+    """解析客户端规则字符串，格式错误时抛出 ValueError"""
+    head, *options = [part.strip() for part in text.split(",")]
+    name, sep, address = head.partition("@")
+    if not sep or not name or not address:
+        raise ValueError(f"客户端规则格式错误: {text}")
+    host, _, port = address.partition(":")
+    policy = ClientPolicy(name, host or None, int(port) if port else None)
+    for option in options:
+        key, _, value = option.partition("=")
+        if key == "priority":
+            policy.priority = int(value)
+        elif key == "rate":
+            policy.rate = float(value)
+        elif key == "burst":
+            policy.burst = max(1, int(value))
+        else:
+            raise ValueError(f"未知的客户端规则选项: {option}")
+    return policy
+
+
+def parse_client_rules(text):
+    """解析用 ; 分隔的多条客户端规则"""
+    return [parse_client_rule(rule) for rule in text.split(";") if rule.strip()]
+
+
+class ClientState:
+    """一个客户端（来源主机，或规则指定端口时的主机和端口）的令牌桶和计数器"""
+
+    def __init__(self, key, policy, label, now):
+        self.key = key
+        self.policy = policy
+        self.label = label
+        self.tokens = float(policy.burst)
+        self.updated = now
+        self.last_seen = now
+        self.served = 0         # 上次执行的轮次，同一优先级中最久未执行的先执行
+        self.received = metrics.CLIENT_COMMANDS.labels(label, "received")
+        self.limited = metrics.CLIENT_COMMANDS.labels(label, "limited")
+        self.replaced = metrics.CLIENT_COMMANDS.labels(label, "replaced")
+        self.dispatched = metrics.CLIENT_COMMANDS.labels(label, "dispatched")
+
+    def take_token(self, now):
+        """取一个令牌，没有令牌时返回 False"""
+        policy = self.policy
+        if policy.rate <= 0:
+            return True
+        self.tokens = min(policy.burst, self.tokens + (now - self.updated) * policy.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CommandBroker:
+    """按客户端限流并公平调度武器切换命令
+
+    Args:
+        dispatch: 执行函数的方式（管线的 dispatch，GUI中回到Tk主线程）
+        log: 日志函数
+        policies: 客户端规则列表，按顺序匹配
+        default_policy: 不匹配任何规则时使用的规则
+    """
+
+    def __init__(self, dispatch, log, policies=(), default_policy=None):
+        self.dispatch = dispatch
+        self.log = log
+        self.policies = list(policies)
+        self.default_policy = default_policy or ClientPolicy()
+        self.idle_timeout = IDLE_TIMEOUT
+        # 规则中指定的端口，来自这些端口的命令按 (主机, 端口) 区分客户端，其他按主机
+        self.rule_ports = {policy.port for policy in self.policies if policy.port is not None}
+        self.clients = {}       # 主机或 (主机, 端口) -> ClientState（只在UDP线程中修改）
+        self._pending = {}      # ClientState -> 待执行的命令
+        self._calls = []        # 不经过限流、最先执行的内部任务
+        self._round = 0
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self._last_prune = time.monotonic()
+
+    def start(self):
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="command-broker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stop = True
+            self._pending.clear()
+            self._calls.clear()
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+
+    def client(self, addr, now):
+        """返回地址对应的客户端，第一次出现时匹配规则"""
+        key = addr if addr[1] in self.rule_ports else addr[0]
+        state = self.clients.get(key)
+        if state is None:
+            policy = next((policy for policy in self.policies if policy.matches(addr)), self.default_policy)
+            label = policy.name or addr[0]
+            state = ClientState(key, policy, label, now)
+            self.clients[key] = state
+            source = f"{addr[0]}:{addr[1]}" if key is addr else addr[0]
+            self.log(f"新客户端 {source}: {label} (优先级 {policy.priority})")
+        return state
+
+    def admit(self, addr, now=None):
+        """记录一条命令，超过客户端速率时返回 None，否则返回客户端"""
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_prune > self.idle_timeout:
+            self._prune(now)
+        client = self.client(addr, now)
+        client.last_seen = now
+        client.received.inc()
+        if not client.take_token(now):
+            client.limited.inc()
+            return None
+        return client
+
+    def _prune(self, now):
+        """清除空闲的客户端（计数器保留）"""
+        self._last_prune = now
+        with self._condition:
+            pending = set(self._pending)
+        for key, client in list(self.clients.items()):
+            if now - client.last_seen > self.idle_timeout and client not in pending:
+                del self.clients[key]
+
+    def submit(self, client, task):
+        """提交客户端的命令，替换该客户端尚未执行的命令"""
+        with self._condition:
+            if client in self._pending:
+                client.replaced.inc()
+            self._pending[client] = task
+            self._condition.notify()
+
+    def call(self, fn):
+        """在执行线程中运行内部任务（不限流，优先于客户端命令）"""
+        with self._condition:
+            self._calls.append(fn)
+            self._condition.notify()
+
+    def _next(self):
+        """取下一条要执行的任务：优先级最高、同优先级中最久未执行的客户端"""
+        if self._calls:
+            return self._calls.pop(0), None
+        client = max(self._pending, key=lambda c: (c.policy.priority, -c.served))
+        self._round += 1
+        client.served = self._round
+        return self._pending.pop(client), client
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stop and not self._pending and not self._calls:
+                    self._condition.wait()
+                if self._stop:
+                    return
+                task, client = self._next()
+            if client is not None:
+                client.dispatched.inc()
+
+            # 等这条命令执行完（写完设备）再取下一条，设备写入按调度顺序进行
+            done = threading.Event()
+
+            def run(task=task, done=done):
+                try:
+                    task()
+                except Exception as e:
+                    self.log(f"执行客户端命令错误: {e}")
+                    traceback.print_exc()
+                finally:
+                    done.set()
+
+            self.dispatch(run)
+            if not done.wait(TASK_TIMEOUT):
+                self.log("警告: 客户端命令执行超时")
@@ -0,0 +1,259 @@
+"""asyncio 设备客户端
+
+在其他 asyncio 程序（启动器、自动化脚本）中直接驱动触发器设备，不需要GUI或UDP：
+
+    from trigger_client import TriggerClient
+
+    async with TriggerClient("Sniper5_dx12.default.json") as client:
+        await client.connect(timeout=5)
+        await client.apply_profile("主武器")
+        await client.apply_batch("SNIPER", {"START_POS": 60, "RESISTANCE": 120}, timeout=1)
+        async for event in client.events():
+            print(event.kind, event.data)
+
+客户端内部使用 TriggerPipeline，所有阻塞的 hidapi 调用（连接后的写入、配置槽上传等）都在一个
+专用的执行线程中按顺序执行，不阻塞事件循环。命令可以取消或设置超时：还没开始的命令直接丢弃，
+正在发送的命令在下一个参数帧之前停止（已经写入的帧不会撤回，下一次切换会重新发送全部参数）。
+
+events() 返回异步迭代器，产生连接事件（connected / disconnected）和每条命令完成后的应答事件（ack）。
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from trigger_core import TriggerPipeline
+from trigger_schema import MODES, PARAMS
+
+DEFAULT_TIMEOUT = 5.0
+
+
+class CommandCancelled(Exception):
+    """命令被取消或超时，在参数帧之间停止"""
+
+
+class TriggerEvent:
+    """客户端事件
+
+    kind 为 "connected" / "disconnected" / "ack"。ack 的 data 为
+    {"command": 命令名称, "status": "ok" / "failed" / "cancelled", "elapsed": 秒, "error": 错误信息或 None}。
+    """
+
+    __slots__ = ("kind", "data", "time")
+
+    def __init__(self, kind, data=None):
+        self.kind = kind
+        self.data = data or {}
+        self.time = time.time()
+
+    def __repr__(self):
+        return f"TriggerEvent({self.kind}, {self.data})"
+
+
+class _Command:
+    """一条提交到执行线程的命令"""
+
+    __slots__ = ("name", "lock", "started", "cancelled")
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.started = False
+        self.cancelled = False
+
+
+class TriggerClient:
+    """异步触发器客户端
+
+    Args:
+        config_path: 连接时加载的武器配置文件（可选，也可以之后调用 load_config）
+        backend: HID后端，默认为 hidapi，测试时可传入 trigger_device_sim.SimulatedHid
+        log_handlers: 日志函数列表，默认打印到标准输出
+        timeout: 命令的默认超时（秒）
+    """
+
+    def __init__(self, config_path=None, backend=None, log_handlers=None, timeout=DEFAULT_TIMEOUT):
+        self.config_path = config_path
+        self.backend = backend
+        self.log_handlers = log_handlers
+        self.timeout = timeout
+        self.pipeline = None
+        self._executor = None
+        self._loop = None
+        self._connected = None
+        self._current = None
+        self._subscribers = []      # [(事件循环, asyncio.Queue)]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def connected(self):
+        return self.pipeline is not None and self.pipeline.device.connected
+
+    def _open(self):
+        self._loop = asyncio.get_running_loop()
+        self._connected = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trigger-client")
+        pipeline = TriggerPipeline(log_handlers=self.log_handlers)
+        device = pipeline.device
+        device.backend = self.backend
+        device.add_listener(self._on_device_event)
+        # 管线内部的调度（连接后上传配置槽等）也在执行线程中进行
+        pipeline.dispatch = self._executor.submit
+        pipeline.idle_callback = self._check_cancelled
+        self.pipeline = pipeline
+        device.start_monitor()
+
+    async def connect(self, timeout=None):
+        """打开设备并等待连接（设备还没插入时等待监控线程连接），超时抛出 asyncio.TimeoutError"""
+        if self.pipeline is None:
+            self._open()
+        await asyncio.wait_for(self._connected.wait(), timeout or self.timeout)
+        if self.config_path and self.pipeline.compiled_config is None:
+            await self.load_config(self.config_path)
+
+    async def close(self):
+        """停止设备监控并关闭设备，结束所有事件迭代器"""
+        pipeline, self.pipeline = self.pipeline, None
+        if pipeline is None:
+            return
+        executor, self._executor = self._executor, None
+        await self._loop.run_in_executor(executor, pipeline.stop)
+        executor.shutdown(wait=False)
+        for loop, queue in list(self._subscribers):
+            self._post(loop, queue, None)
+
+    async def load_config(self, file_path, timeout=None):
+        """加载武器配置文件，返回是否成功"""
+        self.config_path = file_path
+        return await self._run("load_config", lambda: self.pipeline.load_config(file_path), timeout)
+
+    async def apply_profile(self, weapon_name, timeout=None):
+        """应用武器配置（与UDP武器切换相同），返回是否成功"""
+        return await self._run("apply_profile", lambda: self.pipeline.apply_weapon(weapon_name), timeout)
+
+    async def set_mode(self, mode, timeout=None):
+        """设置模式（模式名称，如 "SNIPER"）"""
+        if mode not in MODES:
+            raise ValueError(f"未知模式: {mode}")
+        return await self._run("set_mode", lambda: self._set_mode(mode), timeout)
+
+    async def set_parameter(self, param_id, value, timeout=None):
+        """设置一个参数（值会限制在参数范围内）"""
+        if param_id not in PARAMS:
+            raise ValueError(f"未知参数ID: {param_id}")
+        return await self._run("set_parameter", lambda: self.pipeline.set_parameter(param_id, value), timeout)
+
+    async def apply_batch(self, mode=None, values=None, timeout=None):
+        """在一条命令中设置模式（可选）和一组参数 {参数ID: 值}，取消时在参数帧之间停止"""
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"未知模式: {mode}")
+        values = list((values or {}).items())
+        for param_id, _ in values:
+            if param_id not in PARAMS:
+                raise ValueError(f"未知参数ID: {param_id}")
+
+        def batch():
+            if mode is not None:
+                self._set_mode(mode)
+            self.pipeline.send_parameters(values)
+
+        return await self._run("apply_batch", batch, timeout)
+
+    async def events(self):
+        """连接和应答事件的异步迭代器，客户端关闭时结束"""
+        queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        self._subscribers.append(subscriber)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self._subscribers.remove(subscriber)
+
+    def _set_mode(self, mode):
+        self.pipeline.sequencer.cancel()
+        self.pipeline.set_mode(mode)
+
+    async def _run(self, name, fn, timeout):
+        """在执行线程中运行命令，取消或超时时标记命令，让它在下一个参数帧之前停止"""
+        if self.pipeline is None:
+            raise RuntimeError("客户端未连接")
+        command = _Command(name)
+        future = self._loop.run_in_executor(self._executor, self._execute, command, fn)
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            with command.lock:
+                command.cancelled = True
+                started = command.started
+            if not started:
+                # 还在排队的命令不会再执行
+                self._emit("ack", {"command": name, "status": "cancelled", "elapsed": 0.0, "error": None})
+            raise
+
+    def _execute(self, command, fn):
+        """执行线程中运行一条命令并发送应答事件"""
+        with command.lock:
+            command.started = True
+            if command.cancelled:
+                raise CommandCancelled(command.name)
+        self._current = command
+        start = time.perf_counter()
+        status, error = "ok", None
+        try:
+            result = fn()
+            if result is False:
+                status = "failed"
+            return result
+        except CommandCancelled:
+            status = "cancelled"
+            # 已经写入了一部分帧，设备状态未知，下一次切换发送全部参数
+            self.pipeline.applied_profile = None
+            self.pipeline.device_synced = False
+            raise
+        except Exception as e:
+            status, error = "failed", str(e)
+            raise
+        finally:
+            self._current = None
+            self._emit("ack", {"command": command.name, "status": status,
+                               "elapsed": time.perf_counter() - start, "error": error})
+
+    def _check_cancelled(self):
+        """参数帧之间的回调（执行线程中）"""
+        command = self._current
+        if command is not None and command.cancelled:
+            raise CommandCancelled(command.name)
+
+    def _on_device_event(self, event):
+        """设备监控线程中的连接状态变化"""
+        if event not in ("connected", "disconnected"):
+            return
+        loop, connected = self._loop, self._connected
+        if loop is not None:
+            setter = connected.set if event == "connected" else connected.clear
+            try:
+                loop.call_soon_threadsafe(setter)
+            except RuntimeError:
+                return
+        self._emit(event)
+
+    def _emit(self, kind, data=None):
+        event = TriggerEvent(kind, data)
+        for loop, queue in list(self._subscribers):
+            self._post(loop, queue, event)
+
+    @staticmethod
+    def _post(loop, queue, event):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        except RuntimeError:
+            pass    # 事件循环已经关闭
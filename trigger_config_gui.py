@@ -1,23 +1,29 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import hid
+from tkinter import ttk, scrolledtext
+import multiprocessing
 import threading
 import time
 import traceback
-import subprocess
-import platform
-import socket  # 添加socket模块用于UDP通信
-import json
+import os
 
-# 根据系统导入相应模块
-if platform.system() == 'Windows':
-    import winreg
+import trigger_metrics as metrics
+from trigger_core import (
+    VENDOR_ID, PRODUCT_ID, CMD_HEADER, CMD_FOOTER, CMD_TYPE_MODE, CMD_TYPE_PARAM,
+    MODE_GENERAL, MODE_RACING, MODE_RECOIL, MODE_SNIPER, MODE_LOCK,
+    MODES, PARAMS, DEFAULT_MODE, TriggerPipeline, print_log, timestamped,
+    load_weapon_config, get_weapon_trigger_config,
+)
+from trigger_state import DEFAULT_STATE_FILE, StateStore
+from trigger_trace import TRACER
 
 def is_dark_mode():
+    # 只在启动时调用一次，相关模块按系统延迟导入
+    import platform
     system = platform.system()
     
     if system == 'Darwin':  # macOS
         try:
+            import subprocess
             cmd = 'defaults read -g AppleInterfaceStyle'
             subprocess.check_output(cmd.split())
             return True
@@ -26,8 +32,7 @@ def is_dark_mode():
     elif system == 'Windows':  # Windows
         try:
             # 在Windows上检查深色模式
-            if 'winreg' not in globals():
-                return False
+            import winreg
                 
             registry = winreg.ConnectRegistry(None, winreg.HKEY_CURRENT_USER)
             reg_keypath = r'Software\Microsoft\Windows\CurrentVersion\Themes\Personalize'
@@ -41,37 +46,50 @@ def is_dark_mode():
     else:  # 其他系统默认使用浅色主题
         return False
 
-# Define USB HID device constants
-VENDOR_ID = 0x2341  # Arduino default VID (change as needed)
-PRODUCT_ID = 0x8036  # Arduino Leonardo default PID (change as needed)
-
-# 命令格式常量
-CMD_HEADER = 0xAA       # 命令头
-CMD_FOOTER = 0x55       # 命令尾
-
-# 命令类型
-CMD_TYPE_MODE = 0x01    # 模式设置命令
-CMD_TYPE_PARAM = 0x02   # 参数设置命令
-
-# 模式ID
-MODE_GENERAL = 0x10     # 通用模式
-MODE_RACING = 0x11      # 赛车模式
-MODE_RECOIL = 0x12      # 后座力模式
-MODE_SNIPER = 0x13      # 狙击模式
-MODE_LOCK = 0x14        # 锁定模式
+def create_pipeline(log_handlers=None):
+    """创建管线并按环境变量设置参数过渡"""
+    pipeline = TriggerPipeline(log_handlers=log_handlers)
+    # 同一模式的武器之间切换时的参数过渡（环境变量 TRIGGER_MORPH_MS，默认0表示直接切换）
+    pipeline.morph_duration = float(os.environ.get("TRIGGER_MORPH_MS", "0")) / 1000.0
+    pipeline.morph_rate_hz = float(os.environ.get("TRIGGER_MORPH_HZ", "50"))
+    # 环境变量 TRIGGER_SLOTS=ram 或 flash 把配置上传到设备的配置槽，切换武器时只发送一个激活命令
+    slot_store = os.environ.get("TRIGGER_SLOTS")
+    if slot_store in ("ram", "flash"):
+        pipeline.enable_slots(slot_store)
+    # 环境变量 TRIGGER_PACING=<节奏配置文件>（默认 trigger_pacing.json，设为空字符串时不加载）
+    # 设备连接时按 VID:PID 加载 trigger_pacing.py 测量出的帧间隔、连续帧数和报告长度
+    pipeline.device.pacing_path = os.environ.get("TRIGGER_PACING", "trigger_pacing.json") or None
+    # 环境变量 TRIGGER_CURVES=<曲线文件> 设置参数响应曲线（格式见 trigger_curves），编译配置时映射参数值
+    curves_path = os.environ.get("TRIGGER_CURVES")
+    if curves_path:
+        pipeline.load_curves(curves_path)
+    # 环境变量 TRIGGER_CLIENTS=<规则;规则...> 启用按客户端限流和公平调度（规则格式见 trigger_broker）
+    client_rules = os.environ.get("TRIGGER_CLIENTS")
+    if client_rules is not None:
+        from trigger_broker import parse_client_rules
+        pipeline.enable_broker(parse_client_rules(client_rules))
+    return pipeline
 
 class TriggerConfigApp:
-    def __init__(self, root):
+    def __init__(self, root, pipeline=None, owns_pipeline=None):
         self.root = root
         self.root.title("Trigger Configurator")
         self.root.geometry("1100x650")  # 再次增加窗口宽度以容纳更宽的控制台
         self.root.configure(bg="#1e1e2e")
         self.root.resizable(False, False)
         
-        # HID设备通信
-        self.device = None
-        self.connected = False
-        self.stop_monitor = False
+        # 控制台创建之前的日志（创建管线、加载曲线等）先缓存，创建控制台时再显示
+        self.console = None
+        self.early_log = []
+        
+        # 触发器核心（HID设备通信、配置和UDP监听）
+        # 传入已运行的管线时（如守护进程的 --gui），界面只作为前端附加在上面；
+        # owns_pipeline=True 时传入的管线还没有启动，由界面启动和停止
+        self.owns_pipeline = pipeline is None if owns_pipeline is None else owns_pipeline
+        if pipeline is None:
+            pipeline = create_pipeline(log_handlers=[self.log_message])
+        self.pipeline = pipeline
+        self.device = pipeline.device
         
         # 当前选择
         self.current_mode = None
@@ -81,17 +99,17 @@ class TriggerConfigApp:
         self.debounce_timers = {}   # 存储参数的防抖动计时器
         self.debounce_delay = 300   # 防抖动延迟（毫秒）
         
+        # 滑块发送方式: "stream" 拖动时按固定频率发送最新值，"debounce" 停止拖动300毫秒后才发送
+        # 环境变量 TRIGGER_STREAM_HZ 设置流式发送频率（60-250Hz），设为0时使用防抖动
+        self.stream_rate_hz = self.read_stream_rate()
+        self.slider_send_mode = "stream" if self.stream_rate_hz > 0 else "debounce"
+        self.stream_pending = {}          # 等待发送的最新值（每个参数只保留一个，不积压）
+        self.stream_timer = None          # 流式发送计时器
+        self.stream_write_latency = 0.0   # 发送一帧的平滑耗时（秒），用于自适应降低频率
+        
         # 存储默认值
         self.default_values = {}    # 存储参数的默认值
         
-        # 武器配置数据
-        self.current_config_data = None
-        
-        # UDP通信设置
-        self.udp_host = "127.0.0.1"  # UDP监听地址
-        self.udp_port = 12345        # UDP监听端口
-        self.stop_udp_server = False # 控制UDP服务器线程停止
-        
         # 创建样式
         self.create_styles()
         
@@ -123,20 +141,58 @@ class TriggerConfigApp:
         # 创建控制台
         self.create_console()
         
-        # 初始化为通用模式
-        self.select_mode("GENERAL")
-        
-        # 启动设备监控线程
-        self.monitor_thread = threading.Thread(target=self.monitor_device, daemon=True)
-        self.monitor_thread.start()
-        
-        # 启动UDP服务器线程
-        self.udp_server_thread = threading.Thread(target=self.run_udp_server, daemon=True)
-        self.udp_server_thread.start()
+        # 附加到管线：武器切换回到Tk主线程执行，状态变化同步到界面
+        self.attach_pipeline()
         
         # 初始日志消息
         self.log_message("触发器配置程序已启动")
-        self.log_message(f"UDP服务器已启动，监听 {self.udp_host}:{self.udp_port}")
+        
+        # 独立运行时由界面启动设备监控和UDP服务器线程
+        # 放到空闲回调中，先让第一个窗口显示出来（hidapi也在监控线程中才导入）
+        if self.owns_pipeline:
+            self.root.after_idle(self.pipeline.start)
+    
+    def attach_pipeline(self):
+        """把界面附加到管线上"""
+        pipeline = self.pipeline
+        
+        # 所有设备写入都在Tk主线程中执行，参数帧之间保持界面响应
+        pipeline.dispatch = lambda fn: self.root.after(0, fn)
+        pipeline.idle_callback = self.root.update
+        
+        if self.log_message not in pipeline.log_handlers:
+            # log_message 同时打印到标准输出，去掉默认的打印，避免每条日志打印两次
+            if print_log in pipeline.log_handlers:
+                pipeline.log_handlers.remove(print_log)
+            pipeline.log_handlers.append(self.log_message)
+        
+        self.device.add_listener(self.on_device_event)
+        pipeline.config_listeners.append(self.on_config_loaded)
+        pipeline.weapon_listeners.append(self.on_weapon_applied)
+        
+        # 显示管线的当前状态（不向设备发送）
+        if pipeline.weapon_names:
+            self.weapon_combo["values"] = pipeline.weapon_names
+        if pipeline.current_weapon:
+            self.weapon_var.set(pipeline.current_weapon)
+        self.select_mode(pipeline.current_mode or "GENERAL", send=False)
+        if pipeline.current_mode:
+            for param_id, value in pipeline.mode_values(pipeline.current_mode):
+                self.last_sent_values[param_id] = value
+                self.show_parameter_value(param_id, value)
+        if self.device.connected:
+            self.update_ui_connected()
+    
+    @property
+    def connected(self):
+        return self.device.connected
+    
+    def run_on_ui(self, fn):
+        """在Tk主线程中执行"""
+        if threading.current_thread() is threading.main_thread():
+            fn()
+        else:
+            self.root.after(0, fn)
         
     def create_styles(self):
         # 配置ttk样式
@@ -357,27 +413,11 @@ class TriggerConfigApp:
         self.param_container = ttk.Frame(self.main_frame, style="Dark.TFrame")
         self.param_container.pack(fill=tk.BOTH, expand=True)
         
-        # 为每种模式创建框架
+        # 各模式的参数框架在第一次选择该模式时才创建（见 get_param_frame）
         self.param_frames = {}
-        
-        # 通用模式参数
-        self.param_frames["GENERAL"] = self.create_general_params()
-        
-        # 赛车模式参数
-        self.param_frames["RACING"] = self.create_racing_params()
-        
-        # 后座力模式参数
-        self.param_frames["RECOIL"] = self.create_recoil_params()
-        
-        # 狙击模式参数
-        self.param_frames["SNIPER"] = self.create_sniper_params()
-        
-        # 锁定模式参数
-        self.param_frames["LOCK"] = self.create_lock_params()
-        
-        # 初始隐藏所有框架
-        for frame in self.param_frames.values():
-            frame.pack_forget()
+        # 通用模式没有参数，其余模式的控件按参数定义（trigger_schema）生成
+        self.param_frame_builders = {mode: (lambda mode=mode: self.create_mode_params(mode)) for mode in MODES}
+        self.param_frame_builders["GENERAL"] = self.create_general_params
         
         # 创建重置按钮框架
         self.reset_frame = ttk.Frame(self.main_frame, style="Dark.TFrame")
@@ -392,6 +432,20 @@ class TriggerConfigApp:
         )
         reset_btn.pack(side=tk.RIGHT, padx=10, pady=5)
 
+    def get_param_frame(self, mode):
+        """返回模式的参数框架，第一次使用时创建并显示管线中的当前参数值"""
+        frame = self.param_frames.get(mode)
+        if frame is None:
+            existing = set(getattr(self, "sliders", {})) | set(getattr(self, "toggle_vars", {}))
+            frame = self.param_frame_builders[mode]()
+            self.param_frames[mode] = frame
+            
+            # 新创建的控件显示管线记录的当前值，而不是控件默认值
+            for param_id in list(getattr(self, "sliders", {})) + list(getattr(self, "toggle_vars", {})):
+                if param_id not in existing and param_id in self.pipeline.param_values:
+                    self.show_parameter_value(param_id, self.pipeline.param_values[param_id])
+        return frame
+
     def create_general_params(self):
         frame = ttk.Frame(self.param_container, style="Dark.TFrame")
         
@@ -406,117 +460,25 @@ class TriggerConfigApp:
         
         return frame
 
-    def create_racing_params(self):
-        frame = ttk.Frame(self.param_container, style="Dark.TFrame")
-        
-        # 阻尼开始位置
-        self.create_slider(
-            frame, 
-            "阻尼开始位置", 
-            "DAMPING_START", 
-            0, 192, 0
-        )
-        
-        # 阻尼强度
-        self.create_slider(
-            frame, 
-            "阻尼强度", 
-            "DAMPING_STRENGTH", 
-            1, 255, 30
-        )
-        
-        return frame
-
-    def create_recoil_params(self):
-        frame = ttk.Frame(self.param_container, style="Dark.TFrame")
-        
-        # 振动开始位置
-        self.create_slider(
-            frame, 
-            "振动开始位置", 
-            "VIB_START_POS", 
-            0, 192, 0
-        )
-        
-        # 振动初始强度
-        self.create_slider(
-            frame, 
-            "振动初始强度", 
-            "VIB_START_STRENGTH", 
-            1, 255, 1
-        )
-        
-        # 振动强度
-        self.create_slider(
-            frame, 
-            "振动强度", 
-            "VIB_INTENSITY", 
-            1, 255, 50
-        )
-        
-        # 振动频率
-        self.create_slider(
-            frame, 
-            "振动频率", 
-            "VIB_FREQUENCY", 
-            1, 255, 15
-        )
-        
-        # 从振动开始位置开始输出数据
-        self.create_toggle(
-            frame,
-            "从振动开始位置开始输出数据",
-            "VIB_START_DATA"
-        )
-        
-        return frame
-
-    def create_sniper_params(self):
+    def create_mode_params(self, mode):
+        """按参数定义创建模式的滑块和开关（范围、默认值和标签都来自参数定义）"""
         frame = ttk.Frame(self.param_container, style="Dark.TFrame")
         
-        # 开始位置
-        self.create_slider(
-            frame, 
-            "开始位置", 
-            "START_POS", 
-            0, 192, 50
-        )
-        
-        # 触发行程
-        self.create_slider(
-            frame, 
-            "触发行程", 
-            "TRIGGER_STROKE", 
-            1, 255, 30
-        )
-        
-        # 阻力
-        self.create_slider(
-            frame, 
-            "阻力", 
-            "RESISTANCE", 
-            1, 255, 1
-        )
-        
-        # 从断开开始位置开始输出数据
-        self.create_toggle(
-            frame,
-            "从断开开始位置开始输出数据",
-            "BREAK_START_DATA"
-        )
-        
-        return frame
-
-    def create_lock_params(self):
-        frame = ttk.Frame(self.param_container, style="Dark.TFrame")
+        spec = MODES[mode]
+        for param in spec.params:
+            self.create_slider(
+                frame,
+                param.label,
+                param.name,
+                param.minimum, param.maximum, param.default
+            )
         
-        # 阻尼开始位置
-        self.create_slider(
-            frame, 
-            "阻尼开始位置", 
-            "LOCK_DAMPING_START", 
-            20, 200, 80
-        )
+        for param in spec.toggles:
+            self.create_toggle(
+                frame,
+                param.label,
+                param.name
+            )
         
         return frame
 
@@ -730,19 +692,62 @@ class TriggerConfigApp:
         separator = ttk.Separator(self.console_frame, orient="horizontal")
         separator.pack(fill=tk.X, pady=5)
         
+        # 启用遥测时在控制台上方显示扳机位置和力的实时曲线
+        telemetry = self.pipeline.telemetry
+        if telemetry is not None:
+            self.create_telemetry_view(telemetry)
+        
         # 创建文本控件用于显示消息
         self.console = scrolledtext.ScrolledText(
             self.console_frame,
             width=60,  # 再次增加宽度以显示更多信息
-            height=32,  # 设置固定高度以匹配主UI
+            height=32 if telemetry is None else 22,  # 设置固定高度以匹配主UI
             bg="black",
             fg="#00ff00",
             font=("Consolas", 10),
             wrap=tk.WORD
         )
         self.console.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        if self.early_log:
+            self.console.insert(tk.END, "".join(line + "\n" for line in self.early_log))
+            self.early_log = []
         self.console.config(state=tk.DISABLED)  # 设置为只读
     
+    def create_telemetry_view(self, telemetry, samples=240, width=480, height=120, interval_ms=100):
+        """创建遥测实时曲线（按 interval_ms 节流刷新，只更新已有线条的坐标）"""
+        self.telemetry_label = ttk.Label(self.console_frame, text="遥测: 等待数据", style="Console.TLabel")
+        self.telemetry_label.pack(fill=tk.X, padx=5)
+        canvas = tk.Canvas(self.console_frame, width=width, height=height, bg="black", highlightthickness=0)
+        canvas.pack(fill=tk.X, padx=5, pady=(0, 5))
+        position_line = canvas.create_line(0, height, width, height, fill="#00ccff")
+        force_line = canvas.create_line(0, height, width, height, fill="#ff9900")
+        buffer = telemetry.buffer
+        x_step = width / (samples - 1)
+        y_scale = (height - 2) / 255.0
+        last = [0, time.perf_counter()]
+        
+        def refresh():
+            count = buffer.count
+            if count != last[0]:
+                positions = buffer.latest("position", samples)
+                forces = buffer.latest("force", samples)
+                offset = samples - len(positions)
+                for line, values in ((position_line, positions), (force_line, forces)):
+                    coords = []
+                    for i, value in enumerate(values):
+                        coords.append((offset + i) * x_step)
+                        coords.append(height - 1 - value * y_scale)
+                    if len(coords) >= 4:
+                        canvas.coords(line, *coords)
+                now = time.perf_counter()
+                rate = (count - last[0]) / max(now - last[1], 1e-6)
+                last[0], last[1] = count, now
+                self.telemetry_label.config(
+                    text=f"遥测: 位置 {positions[-1]:3d}  力 {forces[-1]:3d}  {rate:.0f} 样本/秒")
+            self.root.after(interval_ms, refresh)
+        
+        self.root.after(interval_ms, refresh)
+    
     def clear_console(self):
         """清除控制台内容"""
         self.console.config(state=tk.NORMAL)
@@ -752,118 +757,35 @@ class TriggerConfigApp:
 
     def log_message(self, message):
         """向控制台添加消息"""
-        # 获取当前时间，包含毫秒
-        current_time = time.time()
-        milliseconds = int((current_time - int(current_time)) * 1000)
-        timestamp = time.strftime("%H:%M:%S", time.localtime(current_time)) + f".{milliseconds:03d}"
+        # 添加时间戳，包含毫秒
+        line = timestamped(message)
         
         # 确保在UI线程中更新
         def _update():
+            if self.console is None:
+                self.early_log.append(line)
+                return
             self.console.config(state=tk.NORMAL)
-            self.console.insert(tk.END, f"[{timestamp}] {message}\n")
+            self.console.insert(tk.END, line + "\n")
             self.console.see(tk.END)  # 自动滚动到最新消息
             self.console.config(state=tk.DISABLED)
         
         # 如果在主线程中，直接更新；否则使用after方法
-        if threading.current_thread() is threading.main_thread():
-            _update()
-        else:
-            self.root.after(0, _update)
+        self.run_on_ui(_update)
         
         # 同时打印到控制台
-        print(f"[{timestamp}] {message}")
-
-    def format_hex(self, value):
-        """将值格式化为十六进制"""
-        if isinstance(value, int):
-            return f"0x{value:02X}"
-        elif isinstance(value, list):
-            return "[" + ", ".join([f"0x{v:02X}" for v in value]) + "]"
-        return str(value)
-    
-    def format_hex_dec(self, value):
-        """将值格式化为十六进制和十进制"""
-        if isinstance(value, int):
-            return f"0x{value:02X} ({value})"
-        return str(value)
-
-    def monitor_device(self):
-        """监控设备连接状态的后台线程"""
-        while not self.stop_monitor:
-            try:
-                # 检查设备是否已连接
-                devices = list(hid.enumerate(VENDOR_ID, PRODUCT_ID))
-                
-                if devices and not self.connected:
-                    self.log_message(f"设备检测到")
-                    self.connect_device()
-                elif not devices and self.connected:
-                    self.log_message(f"设备断开")
-                    self.disconnect_device()
+        print(line)
 
-            except Exception as e:
-                self.log_message(f"监控错误: {e}")
-                traceback.print_exc()
-
-            time.sleep(1)
-
-    def connect_device(self):
-        """连接到HID设备"""
-        try:
-            self.log_message("开始连接...")
-            
-            if self.device:
-                self.log_message("关闭现有设备...")
-                self.device.close()
-                self.device = None
-            
-            # 列出所有HID设备
-            all_devices = list(hid.enumerate())
-            self.log_message("所有连接的HID设备:")
-            for dev in all_devices:
-                self.log_message(f"  VID: {dev['vendor_id']}, PID: {dev['product_id']}, Path: {dev['path']}")
-            
-            devices = list(hid.enumerate(VENDOR_ID, PRODUCT_ID))
-            self.log_message(f"找到 {len(devices)} 个设备，VID={VENDOR_ID}，PID={PRODUCT_ID}")
-            
-            if not devices:
-                self.log_message("没有找到设备")
-                self.status_label.config(text="设备状态: 未找到设备")
-                return
-            
-            # 连接到第一个匹配的设备
-            self.device = hid.device()
-            self.device.open_path(devices[0]['path'])
-            self.connected = True
-            self.log_message("设备连接成功")
-            
-            # 更新UI（在主线程中）
+    def on_device_event(self, event):
+        """设备状态变化回调（可能来自监控线程）"""
+        if event == "connected":
             self.root.after(0, self.update_ui_connected)
-            
-        except Exception as e:
-            self.log_message(f"连接错误: {e}")
-            traceback.print_exc()
-            self.connected = False
-            self.device = None
-            self.status_label.config(text="设备状态: 连接失败")
-
-    def disconnect_device(self):
-        """断开HID设备"""
-        self.log_message("断开设备...")
-        try:
-            if self.device:
-                self.device.close()
-                self.log_message("设备关闭")
-        except Exception as e:
-            self.log_message(f"关闭设备错误: {e}")
-            traceback.print_exc()
-        
-        self.device = None
-        self.connected = False
-        
-        # 更新UI（在主线程中）
-        self.root.after(0, self.update_ui_disconnected)
-        self.log_message("断开完成")
+        elif event == "disconnected":
+            self.root.after(0, self.update_ui_disconnected)
+        elif event == "not_found":
+            self.root.after(0, lambda: self.status_label.config(text="设备状态: 未找到设备"))
+        elif event == "failed":
+            self.root.after(0, lambda: self.status_label.config(text="设备状态: 连接失败"))
 
     def update_ui_connected(self):
         """更新UI以反映连接设备状态"""
@@ -873,7 +795,7 @@ class TriggerConfigApp:
         """更新UI以反映断开设备状态"""
         self.status_label.config(text="设备状态: 未连接", foreground="#ff5555")
 
-    def select_mode(self, mode):
+    def select_mode(self, mode, send=True):
         self.current_mode = mode
         
         # 更新按钮样式
@@ -883,16 +805,17 @@ class TriggerConfigApp:
             else:
                 btn.configure(style="Mode.TButton")
         
-        # 显示相应的参数框架
-        for m, frame in self.param_frames.items():
-            if m == mode:
-                frame.pack(fill=tk.BOTH, expand=True)
-            else:
+        # 显示相应的参数框架（未创建的框架按需创建）
+        active_frame = self.get_param_frame(mode)
+        for frame in self.param_frames.values():
+            if frame is not active_frame:
                 frame.pack_forget()
+        active_frame.pack(fill=tk.BOTH, expand=True)
         
         # 发送当前配置
-        self.send_mode(mode)
-        self.send_all_parameters()
+        if send:
+            self.send_mode(mode)
+            self.send_all_parameters()
 
     def __init_slider_update_flag(self):
         # 初始化标志以避免无限递归
@@ -922,8 +845,11 @@ class TriggerConfigApp:
             if not from_slider and param_id in self.sliders:
                 self.sliders[param_id].set(value)
             
-            # 使用防抖动发送更新值
-            self.debounced_send_parameter(param_id, value)
+            # 流式或防抖动发送更新值
+            if self.slider_send_mode == "stream":
+                self.stream_send_parameter(param_id, value)
+            else:
+                self.debounced_send_parameter(param_id, value)
         finally:
             # 重置更新标志
             self._updating_slider[param_id] = False
@@ -946,6 +872,69 @@ class TriggerConfigApp:
             lambda: self._actually_send_parameter(param_id, value)
         )
     
+    def stream_send_parameter(self, param_id, value):
+        """拖动时记录最新值，由固定频率的计时器发送"""
+        if self.last_sent_values.get(param_id) == value:
+            self.stream_pending.pop(param_id, None)
+            return
+        
+        # 只保留最新值，计时器来不及发送的中间值直接丢弃
+        self.stream_pending[param_id] = value
+        if self.stream_timer is None:
+            self.stream_timer = self.root.after(0, self._stream_tick)
+    
+    def read_stream_rate(self):
+        """读取环境变量 TRIGGER_STREAM_HZ，格式错误时使用默认的120Hz，超出范围时限制到60-250Hz"""
+        text = os.environ.get("TRIGGER_STREAM_HZ", "120")
+        try:
+            rate = int(text)
+        except ValueError:
+            self.pipeline.log(f"TRIGGER_STREAM_HZ 格式错误: {text}，使用默认的120Hz")
+            return 120
+        if rate <= 0:
+            return 0
+        clamped = min(max(rate, 60), 250)
+        if clamped != rate:
+            self.pipeline.log(f"TRIGGER_STREAM_HZ={rate} 超出60-250Hz，使用{clamped}Hz")
+        return clamped
+    
+    def stream_interval_ms(self):
+        """距下一次发送的等待时间
+        
+        计时器在写入完成后才开始计时，所以从周期中减去写入耗时。每帧写入包含设备的帧间等待
+        （frame_delay，默认10毫秒），写入比周期慢时周期拉长到写入耗时的1.5倍，给界面事件留出时间，
+        实际频率低于设定频率（默认帧间等待下约66Hz）。
+        """
+        latency = self.stream_write_latency
+        period = max(1.0 / self.stream_rate_hz, latency * 1.5)
+        return max(1, int((period - latency) * 1000))
+    
+    def _stream_tick(self):
+        """发送每个参数的最新值"""
+        self.stream_timer = None
+        if not self.stream_pending:
+            return
+        
+        pending = self.stream_pending
+        self.stream_pending = {}
+        start = time.perf_counter()
+        for param_id, value in pending.items():
+            self._actually_send_parameter(param_id, value)
+        elapsed = time.perf_counter() - start
+        # 指数平滑的一轮写入耗时
+        self.stream_write_latency += (elapsed - self.stream_write_latency) * 0.2
+        
+        # 发送期间又有新值时继续下一轮
+        self.stream_timer = self.root.after(self.stream_interval_ms(), self._stream_tick)
+    
+    def cancel_pending_send(self, param_id):
+        """取消参数尚未发送的值（防抖动计时器和流式待发送值）"""
+        timer = self.debounce_timers.get(param_id)
+        if timer is not None:
+            self.root.after_cancel(timer)
+            self.debounce_timers[param_id] = None
+        self.stream_pending.pop(param_id, None)
+    
     def _actually_send_parameter(self, param_id, value):
         """实际发送参数到设备（在防抖动延迟后）"""
         # 记录最后发送的值
@@ -973,185 +962,48 @@ class TriggerConfigApp:
         """当滑块释放时，确保发送最终值"""
         value = self.slider_values[param_id]
         # 强制发送当前值，无论是否与上次发送的值相同
-        if param_id in self.debounce_timers and self.debounce_timers[param_id] is not None:
-            self.root.after_cancel(self.debounce_timers[param_id])
-            self.debounce_timers[param_id] = None
+        self.cancel_pending_send(param_id)
         self._actually_send_parameter(param_id, value)
 
-    def send_hid_report(self, cmd_type, data):
-        """发送HID报告到设备"""
-        try:
-            if not self.device or not self.connected:
-                self.log_message("设备未连接")
-                return 0
-            
-            self.log_message(f"命令类型={self.format_hex_dec(cmd_type)}, 数据={self.format_hex(data)}")
-            
-            # 确保数据是列表
-            if not isinstance(data, list):
-                data = [data]
-            
-            # 计算校验和（简单的所有数据字节相加）
-            checksum = (cmd_type + sum(data)) & 0xFF
-            
-            # 格式化报告: [命令头, 命令类型, 数据长度, ...数据, 校验和, 命令尾, 填充]
-            report = [0, CMD_HEADER, cmd_type, len(data)] + data + [checksum, CMD_FOOTER]
-            
-            # 添加填充以达到64字节
-            report = report + [0] * (64 - len(report))
-            
-            # 格式化报告前10个字节为十六进制显示
-            hex_report = ", ".join([f"0x{b:02X}" for b in report[:10]])
-            self.log_message(f"USB发送: [{hex_report}...] ({len(report)} 字节)")
-            
-            try:
-                bytes_written = self.device.write(report)
-                self.log_message(f"写入 {bytes_written}/{len(report)} 字节")
-                
-                if bytes_written < len(report):
-                    self.log_message(f"警告: 部分写入: {bytes_written}/{len(report)} 字节")
-                
-                time.sleep(0.01)
-                return bytes_written
-                
-            except Exception as e:
-                self.log_message(f"写入失败: {e}")
-                traceback.print_exc()
-                return 0
-                
-        except Exception as e:
-            self.log_message(f"发送错误: {e}")
-            traceback.print_exc()
-            return 0
-
     def send_mode(self, mode):
         """发送模式选择到设备"""
-        if not self.connected:
-            return
-        
-        # 将模式映射到模式ID
-        mode_ids = {
-            "GENERAL": MODE_GENERAL,
-            "RACING": MODE_RACING,
-            "RECOIL": MODE_RECOIL,
-            "SNIPER": MODE_SNIPER,
-            "LOCK": MODE_LOCK
-        }
-        
-        mode_id = mode_ids.get(mode, MODE_GENERAL)
-        
-        # 发送模式命令
-        self.send_hid_report(CMD_TYPE_MODE, [mode_id])
-        self.log_message(f"发送模式: {mode} (ID: {self.format_hex_dec(mode_id)})")
+        self.pipeline.set_mode(mode)
 
     def send_parameter(self, param_id, value):
         """发送参数值到设备"""
-        if not self.connected:
-            return
-        
-        # 将参数ID映射到数字ID
-        param_ids = {
-            # 赛车模式参数
-            "DAMPING_START": 0x21,
-            "DAMPING_STRENGTH": 0x22,
-            
-            # 后座力模式参数
-            "VIB_START_POS": 0x31,
-            "VIB_START_STRENGTH": 0x32,
-            "VIB_INTENSITY": 0x33,
-            "VIB_FREQUENCY": 0x34,
-            "VIB_START_DATA": 0x35,
-            
-            # 狙击模式参数
-            "START_POS": 0x41,
-            "TRIGGER_STROKE": 0x42,
-            "RESISTANCE": 0x43,
-            "BREAK_START_DATA": 0x44,
-            
-            # 锁定模式参数
-            "LOCK_DAMPING_START": 0x51
-        }
-        
-        param_numeric_id = param_ids.get(param_id, 0)
-        
-        if param_numeric_id == 0:
-            self.log_message(f"未知参数ID: {param_id}")
-            return
-        
-        # 发送参数命令: [参数ID, 值高字节, 值低字节]
-        data = [param_numeric_id, (value >> 8) & 0xFF, value & 0xFF]
-        self.send_hid_report(CMD_TYPE_PARAM, data)
-        self.log_message(f"发送参数: {param_id} (ID: {self.format_hex_dec(param_numeric_id)}) = {self.format_hex_dec(value)}")
+        self.pipeline.set_parameter(param_id, value)
 
     def send_all_parameters(self):
         """发送所有参数的当前模式"""
         if not self.connected or not self.current_mode:
             return
         
-        # 清除所有防抖动计时器
-        for param_id in list(self.debounce_timers.keys()):
-            if self.debounce_timers[param_id] is not None:
-                self.root.after_cancel(self.debounce_timers[param_id])
-                self.debounce_timers[param_id] = None
+        # 清除所有防抖动计时器和流式待发送值
+        for param_id in list(self.debounce_timers.keys()) + list(self.stream_pending.keys()):
+            self.cancel_pending_send(param_id)
         
-        # 根据当前模式准备需要发送的参数列表
+        # 按参数定义收集当前模式的所有参数（含开关参数）
         params_to_send = []
-        
-        if self.current_mode == "RACING":
-            mode_params = ["DAMPING_START", "DAMPING_STRENGTH"]
-        elif self.current_mode == "RECOIL":
-            mode_params = ["VIB_START_POS", "VIB_START_STRENGTH", "VIB_INTENSITY", "VIB_FREQUENCY"]
-        elif self.current_mode == "SNIPER":
-            mode_params = ["START_POS", "TRIGGER_STROKE", "RESISTANCE"]
-        elif self.current_mode == "LOCK":
-            mode_params = ["LOCK_DAMPING_START"]
-        else:
-            mode_params = []
-        
-        # 收集当前模式的所有参数
-        for param_id in mode_params:
-            if param_id in self.slider_values:
-                params_to_send.append((param_id, self.slider_values[param_id]))
-        
-        # 添加开关参数
-        if hasattr(self, "toggle_vars"):
-            if self.current_mode == "RECOIL" and "VIB_START_DATA" in self.toggle_vars:
-                value = 1 if self.toggle_vars["VIB_START_DATA"].get() else 0
-                params_to_send.append(("VIB_START_DATA", value))
-            elif self.current_mode == "SNIPER" and "BREAK_START_DATA" in self.toggle_vars:
-                value = 1 if self.toggle_vars["BREAK_START_DATA"].get() else 0
-                params_to_send.append(("BREAK_START_DATA", value))
-        
-        # 按顺序发送参数，并在参数之间添加延迟
-        for i, (param_id, value) in enumerate(params_to_send):
-            # 发送参数
-            self.send_parameter(param_id, value)
+        spec = MODES.get(self.current_mode, DEFAULT_MODE)
+        for param in spec.params:
+            if param.name in self.slider_values:
+                params_to_send.append((param.name, self.slider_values[param.name]))
+        
+        toggle_vars = getattr(self, "toggle_vars", {})
+        for param in spec.toggles:
+            if param.name in toggle_vars:
+                params_to_send.append((param.name, 1 if toggle_vars[param.name].get() else 0))
+        
+        # 按顺序发送参数，管线会在参数之间添加延迟并保持UI响应
+        self.pipeline.send_parameters(params_to_send)
+        for param_id, value in params_to_send:
             self.last_sent_values[param_id] = value
-            
-            # 如果不是最后一个参数，添加延迟
-            if i < len(params_to_send) - 1:
-                # 使用after方法添加延迟，让UI保持响应
-                self.root.update()
-                time.sleep(0.05)  # 50毫秒的延迟
 
     def show_help(self, param_id):
         """显示参数帮助信息"""
-        help_texts = {
-            "DAMPING_START": "阻尼开始位置（0-192）- 设置阻尼效果开始的触发器位置",
-            "DAMPING_STRENGTH": "阻尼强度（1-255）- 控制阻尼效果的强度",
-            "VIB_START_POS": "振动开始位置（0-192）- 设置振动效果开始的触发器位置",
-            "VIB_START_STRENGTH": "振动初始强度（1-255）- 控制振动开始时的初始强度",
-            "VIB_INTENSITY": "振动强度（1-255）- 控制振动效果的整体强度",
-            "VIB_FREQUENCY": "振动频率（1-255）- 控制振动效果的频率",
-            "VIB_START_DATA": "启用时，从振动开始位置开始输出数据",
-            "START_POS": "开始位置（0-192）- 设置狙击模式效果开始的触发器位置",
-            "TRIGGER_STROKE": "触发行程（1-255）- 控制触发器的行程距离",
-            "RESISTANCE": "阻力（1-255）- 控制狙击模式下的阻力大小",
-            "BREAK_START_DATA": "启用时，从断开开始位置开始输出数据",
-            "LOCK_DAMPING_START": "锁定阻尼开始位置（20-200）- 设置锁定模式下阻尼效果开始的位置" 
-        }
-        
-        text = help_texts.get(param_id, "没有帮助信息")
+        param = PARAMS.get(param_id)
+        text = param.help if param else "没有帮助信息"
+        from tkinter import messagebox
         messagebox.showinfo(f"帮助: {param_id}", text)
 
     def reset_to_defaults(self):
@@ -1161,40 +1013,30 @@ class TriggerConfigApp:
         
         self.log_message(f"重置 {self.current_mode} 模式的所有参数为默认值")
         
+        spec = MODES.get(self.current_mode, DEFAULT_MODE)
+        
         # 重置滑块值
-        for param_id, slider in self.sliders.items():
-            # 检查参数是否属于当前模式
-            belongs_to_current_mode = False
-            
-            if self.current_mode == "RACING" and param_id in ["DAMPING_START", "DAMPING_STRENGTH"]:
-                belongs_to_current_mode = True
-            elif self.current_mode == "RECOIL" and param_id in ["VIB_START_POS", "VIB_START_STRENGTH", "VIB_INTENSITY", "VIB_FREQUENCY"]:
-                belongs_to_current_mode = True
-            elif self.current_mode == "SNIPER" and param_id in ["START_POS", "TRIGGER_STROKE", "RESISTANCE"]:
-                belongs_to_current_mode = True
-            elif self.current_mode == "LOCK" and param_id in ["LOCK_DAMPING_START"]:
-                belongs_to_current_mode = True
-                
-            if belongs_to_current_mode and param_id in self.default_values:
-                default_val = self.default_values[param_id]
-                slider.set(default_val)
-                self.slider_values[param_id] = default_val
-                self.value_labels[param_id].config(text=str(default_val))
-                self._actually_send_parameter(param_id, default_val)
+        for param in spec.params:
+            slider = self.sliders.get(param.name)
+            if slider is None:
+                continue
+            default_val = param.default
+            slider.set(default_val)
+            self.slider_values[param.name] = default_val
+            self.value_labels[param.name].config(text=str(default_val))
+            self._actually_send_parameter(param.name, default_val)
         
         # 重置开关值
-        if hasattr(self, "toggle_vars"):
-            for param_id, toggle_var in self.toggle_vars.items():
-                # 检查参数是否属于当前模式
-                if (self.current_mode == "RECOIL" and param_id == "VIB_START_DATA") or \
-                   (self.current_mode == "SNIPER" and param_id == "BREAK_START_DATA"):
-                    # 默认值为False
-                    if toggle_var.get():
-                        toggle_var.set(False)
-                        toggle_bg, toggle_button = self.toggle_widgets[param_id]
-                        toggle_bg.coords(toggle_button, 2, 2, 24, 22)
-                        toggle_bg.itemconfig(toggle_button, fill="#666666")
-                        self._actually_send_parameter(param_id, 0)
+        toggle_vars = getattr(self, "toggle_vars", {})
+        for param in spec.toggles:
+            toggle_var = toggle_vars.get(param.name)
+            # 默认值为关闭
+            if toggle_var is not None and toggle_var.get():
+                toggle_var.set(False)
+                toggle_bg, toggle_button = self.toggle_widgets[param.name]
+                toggle_bg.coords(toggle_button, 2, 2, 24, 22)
+                toggle_bg.itemconfig(toggle_button, fill="#666666")
+                self._actually_send_parameter(param.name, param.default)
         
         # 发送当前模式到设备
         self.send_mode(self.current_mode)
@@ -1206,101 +1048,20 @@ class TriggerConfigApp:
 
     def __del__(self):
         """清理资源，当对象被销毁时"""
-        self.stop_monitor = True
-        self.stop_udp_server = True
-        
-        if self.device:
-            try:
-                self.device.close()
-            except:
-                pass
-        
-        if hasattr(self, "udp_socket"):
-            try:
-                self.udp_socket.close()
-            except:
-                pass
+        if getattr(self, "owns_pipeline", False):
+            self.pipeline.stop()
 
     def load_weapon_config(self, file_path):
         """加载武器配置JSON文件"""
-        import json
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
-                self.log_message(f"已加载配置文件: {file_path}")
-                return config_data
-        except Exception as e:
-            self.log_message(f"加载配置文件失败: {str(e)}")
-            return None
+        return load_weapon_config(file_path, self.log_message)
 
     def get_weapon_trigger_config(self, config_data, weapon_name):
         """根据武器名称获取模式和触发器参数
-        
-        Args:
-            config_data: 加载的JSON配置数据
-            weapon_name: 武器名称
-            
+
         Returns:
             tuple: (mode_name, mode_value, trigger_params) 或者 None如果未找到
         """
-        if not config_data or not weapon_name:
-            return None
-            
-        # 检查是否在vFilters中找到匹配的武器名称
-        for weapon_filter in config_data.get("vFilters", []):
-            if weapon_filter.get("name") == weapon_name:
-                # 获取右触发器配置
-                right_trigger = weapon_filter.get("trigger", {}).get("right", {})
-                mode_value = right_trigger.get("mode", 0)
-                trigger_params = right_trigger.get("param", [0, 0, 0, 0])
-                
-                # 获取模式名称
-                mode_name = "GENERAL"
-                if mode_value == 0:
-                    mode_name = "GENERAL"
-                elif mode_value == 1:
-                    mode_name = "RACING"
-                elif mode_value == 2:
-                    mode_name = "RECOIL"
-                elif mode_value == 3:
-                    mode_name = "SNIPER"
-                elif mode_value == 4:
-                    mode_name = "LOCK"
-                
-                # 检查参数是否有效（非零）
-                has_valid_params = any(param != 0 for param in trigger_params)
-                
-                self.log_message(f"找到武器 '{weapon_name}' 配置: 模式={mode_name}, 参数={trigger_params}")
-                if not has_valid_params:
-                    self.log_message(f"警告: 武器 '{weapon_name}' 在 {mode_name} 模式下没有有效参数")
-                
-                return (mode_name, mode_value, trigger_params)
-                
-        # 如果没有找到，尝试使用默认配置
-        default_config = config_data.get("trigger_default", {})
-        if default_config:
-            right_trigger = default_config.get("right", {})
-            mode_value = right_trigger.get("mode", 0)
-            trigger_params = right_trigger.get("param", [0, 0, 0, 0])
-            
-            # 获取模式名称
-            mode_name = "GENERAL"
-            if mode_value == 0:
-                mode_name = "GENERAL"
-            elif mode_value == 1:
-                mode_name = "RACING"
-            elif mode_value == 2:
-                mode_name = "RECOIL"
-            elif mode_value == 3:
-                mode_name = "SNIPER"
-            elif mode_value == 4:
-                mode_name = "LOCK"
-            
-            self.log_message(f"未找到武器 '{weapon_name}'，使用默认配置: 模式={mode_name}, 参数={trigger_params}")
-            return (mode_name, mode_value, trigger_params)
-        
-        self.log_message(f"未找到武器 '{weapon_name}' 配置，且无默认配置")
-        return None
+        return get_weapon_trigger_config(config_data, weapon_name, self.log_message)
 
     def apply_weapon_config(self, weapon_name, config_file_path=None):
         """应用武器配置到当前设置
@@ -1309,75 +1070,51 @@ class TriggerConfigApp:
             weapon_name: 武器名称
             config_file_path: 配置文件路径，如果为None则使用上次加载的配置
         """
-        # 如果提供了配置文件路径，则加载配置
-        config_data = None
-        if config_file_path:
-            config_data = self.load_weapon_config(config_file_path)
-            self.current_config_data = config_data
-        else:
-            # 使用上次加载的配置
-            if hasattr(self, 'current_config_data'):
-                config_data = self.current_config_data
+        TRACER.new_correlation()
+        return self.pipeline.apply_weapon(weapon_name, config_file_path)
+
+    def on_config_loaded(self, config_path, weapon_names):
+        """管线加载配置后更新武器下拉框"""
+        self.run_on_ui(lambda: self.weapon_combo.configure(values=weapon_names))
+
+    def on_weapon_applied(self, weapon_name, mode_name, values):
+        """管线应用武器配置后同步界面（不再向设备发送）"""
+        def _update():
+            self.weapon_var.set(weapon_name)
+            self.select_mode(mode_name, send=False)
+            for param_id, value in values.items():
+                # 取消尚未发送的滑块值，避免覆盖刚应用的配置
+                self.cancel_pending_send(param_id)
+                self.last_sent_values[param_id] = value
+                self.show_parameter_value(param_id, value)
+        self.run_on_ui(_update)
+
+    def show_parameter_value(self, param_id, value):
+        """只更新界面上的参数显示"""
+        if param_id in getattr(self, "sliders", {}):
+            # 设置更新标志，滑块的command回调不会再次触发发送
+            self.__init_slider_update_flag()
+            self._updating_slider[param_id] = True
+            try:
+                self.sliders[param_id].set(value)
+            finally:
+                self._updating_slider[param_id] = False
+            self.slider_values[param_id] = value
+            self.value_labels[param_id].config(text=str(value))
+        elif param_id in getattr(self, "toggle_vars", {}):
+            if self.toggle_vars[param_id].get() == bool(value):
+                return
+            self.toggle_vars[param_id].set(bool(value))
+            toggle_bg, toggle_button = self.toggle_widgets[param_id]
+            if value:
+                toggle_bg.coords(toggle_button, 26, 2, 48, 22)
+                toggle_bg.itemconfig(toggle_button, fill="#2a7fff")
             else:
-                self.log_message("错误: 未加载配置文件")
-                return False
-        
-        if not config_data:
-            return False
-            
-        # 获取武器配置
-        weapon_config = self.get_weapon_trigger_config(config_data, weapon_name)
-        if not weapon_config:
-            return False
-            
-        mode_name, mode_value, trigger_params = weapon_config
-        
-        # 切换到对应的模式
-        self.select_mode(mode_name)
-        
-        # 应用参数值
-        if mode_name == "RACING" and len(trigger_params) >= 2:
-            # 赛车模式参数 [DAMPING_START, DAMPING_STRENGTH]
-            if trigger_params[0] != 0:
-                self.update_slider_value("DAMPING_START", trigger_params[0], False)
-            if trigger_params[1] != 0:
-                self.update_slider_value("DAMPING_STRENGTH", trigger_params[1], False)
-                
-        elif mode_name == "RECOIL" and len(trigger_params) >= 4:
-            # 后座力模式参数 [VIB_START_POS, VIB_START_STRENGTH, VIB_INTENSITY, VIB_FREQUENCY]
-            if trigger_params[0] != 0:
-                self.update_slider_value("VIB_START_POS", trigger_params[0], False)
-            if trigger_params[1] != 0:
-                self.update_slider_value("VIB_START_STRENGTH", trigger_params[1], False)
-            if trigger_params[2] != 0:
-                self.update_slider_value("VIB_INTENSITY", trigger_params[2], False)
-            if trigger_params[3] != 0:
-                self.update_slider_value("VIB_FREQUENCY", trigger_params[3], False)
-                
-        elif mode_name == "SNIPER" and len(trigger_params) >= 3:
-            # 狙击模式参数 [START_POS, TRIGGER_STROKE, RESISTANCE]
-            if trigger_params[0] != 0:
-                self.update_slider_value("START_POS", trigger_params[0], False)
-            if trigger_params[1] != 0:
-                self.update_slider_value("TRIGGER_STROKE", trigger_params[1], False)
-            if trigger_params[2] != 0:
-                self.update_slider_value("RESISTANCE", trigger_params[2], False)
-                
-        elif mode_name == "LOCK" and len(trigger_params) >= 1:
-            # 锁定模式参数 [LOCK_DAMPING_START]
-            if trigger_params[0] != 0:
-                self.update_slider_value("LOCK_DAMPING_START", trigger_params[0], False)
-        
-        # 发送所有参数到设备
-        self.send_all_parameters()
-        
-        self.log_message(f"已应用武器 '{weapon_name}' 的配置并发送到设备")
-        return True
+                toggle_bg.coords(toggle_button, 2, 2, 24, 22)
+                toggle_bg.itemconfig(toggle_button, fill="#666666")
 
     def create_weapon_config_frame(self):
         """创建武器配置框架"""
-        import tkinter.filedialog as filedialog
-        
         # 创建武器配置框架
         weapon_frame = ttk.LabelFrame(self.main_frame, text="武器配置", style="Dark.TLabelframe")
         weapon_frame.pack(fill=tk.X, padx=10, pady=(10, 5))
@@ -1408,6 +1145,7 @@ class TriggerConfigApp:
     
     def load_config_file(self):
         """加载配置文件对话框"""
+        # 文件对话框只在用户点击时才需要，延迟导入
         import tkinter.filedialog as filedialog
         
         file_path = filedialog.askopenfilename(
@@ -1418,121 +1156,85 @@ class TriggerConfigApp:
         if not file_path:
             return
             
-        # 加载配置文件
-        config_data = self.load_weapon_config(file_path)
-        if not config_data:
+        # 加载配置文件（武器下拉框由 on_config_loaded 更新）
+        if not self.pipeline.load_config(file_path):
             return
-            
-        self.current_config_data = config_data
         
-        # 更新武器下拉框
-        weapon_names = []
-        for weapon_filter in config_data.get("vFilters", []):
-            if "name" in weapon_filter:
-                weapon_names.append(weapon_filter["name"])
-                
+        weapon_names = self.pipeline.weapon_names
         if weapon_names:
             self.weapon_combo["values"] = weapon_names
             self.weapon_combo.current(0)
             # 自动应用第一个武器的配置
             self.apply_weapon_config(weapon_names[0])
-        else:
-            self.weapon_combo["values"] = []
-            self.log_message("警告: 配置文件中没有找到武器")
-
-    def run_udp_server(self):
-        """运行UDP服务器线程"""
-        self.log_message("启动UDP服务器...")
-        try:
-            # 创建UDP套接字
-            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.udp_socket.bind((self.udp_host, self.udp_port))
-            self.log_message(f"UDP服务器已启动，监听 {self.udp_host}:{self.udp_port}")
-            
-            while not self.stop_udp_server:
-                # 接收数据
-                data, addr = self.udp_socket.recvfrom(1024)
-                self.log_message(f"收到UDP数据: {data} ({addr[0]}:{addr[1]})")
-                
-                # 处理数据
-                self.handle_udp_data(data)
-                
-        except Exception as e:
-            self.log_message(f"UDP服务器错误: {e}")
-            traceback.print_exc()
-        
-        finally:
-            # 关闭UDP套接字
-            if hasattr(self, "udp_socket"):
-                self.udp_socket.close()
-                self.log_message("UDP服务器已关闭")
-
-    def handle_udp_data(self, data):
-        """处理UDP数据"""
-        try:
-            # 解码数据
-            weapon_name = data.decode('utf-8').strip()
-            self.log_message(f"收到武器名称: {weapon_name}")
-            
-            # 武器名称映射表（中文名称到下拉菜单值的映射）
-            weapon_name_map = {
-                "手枪": "手枪",
-                "主武器": "主武器",
-                "副武器": "副武器"
-            }
-            
-            # 检查当前是否已加载配置
-            if not hasattr(self, 'current_config_data') or not self.current_config_data:
-                self.log_message("错误: 未加载配置文件，无法应用武器配置")
-                return
-            
-            # 获取当前下拉菜单中的武器列表
-            weapon_values = list(self.weapon_combo["values"])
-            if not weapon_values:
-                self.log_message("错误: 下拉菜单中没有武器选项")
-                return
-            
-            # 查找对应的武器
-            target_weapon = weapon_name_map.get(weapon_name)
-            if not target_weapon:
-                self.log_message(f"错误: 未知的武器名称 '{weapon_name}'")
-                return
-            
-            # 在下拉菜单中查找匹配的武器
-            found_weapon = None
-            for weapon in weapon_values:
-                if target_weapon in weapon:
-                    found_weapon = weapon
-                    break
-            
-            if not found_weapon:
-                self.log_message(f"错误: 在配置中未找到匹配的武器 '{target_weapon}'")
-                return
-            
-            # 在主线程中执行UI更新
-            self.root.after(0, lambda: self._apply_weapon_from_udp(found_weapon))
-            
-        except Exception as e:
-            self.log_message(f"处理UDP数据错误: {e}")
-            traceback.print_exc()
-    
-    def _apply_weapon_from_udp(self, weapon_name):
-        """在主线程中应用武器配置（从UDP接收）"""
-        try:
-            # 设置下拉菜单选择
-            self.weapon_var.set(weapon_name)
-            
-            # 应用配置
-            self.log_message(f"通过UDP应用武器配置: {weapon_name}")
-            self.apply_weapon_config(weapon_name)
-            
-        except Exception as e:
-            self.log_message(f"应用武器配置错误: {e}")
-            traceback.print_exc()
 
 if __name__ == "__main__":
+    # 打包后的程序启动游戏状态进程时需要（见 trigger_gamestate）
+    multiprocessing.freeze_support()
     print("启动触发器配置程序")
+    
+    # 设置环境变量 TRIGGER_TRACE=<文件路径> 启用延迟追踪，退出时导出 Chrome Trace JSON
+    trace_path = os.environ.get("TRIGGER_TRACE")
+    if trace_path:
+        TRACER.enable()
+    
+    # 设置环境变量 TRIGGER_METRICS_PORT=<端口> 启动 Prometheus 指标端点 (http://127.0.0.1:<端口>/metrics)
+    metrics_port = os.environ.get("TRIGGER_METRICS_PORT")
+    if metrics_port:
+        metrics_server = metrics.MetricsServer(metrics.REGISTRY, port=int(metrics_port))
+        print(f"指标端点: http://127.0.0.1:{metrics_server.start()}/metrics")
+    
+    # 在创建界面之前从状态文件恢复上次的配置和设备状态（不解析配置JSON），设备连接后立即写入
+    # 环境变量 TRIGGER_STATE=<文件路径> 指定状态文件，设为空字符串时不恢复也不保存
+    pipeline = create_pipeline()
+    state_path = os.environ.get("TRIGGER_STATE", DEFAULT_STATE_FILE)
+    if state_path:
+        state_store = StateStore(pipeline, state_path)
+        if state_store.restore():
+            def on_device_event(event):
+                if event == "connected":
+                    pipeline.dispatch(pipeline.restore_device)
+            pipeline.device.add_listener(on_device_event)
+        state_store.attach()
+    
+    # 设置环境变量 TRIGGER_TELEMETRY=1 读取设备的遥测输入报告并在控制台上方实时显示
+    # TRIGGER_TELEMETRY_RECORD=<文件路径> 同时把遥测录制为按列存储的文件
+    # 遥测只读取设备，在创建界面之前启动，界面创建控制台时才会添加遥测曲线
+    telemetry_record = os.environ.get("TRIGGER_TELEMETRY_RECORD")
+    if os.environ.get("TRIGGER_TELEMETRY") or telemetry_record:
+        pipeline.start_telemetry(record_path=telemetry_record)
+    
+    # 界面附加到管线后（设备写入回到Tk主线程）才启动设备监控、UDP服务器和其他后台线程，
+    # 管线由界面在第一个窗口显示之后的空闲回调中启动
     root = tk.Tk()
-    app = TriggerConfigApp(root)
+    app = TriggerConfigApp(root, pipeline=pipeline, owns_pipeline=True)
+    
+    # 设置环境变量 TRIGGER_POLL=1 按配置中的 vDefines/vCondition 轮询游戏内存并自动切换武器
+    if os.environ.get("TRIGGER_POLL"):
+        pipeline.start_poller()
+    
+    # 设置环境变量 TRIGGER_LIBRARY=<目录>（多个目录用系统路径分隔符分隔）监视配置库中的游戏进程，
+    # 游戏启动时自动加载对应的配置
+    library = os.environ.get("TRIGGER_LIBRARY")
+    if library:
+        pipeline.start_process_watcher(library.split(os.pathsep))
+    
+    # 设置环境变量 TRIGGER_SOURCES=<来源;来源...> 添加游戏状态来源，例如 tail:game.log;udp-bin:12346
+    # （格式见 trigger_sources）
+    for spec in filter(None, os.environ.get("TRIGGER_SOURCES", "").split(";")):
+        try:
+            pipeline.add_source(spec)
+        except ValueError as e:
+            pipeline.log(f"错误: {e}")
+    
+    # 设置环境变量 TRIGGER_RECORD=<文件路径> 录制会话（UDP数据报和HID报告），可用 trigger_replay.py 回放
+    record_path = os.environ.get("TRIGGER_RECORD")
+    if record_path:
+        pipeline.start_recording(record_path)
+    
     root.mainloop()
+    pipeline.stop()
+    
+    if trace_path:
+        count = TRACER.export_chrome_trace(trace_path)
+        print(f"已导出 {count} 条追踪事件到 {trace_path}")
     print("触发器配置程序关闭")
\ No newline at end of file
@@ -0,0 +1,1525 @@
+"""触发器核心：HID设备通信、武器配置和UDP监听
+
+不依赖Tk，可以在无显示器的环境中运行（见 trigger_daemon.py），
+GUI（trigger_config_gui.py）作为可选的前端附加在 TriggerPipeline 上。
+"""
+import queue
+import socket
+import threading
+import time
+import traceback
+
+import trigger_metrics as metrics
+from trigger_sequencer import TriggerSequencer, build_morph, compile_sequence
+from trigger_sources import SourceHub, make_source
+from trigger_trace import TRACER
+# 协议常量、参数和模式定义见 trigger_schema（这里重新导出，保持原有导入方式）
+from trigger_schema import (
+    CMD_HEADER, CMD_FOOTER, CMD_TYPE_MODE, CMD_TYPE_PARAM, CMD_TYPE_SLOT_QUERY,
+    MODE_GENERAL, MODE_RACING, MODE_RECOIL, MODE_SNIPER, MODE_LOCK,
+    MODES, PARAMS, DEFAULT_MODE, decode_input_report, encode_report, mode_by_value,
+)
+
+# Define USB HID device constants
+VENDOR_ID = 0x2341  # Arduino default VID (change as needed)
+PRODUCT_ID = 0x8036  # Arduino Leonardo default PID (change as needed)
+
+_hid = None
+
+
+def hid_module():
+    """延迟导入 hidapi：首次枚举设备时才加载（在监控线程中，不占用启动时间）"""
+    global _hid
+    if _hid is None:
+        import hid
+        _hid = hid
+    return _hid
+
+
+def timestamped(message):
+    """为日志消息添加时间戳（包含毫秒）"""
+    current_time = time.time()
+    milliseconds = int((current_time - int(current_time)) * 1000)
+    timestamp = time.strftime("%H:%M:%S", time.localtime(current_time)) + f".{milliseconds:03d}"
+    return f"[{timestamp}] {message}"
+
+
+def print_log(message):
+    """默认日志输出：打印到标准输出"""
+    print(timestamped(message))
+
+
+def run_inline(fn):
+    """默认的执行方式：在调用线程中直接执行（见 TriggerPipeline.dispatch）"""
+    fn()
+
+
+def format_hex(value):
+    """将值格式化为十六进制"""
+    if isinstance(value, int):
+        return f"0x{value:02X}"
+    elif isinstance(value, list):
+        return "[" + ", ".join([f"0x{v:02X}" for v in value]) + "]"
+    return str(value)
+
+
+def format_hex_dec(value):
+    """将值格式化为十六进制和十进制"""
+    if isinstance(value, int):
+        return f"0x{value:02X} ({value})"
+    return str(value)
+
+
+def load_weapon_config(file_path, log=print_log):
+    """加载武器配置JSON文件"""
+    import json
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            config_data = json.load(f)
+            log(f"已加载配置文件: {file_path}")
+            return config_data
+    except Exception as e:
+        log(f"加载配置文件失败: {str(e)}")
+        return None
+
+
+def get_weapon_trigger_config(config_data, weapon_name, log=print_log):
+    """根据武器名称获取模式和触发器参数
+
+    Args:
+        config_data: 加载的JSON配置数据
+        weapon_name: 武器名称
+        log: 日志输出函数
+
+    Returns:
+        tuple: (mode_name, mode_value, trigger_params) 或者 None如果未找到
+    """
+    if not config_data or not weapon_name:
+        return None
+
+    # 检查是否在vFilters中找到匹配的武器名称
+    for weapon_filter in config_data.get("vFilters", []):
+        if weapon_filter.get("name") == weapon_name:
+            # 获取右触发器配置
+            right_trigger = weapon_filter.get("trigger", {}).get("right", {})
+            mode_value = right_trigger.get("mode", 0)
+            trigger_params = right_trigger.get("param", [0, 0, 0, 0])
+
+            # 获取模式名称
+            mode_name = mode_by_value(mode_value).name
+
+            # 检查参数是否有效（非零）
+            has_valid_params = any(param != 0 for param in trigger_params)
+
+            log(f"找到武器 '{weapon_name}' 配置: 模式={mode_name}, 参数={trigger_params}")
+            if not has_valid_params:
+                log(f"警告: 武器 '{weapon_name}' 在 {mode_name} 模式下没有有效参数")
+
+            return (mode_name, mode_value, trigger_params)
+
+    # 如果没有找到，尝试使用默认配置
+    default_config = config_data.get("trigger_default", {})
+    if default_config:
+        right_trigger = default_config.get("right", {})
+        mode_value = right_trigger.get("mode", 0)
+        trigger_params = right_trigger.get("param", [0, 0, 0, 0])
+
+        # 获取模式名称
+        mode_name = mode_by_value(mode_value).name
+
+        log(f"未找到武器 '{weapon_name}'，使用默认配置: 模式={mode_name}, 参数={trigger_params}")
+        return (mode_name, mode_value, trigger_params)
+
+    log(f"未找到武器 '{weapon_name}' 配置，且无默认配置")
+    return None
+
+
+def get_weapon_names(config_data):
+    """返回配置中所有武器名称"""
+    weapon_names = []
+    for weapon_filter in config_data.get("vFilters", []):
+        if "name" in weapon_filter:
+            weapon_names.append(weapon_filter["name"])
+    return weapon_names
+
+
+class WeaponProfile:
+    """编译后的武器配置：模式、参数数组和已限制范围的参数值"""
+    __slots__ = ("name", "mode", "params", "values", "sequence", "compiled_sequence", "condition", "priority",
+                 "index")
+
+    def __init__(self, name, mode_value, params, sequence=None, condition=None, priority=0, curves=None):
+        self.name = name
+        self.mode = mode_by_value(mode_value)
+        self.params = tuple(int(value) for value in params)  # 配置中的参数数组（0表示保留当前值）
+        # 参数数组按位置对应模式参数: ((ParamSpec, 值), ...)，跳过0
+        self.values = self.map_values(curves)
+        self.sequence = sequence  # 配置中的 sequence（原始数据）
+        self.compiled_sequence = None   # 编译后的序列（见 compile_sequences），切换时直接播放
+        self.condition = condition  # 配置中的 vCondition（原始数据，见 trigger_poller）
+        self.priority = priority
+        self.index = None         # 在同一模式的配置中的序号（见 TransitionTable）
+
+    def map_values(self, curves=None):
+        """按响应曲线（见 trigger_curves）映射配置中的参数值，没有曲线时只限制范围"""
+        pairs = ((spec, value) for spec, value in zip(self.mode.params, self.params) if value != 0)
+        if curves:
+            return tuple((spec, curves.map(spec, value)) for spec, value in pairs)
+        return tuple((spec, spec.clamp(value)) for spec, value in pairs)
+
+    def compile_sequence(self, curves=None):
+        """编译配置中的序列（按响应曲线映射关键帧的值），无效时抛出 ValueError"""
+        self.compiled_sequence = None
+        if self.sequence:
+            self.compiled_sequence = compile_sequence(self.name, self.mode, self.sequence, curves)
+
+    def to_state(self):
+        return (self.name, self.mode.value, self.params, self.sequence, self.condition, self.priority)
+
+
+class TransitionTable:
+    """同一模式的武器配置之间切换所需的最少参数帧
+
+    从配置A切换到B（设备上是刚应用完A的状态）时，只需要发送B中非0且与A不同的参数；
+    A中为0（保留当前值）的参数无法确定设备上的值，只要B设置了就发送。
+    每个模式的配置按序号排列，A→B的差异存放在 table[A.index * 数量 + B.index]，
+    元素为 ((ParamSpec, 值, 预编码帧), ...)。模式不同的切换不在表中（需要发送模式和全部参数）。
+
+    配置数量不超过 EAGER_LIMIT 的模式在加载时建好整张表；更大的模式在第一次用到某个切换时才计算并缓存。
+    """
+    EAGER_LIMIT = 64
+
+    def __init__(self, profiles):
+        self.groups = {}    # 模式名称 -> [WeaponProfile, ...]
+        for profile in profiles:
+            group = self.groups.setdefault(profile.mode.name, [])
+            profile.index = len(group)
+            group.append(profile)
+        self.tables = {}    # 模式名称 -> 列表（预先建好）或字典（按需计算）
+        for mode_name, group in self.groups.items():
+            count = len(group)
+            if count <= self.EAGER_LIMIT:
+                self.tables[mode_name] = [self.delta(a, b) for a in group for b in group]
+            else:
+                self.tables[mode_name] = {}
+
+    @staticmethod
+    def delta(old, new):
+        """计算从 old 切换到 new 需要发送的参数帧"""
+        old_values = {spec.name: value for spec, value in old.values}
+        return tuple((spec, value, spec.encode(value))
+                     for spec, value in new.values if old_values.get(spec.name) != value)
+
+    def refresh(self, profiles):
+        """配置的参数值变化后重新计算涉及这些配置的差异帧"""
+        for mode_name in {profile.mode.name for profile in profiles}:
+            group = self.groups[mode_name]
+            count = len(group)
+            indices = {profile.index for profile in profiles if profile.mode.name == mode_name}
+            table = self.tables[mode_name]
+            if isinstance(table, list):
+                for i in indices:
+                    for j in range(count):
+                        table[i * count + j] = self.delta(group[i], group[j])
+                        table[j * count + i] = self.delta(group[j], group[i])
+            else:
+                for key in [key for key in table if key // count in indices or key % count in indices]:
+                    del table[key]
+
+    def get(self, old, new):
+        """返回 old→new 的参数帧，模式不同时返回 None"""
+        if old.mode is not new.mode:
+            return None
+        table = self.tables[new.mode.name]
+        key = old.index * len(self.groups[new.mode.name]) + new.index
+        if isinstance(table, list):
+            return table[key]
+        frames = table.get(key)
+        if frames is None:
+            frames = table[key] = self.delta(old, new)
+        return frames
+
+
+class CompiledConfig:
+    """编译后的武器配置文件，按武器名称直接查找（同名武器以第一个为准）"""
+    __slots__ = ("profiles", "default", "weapon_names", "game", "aliases", "transitions", "_state")
+
+    def __init__(self, profiles, default, weapon_names, game=None, aliases=None):
+        self.profiles = profiles          # 武器名称 -> WeaponProfile
+        self.default = default            # trigger_default 对应的 WeaponProfile 或 None
+        self.weapon_names = weapon_names
+        # 游戏进程和内存定义: {"process_name", "period", "defines"}（原始数据，见 trigger_poller）
+        self.game = game or {}
+        # 来源发布的名称 -> 配置中的武器名称（配置文件的 vAliases）
+        self.aliases = aliases or {}
+        self.transitions = TransitionTable(list(profiles.values()) + ([default] if default else []))
+        self._state = None
+
+    def to_state(self):
+        """转换为只含基本类型的元组（可以用 marshal 保存），配置不变，只转换一次"""
+        if self._state is None:
+            self._state = (
+                tuple(self.weapon_names),
+                tuple(profile.to_state() for profile in self.profiles.values()),
+                self.default.to_state() if self.default else None,
+                self.game,
+                self.aliases,
+            )
+        return self._state
+
+    @classmethod
+    def from_state(cls, state, curves=None, log=print_log):
+        weapon_names, profiles, default, game, aliases = state
+        profiles = [WeaponProfile(*profile, curves=curves) for profile in profiles]
+        compiled_config = cls({profile.name: profile for profile in profiles},
+                              WeaponProfile(*default, curves=curves) if default else None, list(weapon_names),
+                              game, aliases)
+        compiled_config.compile_sequences(curves, log)
+        return compiled_config
+
+    def compile_sequences(self, curves=None, log=print_log):
+        """编译所有武器的序列，无效的序列记录警告并不播放（武器的模式和参数照常应用）"""
+        for profile in self.profiles.values():
+            try:
+                profile.compile_sequence(curves)
+            except ValueError as e:
+                log(f"警告: {e}，不播放该武器的序列")
+
+    def apply_curves(self, curves, names=None):
+        """按新的响应曲线重新计算参数值
+
+        只重新编译用到了 names 中参数（None 表示全部）的配置和它们的差异帧（序列总是重新编译），
+        返回值变化的配置列表。
+        """
+        changed = []
+        profiles = list(self.profiles.values()) + ([self.default] if self.default else [])
+        for profile in profiles:
+            if profile.compiled_sequence is not None:
+                # 关键帧可能用到参数数组之外的参数，序列总是重新编译（加载时已经验证过）
+                profile.compile_sequence(curves)
+            if names is not None and not any(spec.name in names for spec, _ in profile.values):
+                continue
+            values = profile.map_values(curves)
+            if values != profile.values:
+                profile.values = values
+                changed.append(profile)
+        if changed:
+            self.transitions.refresh(changed)
+        return changed
+
+    def to_config_data(self):
+        """还原为与配置文件结构相同的数据（录制会话等需要JSON结构的地方使用）"""
+        def trigger(profile):
+            return {"right": {"mode": profile.mode.value, "param": list(profile.params)}}
+
+        filters = []
+        for profile in self.profiles.values():
+            entry = {"name": profile.name, "priority": profile.priority, "trigger": trigger(profile)}
+            if profile.condition:
+                entry["vCondition"] = profile.condition
+            if profile.sequence:
+                entry["sequence"] = profile.sequence
+            filters.append(entry)
+        config_data = {"vFilters": filters}
+        game = self.game
+        if game:
+            config_data.update(process_name=game.get("process_name"), period=game.get("period"),
+                               vDefines=game.get("defines", []))
+        if self.aliases:
+            config_data["vAliases"] = dict(self.aliases)
+        if self.default:
+            config_data["trigger_default"] = trigger(self.default)
+        return config_data
+
+
+def compile_config(config_data, curves=None, log=print_log):
+    """编译武器配置数据（curves 为参数响应曲线，见 trigger_curves），序列无效的武器记录警告"""
+    profiles = {}
+    for weapon_filter in config_data.get("vFilters", []):
+        name = weapon_filter.get("name")
+        if name is None or name in profiles:
+            continue
+        right_trigger = weapon_filter.get("trigger", {}).get("right", {})
+        profiles[name] = WeaponProfile(name, right_trigger.get("mode", 0), right_trigger.get("param", [0, 0, 0, 0]),
+                                       weapon_filter.get("sequence") or None,
+                                       weapon_filter.get("vCondition") or None, weapon_filter.get("priority", 0),
+                                       curves)
+
+    default = None
+    default_config = config_data.get("trigger_default", {})
+    if default_config:
+        right_trigger = default_config.get("right", {})
+        default = WeaponProfile(None, right_trigger.get("mode", 0), right_trigger.get("param", [0, 0, 0, 0]),
+                                curves=curves)
+
+    game = {}
+    if config_data.get("vDefines"):
+        game = {
+            "process_name": config_data.get("process_name"),
+            "period": config_data.get("period", 50),
+            "defines": config_data["vDefines"],
+        }
+    # 别名只保留指向配置中武器的文本名称
+    aliases = config_data.get("vAliases")
+    aliases = {str(alias): weapon for alias, weapon in aliases.items()
+               if weapon in profiles and str(alias).strip()} if isinstance(aliases, dict) else {}
+    compiled_config = CompiledConfig(profiles, default, get_weapon_names(config_data), game, aliases)
+    compiled_config.compile_sequences(curves, log)
+    return compiled_config
+
+
+class TriggerDevice:
+    """HID设备连接和命令帧发送"""
+
+    def __init__(self, log=print_log, vendor_id=VENDOR_ID, product_id=PRODUCT_ID, backend=None):
+        self.log = log
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+
+        # HID后端，默认为 hidapi；测试和回放时可传入 trigger_device_sim.SimulatedHid
+        self.backend = backend
+
+        # 每帧写入后的等待时间（秒）；burst 帧连续写入后才等待一次
+        self.frame_delay = 0.01
+        self.burst = 1
+        # 报告长度，None 表示使用编码好的64字节报告（不会短于帧本身）
+        self.report_size = None
+        self._burst_count = 0
+        self._last_write = 0.0
+
+        # 节奏配置文件（见 trigger_pacing），设置后连接时按 VID:PID 加载帧间隔、连续帧数和报告长度
+        self.pacing_path = None
+        self.pacing = None
+
+        # 会话录制（trigger_recorder.SessionRecorder），启用时记录每一帧
+        self.recorder = None
+
+        self.device = None
+        self.connected = False
+        self.ever_connected = False  # 用于统计重连次数
+        self.stop_monitor = False
+        self.monitor_thread = None
+
+        # 打开、关闭和写入都在这把锁下进行，监控线程和发送线程不会同时操作设备
+        self.io_lock = threading.RLock()
+        # 读取和关闭设备句柄互斥：hidapi 读取时释放 GIL，读取过程中关闭句柄会访问已释放的内存。
+        # 读取不持有 io_lock（不阻塞写入），关闭时先等正在进行的读取返回（最多一次读取超时）
+        self.read_lock = threading.Lock()
+
+        # 状态监听器: fn(event)，event 为 "connected"/"disconnected"/"not_found"/"failed"
+        self.listeners = []
+
+        # 遥测读取线程运行时由它读取所有输入报告，命令的应答通过 deliver_input 转交给 request
+        self.input_reader = None
+        self._replies = queue.Queue()
+        self._awaiting_reply = False
+
+    def add_listener(self, listener):
+        """添加设备状态监听器"""
+        self.listeners.append(listener)
+
+    def _notify(self, event):
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                self.log(f"设备状态回调错误: {e}")
+                traceback.print_exc()
+
+    def start_monitor(self):
+        """启动设备监控线程"""
+        self.stop_monitor = False
+        self.monitor_thread = threading.Thread(target=self.monitor_device, name="hid-monitor", daemon=True)
+        self.monitor_thread.start()
+
+    def hid(self):
+        """返回HID后端"""
+        return self.backend if self.backend is not None else hid_module()
+
+    def monitor_device(self):
+        """监控设备连接状态的后台线程"""
+        while not self.stop_monitor:
+            try:
+                # 检查设备是否已连接
+                devices = list(self.hid().enumerate(self.vendor_id, self.product_id))
+
+                if devices and not self.connected:
+                    self.log(f"设备检测到")
+                    self.connect()
+                elif not devices and self.connected:
+                    self.log(f"设备断开")
+                    self.disconnect()
+
+            except Exception as e:
+                self.log(f"监控错误: {e}")
+                traceback.print_exc()
+
+            time.sleep(1)
+
+    def connect(self):
+        """连接到HID设备"""
+        try:
+            self.log("开始连接...")
+
+            with self.io_lock:
+                if self.device:
+                    self.log("关闭现有设备...")
+                    with self.read_lock:
+                        self.device.close()
+                        self.device = None
+
+                # 列出所有HID设备
+                hid = self.hid()
+                all_devices = list(hid.enumerate())
+                self.log("所有连接的HID设备:")
+                for dev in all_devices:
+                    self.log(f"  VID: {dev['vendor_id']}, PID: {dev['product_id']}, Path: {dev['path']}")
+
+                devices = list(hid.enumerate(self.vendor_id, self.product_id))
+                self.log(f"找到 {len(devices)} 个设备，VID={self.vendor_id}，PID={self.product_id}")
+
+                if not devices:
+                    self.log("没有找到设备")
+                    self._notify("not_found")
+                    return
+
+                # 连接到第一个匹配的设备
+                self.device = hid.device()
+                self.device.open_path(devices[0]['path'])
+                # 在第一次写入之前加载该设备的写入节奏
+                if self.pacing_path:
+                    self.load_pacing(devices[0]['vendor_id'], devices[0]['product_id'])
+                self.connected = True
+
+            self.log("设备连接成功")
+
+            metrics.DEVICE_CONNECTED.set(1)
+            if self.ever_connected:
+                metrics.RECONNECTS.inc()
+            self.ever_connected = True
+
+            self._notify("connected")
+
+        except Exception as e:
+            self.log(f"连接错误: {e}")
+            traceback.print_exc()
+            self.connected = False
+            with self.io_lock, self.read_lock:
+                device, self.device = self.device, None
+                if device is not None:
+                    # 关闭已经打开的句柄
+                    try:
+                        device.close()
+                    except Exception:
+                        pass
+            self._notify("failed")
+
+    def load_pacing(self, vendor_id, product_id):
+        """从节奏配置文件加载该设备的写入节奏，出错时记录日志并使用默认节奏（不影响连接）"""
+        from trigger_pacing import load_pacing
+
+        try:
+            pacing = load_pacing(self.pacing_path, vendor_id, product_id)
+        except Exception as e:
+            self.log(f"错误: 无法加载写入节奏，使用默认节奏: {e}")
+            return
+        if pacing is None:
+            return
+        self.pacing = pacing
+        self.frame_delay = pacing.frame_delay
+        self.burst = pacing.burst
+        self.report_size = pacing.report_size
+        if self.recorder:
+            self.recorder.record_settings({"pacing": self.pacing_settings()})
+        self.log(f"写入节奏: {pacing}")
+
+    def pacing_settings(self):
+        """当前的写入节奏（录制会话时记录，回放时按同样的报告长度发送）"""
+        return {"frame_delay": self.frame_delay, "burst": self.burst, "report_size": self.report_size,
+                "param_delay": self.pacing.param_delay if self.pacing is not None else None}
+
+    def disconnect(self):
+        """断开HID设备"""
+        self.log("断开设备...")
+        with self.io_lock, self.read_lock:
+            try:
+                if self.device:
+                    self.device.close()
+                    self.log("设备关闭")
+            except Exception as e:
+                self.log(f"关闭设备错误: {e}")
+                traceback.print_exc()
+
+            self.device = None
+            self.connected = False
+        metrics.DEVICE_CONNECTED.set(0)
+
+        self._notify("disconnected")
+        self.log("断开完成")
+
+    def close(self):
+        """停止监控并关闭设备"""
+        self.stop_monitor = True
+        with self.io_lock, self.read_lock:
+            if self.device:
+                try:
+                    self.device.close()
+                except:
+                    pass
+            self.device = None
+            self.connected = False
+
+    def read_report(self, size=64, timeout_ms=50):
+        """读取一个输入报告（遥测线程使用），超时返回空列表，设备未连接返回 None
+
+        读取不持有 io_lock，不会阻塞写入；持有 read_lock，关闭设备会等到读取返回之后。
+        """
+        with self.read_lock:
+            device = self.device
+            if device is None or not self.connected:
+                return None
+            try:
+                return device.read(size, timeout_ms)
+            except (OSError, ValueError):
+                return None
+
+    def request(self, cmd_type, data, timeout=0.5):
+        """发送命令并等待设备的应答（命令类型相同的输入报告），返回应答数据，超时返回 None
+
+        设备固件不支持该命令时不会应答，调用方按不支持处理。
+        """
+        while not self._replies.empty():
+            self._replies.get_nowait()
+        self._awaiting_reply = True
+        try:
+            if not self.send_hid_report(cmd_type, data):
+                return None
+            deadline = time.perf_counter() + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                if self.input_reader is not None:
+                    try:
+                        report = self._replies.get(timeout=remaining)
+                    except queue.Empty:
+                        return None
+                else:
+                    report = self.read_report(64, max(1, int(remaining * 1000)))
+                    if report is None:
+                        return None
+                decoded = decode_input_report(report) if report else None
+                if decoded is not None and decoded[0] == cmd_type:
+                    return decoded[1]
+        finally:
+            self._awaiting_reply = False
+
+    def deliver_input(self, report):
+        """遥测读取线程收到非遥测报告时调用，有命令在等待应答时转交并返回 True"""
+        if not self._awaiting_reply:
+            return False
+        self._replies.put(report)
+        return True
+
+    def send_hid_report(self, cmd_type, data):
+        """组帧并发送HID报告到设备"""
+        # 确保数据是列表
+        if not isinstance(data, list):
+            data = [data]
+        return self.write_report(encode_report(cmd_type, data))
+
+    def write_report(self, report):
+        """发送已编码的HID报告到设备"""
+        with TRACER.span("send_hid_report"):
+            return self._write_report(report)
+
+    def _write_report(self, report):
+        """写入HID报告"""
+        try:
+            if not self.device or not self.connected:
+                self.log("设备未连接")
+                return 0
+
+            # 报告格式: [报告ID, 命令头, 命令类型, 数据长度, ...数据, 校验和, 命令尾, 填充]
+            size = self.report_size
+            if size and size < len(report):
+                # 只去掉填充，不截断帧本身
+                report = report[:max(size, report[3] + 6)]
+            self.log(f"命令类型={format_hex_dec(report[2])}, 数据={format_hex(list(report[4:4 + report[3]]))}")
+
+            # 格式化报告前10个字节为十六进制显示
+            hex_report = ", ".join([f"0x{b:02X}" for b in report[:10]])
+            self.log(f"USB发送: [{hex_report}...] ({len(report)} 字节)")
+
+            try:
+                with self.io_lock:
+                    if not self.device:
+                        self.log("设备未连接")
+                        return 0
+                    write_start = time.perf_counter()
+                    with TRACER.span("device.write"):
+                        bytes_written = self.device.write(report)
+                    metrics.FRAME_WRITE_LATENCY.observe(time.perf_counter() - write_start)
+                metrics.FRAMES_WRITTEN.inc()
+                if self.recorder:
+                    self.recorder.record_hid(report)
+                self.log(f"写入 {bytes_written}/{len(report)} 字节")
+
+                if bytes_written < len(report):
+                    metrics.PARTIAL_WRITES.inc()
+                    self.log(f"警告: 部分写入: {bytes_written}/{len(report)} 字节")
+
+                if self.frame_delay:
+                    # 距上一次写入已经超过帧间隔时重新计数
+                    if write_start - self._last_write > self.frame_delay:
+                        self._burst_count = 0
+                    self._burst_count += 1
+                    if self._burst_count >= self.burst:
+                        self._burst_count = 0
+                        with TRACER.span("sleep frame_delay"):
+                            time.sleep(self.frame_delay)
+                    self._last_write = time.perf_counter()
+                return bytes_written
+
+            except Exception as e:
+                metrics.WRITE_ERRORS.inc()
+                self.log(f"写入失败: {e}")
+                traceback.print_exc()
+                return 0
+
+        except Exception as e:
+            self.log(f"发送错误: {e}")
+            traceback.print_exc()
+            return 0
+
+    def send_mode(self, mode):
+        """发送模式选择到设备（mode 为模式名称或 ModeSpec）"""
+        if not self.connected:
+            return
+
+        spec = mode if not isinstance(mode, str) else MODES.get(mode, DEFAULT_MODE)
+
+        # 发送预先编码好的模式帧
+        self.write_report(spec.frame)
+        self.log(f"发送模式: {spec.name} (ID: {format_hex_dec(spec.id)})")
+
+    def send_parameter(self, param_id, value, frame=None):
+        """发送参数值到设备（值会限制在参数范围内）
+
+        frame 为预先编码好的参数帧（值已限制范围），传入时直接写入。
+        """
+        if not self.connected:
+            return
+
+        spec = PARAMS.get(param_id)
+        if spec is None:
+            self.log(f"未知参数ID: {param_id}")
+            return
+
+        # 发送参数命令: [参数ID, 值高字节, 值低字节]
+        if frame is None:
+            value = spec.clamp(value)
+            frame = spec.encode(value)
+        self.write_report(frame)
+        self.log(f"发送参数: {param_id} (ID: {format_hex_dec(spec.id)}) = {format_hex_dec(value)}")
+
+
+class TriggerPipeline:
+    """UDP→HID 处理管线：加载配置、接收武器切换命令并驱动设备
+
+    dispatch 决定武器切换在哪个线程执行：无界面启动（start）时为一个专用的执行线程，
+    附加GUI后由GUI替换为 root.after，所有设备写入都回到Tk主线程。两种情况下UDP、
+    各状态来源和内部任务的切换都在同一个线程中按顺序执行，不会同时写入设备。
+    """
+
+    def __init__(self, device=None, log_handlers=None, udp_host="127.0.0.1", udp_port=12345):
+        self.log_handlers = list(log_handlers) if log_handlers else [print_log]
+        self.device = device or TriggerDevice(self.log)
+
+        # UDP通信设置
+        self.udp_host = udp_host      # UDP监听地址
+        self.udp_port = udp_port      # UDP监听端口
+        self.stop_udp_server = False  # 控制UDP服务器线程停止
+        self.udp_socket = None
+        self.udp_server_thread = None
+
+        # 武器配置数据
+        self.config_path = None
+        self.current_config_data = None
+        self.compiled_config = None   # 编译后的配置，武器切换只使用它
+        self.weapon_names = []
+
+        # 当前状态
+        self.current_weapon = None
+        self.current_mode = None
+        self.param_values = {name: spec.default for name, spec in PARAMS.items()}  # 最后发送到设备的参数值
+        # 设备上刚应用完的武器配置（之后有任何其他写入或设备重新连接时清除），下一次切换只发送差异
+        self.applied_profile = None
+        self.device.add_listener(self._on_device_event)
+
+        # 参数帧之间的延迟（秒）
+        self.param_delay = 0.05
+
+        # 武器切换的执行方式，默认在调用线程中直接执行（测试、回放），
+        # 没有替换时 start 改为专用的执行线程（self.executor）
+        self.dispatch = run_inline
+        self.executor = None
+
+        # 参数帧之间的空闲回调（GUI用来保持界面响应）
+        self.idle_callback = None
+
+        # 时变参数序列（武器配置中的 sequence），新的武器切换会取消正在播放的序列
+        self.sequencer = TriggerSequencer(self)
+
+        # 同一模式的武器之间切换时的参数过渡：时长（秒，0表示直接切换）和最大帧率
+        self.morph_duration = 0.0
+        self.morph_rate_hz = 50
+
+        # 会话录制（见 start_recording）
+        self.recorder = None
+
+        # 运行时性能分析（收到 !profile 控制命令时创建）
+        self.profiler = None
+
+        # 状态持久化（见 trigger_state.StateStore）
+        self.state_store = None
+
+        # 多客户端命令代理（见 enable_broker），未启用时收到的命令直接调度
+        self.broker = None
+
+        # 游戏状态来源（UDP、游戏内存轮询和 add_source 添加的来源）汇合到武器切换（见 trigger_sources）
+        self.sources = SourceHub(self)
+        self._resolved = (None, {})     # (编译后的配置, 状态 -> 武器名称)
+
+        # 遥测输入（见 start_telemetry）
+        self.telemetry = None
+
+        # 游戏内存条件轮询（见 start_poller），poll_options 不为 None 时加载新配置后重新启动
+        self.poller = None
+        self.poll_options = None
+
+        # 游戏进程监视（见 start_process_watcher）
+        self.process_watcher = None
+
+        # 设备配置槽（见 enable_slots）：slot_store 为 "ram"/"flash"，slot_table 为设备上已有的当前配置的槽
+        self.slot_store = None
+        self.slot_table = None
+        # 设备上的模式和参数与 param_values 一致（全部发送过一次之后），只有这时才能只激活槽
+        self.device_synced = False
+
+        # 参数响应曲线（见 load_curves），配置中的参数值编译时经过曲线映射
+        self.curves = None
+        self.curves_path = None
+
+        # 配置/武器变化监听器
+        self.config_listeners = []   # fn(config_path, weapon_names)
+        self.weapon_listeners = []   # fn(weapon_name, mode_name, values)
+        self.state_listeners = []    # fn()，配置、模式、参数或当前武器变化时调用（不传参数，要求很快返回）
+
+    def _on_device_event(self, event):
+        # 设备重新连接后状态未知，下一次切换发送全部参数
+        if event in ("connected", "disconnected"):
+            self.applied_profile = None
+            self.device_synced = False
+            self.slot_table = None
+            if event == "connected" and self.device.pacing is not None:
+                self.param_delay = self.device.pacing.param_delay
+            if event == "connected" and self.slot_store:
+                self.dispatch(self.sync_slots)
+
+    def log(self, message):
+        """输出日志到所有日志处理器"""
+        for handler in self.log_handlers:
+            handler(message)
+
+    def enable_broker(self, policies=(), default_policy=None):
+        """按客户端限流并公平调度UDP命令（见 trigger_broker）"""
+        from trigger_broker import CommandBroker
+
+        self.broker = CommandBroker(lambda fn: self.dispatch(fn), self.log, policies, default_policy)
+        for policy in self.broker.policies:
+            self.log(f"客户端规则: {policy}")
+        return self.broker
+
+    def start(self):
+        """启动执行线程、设备监控和UDP服务器线程"""
+        if self.dispatch is run_inline:
+            from concurrent.futures import ThreadPoolExecutor
+
+            # 无界面时所有切换在一个执行线程中按顺序执行（各来源的线程只负责排队）
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trigger-dispatch")
+            self.dispatch = lambda fn: self.executor.submit(self._execute, fn)
+        self.device.start_monitor()
+        if self.broker:
+            self.broker.start()
+        self.stop_udp_server = False
+        self.udp_server_thread = threading.Thread(target=self.run_udp_server, name="udp-server", daemon=True)
+        self.udp_server_thread.start()
+
+    def stop(self):
+        """停止所有后台线程并释放资源"""
+        self.stop_udp_server = True
+        self.sources.stop()
+        if self.sources.channels:
+            self.sources.log_stats()
+        if self.process_watcher:
+            self.process_watcher.stop()
+        self.stop_poller()
+        if self.broker:
+            self.broker.stop()
+        self.sequencer.cancel()
+        if self.executor:
+            # 丢弃还没开始的任务，等正在执行的切换写完再关闭设备
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            self.dispatch = run_inline
+        self.stop_recording()
+        if self.profiler:
+            self.profiler.stop_all()
+        if self.state_store:
+            self.state_store.close()
+        if self.telemetry:
+            self.stop_telemetry_recording()
+            self.telemetry.stop()
+        self.device.close()
+        if self.udp_socket:
+            try:
+                self.udp_socket.close()
+            except:
+                pass
+
+    def load_config(self, file_path):
+        """加载武器配置文件，返回是否成功"""
+        config_data = load_weapon_config(file_path, self.log)
+        if not config_data:
+            return False
+        self.set_config(config_data, file_path)
+        return True
+
+    def set_config(self, config_data, file_path=None):
+        """使用已解析的配置数据（回放录制文件时使用）"""
+        if self.recorder:
+            self.recorder.record_config(config_data)
+
+        self.config_path = file_path
+        self.current_config_data = config_data
+        self.compiled_config = compile_config(config_data, self.curves, self.log)
+        self.applied_profile = None
+        self.slot_table = None
+        self.weapon_names = self.compiled_config.weapon_names
+        if not self.weapon_names:
+            self.log("警告: 配置文件中没有找到武器")
+
+        for listener in list(self.config_listeners):
+            listener(file_path, list(self.weapon_names))
+        self.notify_state_changed()
+        if self.poll_options is not None:
+            self._restart_poller()
+        if self.slot_store and self.device.connected:
+            self.dispatch(self.sync_slots)
+
+    def start_recording(self, file_path):
+        """开始录制UDP数据报、HID报告和配置到文件"""
+        from trigger_recorder import SessionRecorder
+
+        self.stop_recording()
+        recorder = SessionRecorder(file_path)
+        if self.current_config_data:
+            recorder.record_config(self.current_config_data)
+        elif self.compiled_config:
+            # 从状态文件恢复时没有原始JSON，录制等价的配置结构
+            recorder.record_config(self.compiled_config.to_config_data())
+        recorder.record_settings(self.recording_settings())
+        self.recorder = recorder
+        self.device.recorder = recorder
+        self.log(f"开始录制会话: {file_path}")
+
+    def recording_settings(self):
+        """录制文件中记录的设置（回放时按同样的设置发送）：响应曲线、配置槽和设备的写入节奏"""
+        return {"curves": self.curves.to_data() if self.curves else None, "slots": self.slot_store,
+                "pacing": self.device.pacing_settings()}
+
+    def stop_recording(self):
+        """停止录制并关闭文件"""
+        recorder = self.recorder
+        if recorder is None:
+            return
+        self.recorder = None
+        self.device.recorder = None
+        recorder.close()
+        self.log(f"会话录制已保存: {recorder.file_path} ({recorder.count} 条记录)")
+
+    def start_telemetry(self, capacity=None, record_path=None):
+        """启动遥测读取线程，record_path 不为空时同时录制到文件"""
+        from trigger_telemetry import DEFAULT_CAPACITY, TelemetryBuffer, TelemetryReader
+
+        if self.telemetry is None:
+            self.telemetry = TelemetryReader(self.device, TelemetryBuffer(capacity or DEFAULT_CAPACITY))
+            self.telemetry.start()
+            self.log("遥测读取已启动")
+        if record_path:
+            self.telemetry.start_recording(record_path)
+            self.log(f"开始录制遥测: {record_path}")
+        return self.telemetry
+
+    def stop_telemetry_recording(self):
+        """停止遥测录制并关闭文件"""
+        if self.telemetry is None:
+            return
+        recorder = self.telemetry.stop_recording()
+        if recorder is not None:
+            self.log(f"遥测录制已保存: {recorder.file_path} ({recorder.samples} 个样本，丢失 {recorder.dropped})")
+
+    def start_poller(self, min_factor=None, max_factor=None):
+        """按配置中的 vDefines/vCondition 轮询游戏内存并自动切换武器（见 trigger_poller）"""
+        from trigger_poller import MAX_FACTOR, MIN_FACTOR
+
+        self.poll_options = {
+            "min_factor": MIN_FACTOR if min_factor is None else min_factor,
+            "max_factor": MAX_FACTOR if max_factor is None else max_factor,
+        }
+        return self._restart_poller()
+
+    def stop_poller(self):
+        """停止游戏内存轮询"""
+        self.poll_options = None
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+
+    def _restart_poller(self):
+        from trigger_poller import ConditionPoller
+
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+        compiled_config = self.compiled_config
+        if not compiled_config or not compiled_config.game.get("defines"):
+            self.log("配置中没有 vDefines，不轮询游戏内存")
+            return None
+        filters = [(profile.name, profile.priority, profile.condition)
+                   for profile in compiled_config.profiles.values()]
+        self.poller = ConditionPoller(compiled_config.game, filters, self._apply_weapon_from_poller, self.log,
+                                      **self.poll_options)
+        self.poller.start()
+        return self.poller
+
+    def start_process_watcher(self, library_paths):
+        """监视配置库中已知游戏的启动和退出，游戏启动时加载对应的配置（见 trigger_procwatch）"""
+        from trigger_procwatch import ProcessWatcher, ProfileLibrary
+
+        library = ProfileLibrary(library_paths)
+        games = library.scan()
+        self.log(f"配置库: {len(games)} 个游戏 ({', '.join(sorted(games)) or '无'})")
+        self.process_watcher = ProcessWatcher(library, self._on_game_started, self._on_game_exited, self.log)
+        self.process_watcher.start()
+        return self.process_watcher
+
+    def _on_game_started(self, pid, key, config_path):
+        """已知游戏启动（在进程监视线程中调用）"""
+        self.log(f"游戏已启动: {key} (PID {pid})，配置 {config_path}")
+        self._select_game_config(config_path)
+
+    def _on_game_exited(self, pid, key, config_path):
+        """已知游戏退出，还有其他已知游戏在运行时切换到最近启动的那个游戏的配置"""
+        self.log(f"游戏已退出: {key} (PID {pid})")
+        running = self.process_watcher.running if self.process_watcher else {}
+        if running:
+            _, _, config_path = max(running.values())
+            self._select_game_config(config_path)
+
+    def _select_game_config(self, config_path):
+        if config_path == self.config_path and self.compiled_config:
+            return
+        self.run_task(lambda: self.load_config(config_path))
+
+    def _apply_weapon_from_poller(self, weapon_name):
+        """游戏内存条件匹配的武器变化时调度切换（在轮询线程中调用）"""
+        self.log(f"条件匹配武器: {weapon_name}")
+        self.sources.publish("poller", weapon_name)
+
+    def add_source(self, source):
+        """添加游戏状态来源（StateSource 或规格字符串，见 trigger_sources）"""
+        if isinstance(source, str):
+            source = make_source(source)
+        return self.sources.add_source(source)
+
+    def resolve_weapon(self, state):
+        """把来源发布的状态解析为配置中的武器名称，找不到时返回 None
+
+        状态为整数时是武器列表中的序号；为文本时按名称精确查找，再查找配置中的别名（vAliases）。
+        空文本和只包含部分名称的文本不匹配任何武器。
+        """
+        compiled_config = self.compiled_config
+        if compiled_config is None:
+            return None
+        cached_config, cache = self._resolved
+        if cached_config is not compiled_config:
+            cache = {}
+            self._resolved = (compiled_config, cache)
+        weapon = cache.get(state)
+        if weapon is None:
+            weapon_names = self.weapon_names
+            if isinstance(state, int):
+                weapon = weapon_names[state] if 0 <= state < len(weapon_names) else None
+            elif state in compiled_config.profiles:
+                weapon = state
+            else:
+                weapon = compiled_config.aliases.get(state)
+            if weapon is None:
+                return None
+            cache[state] = weapon
+        return weapon
+
+    def apply_state(self, source, event):
+        """应用来源发布的状态（在执行武器切换的线程中调用，见 SourceHub）"""
+        TRACER.set_correlation(event.cid)
+        TRACER.record("dispatch", event.queued_at, cid=event.cid)
+        self.log(f"通过{source}应用武器配置: {event.weapon}")
+        applied = self.apply_weapon(event.weapon)
+        if applied and source == "udp":
+            metrics.UDP_TO_HID_LATENCY.observe(time.perf_counter() - event.received_at)
+        return applied
+
+    def load_curves(self, file_path):
+        """加载参数响应曲线文件（见 trigger_curves），在执行武器切换的线程中重新编译受影响的武器配置"""
+        from trigger_curves import load_curves
+
+        try:
+            curves = load_curves(file_path)
+        except ValueError as e:
+            self.log(f"错误: {e}")
+            return False
+        self.curves_path = file_path
+        self.log(f"已加载响应曲线: {file_path} ({', '.join(sorted(curves.curves)) or '无'})")
+        self.run_task(lambda: self.set_curves(curves))
+        return True
+
+    def set_curves(self, curves):
+        """使用新的响应曲线，只重新编译用到了变化参数的武器配置和差异帧
+
+        当前武器的参数值变化时重新应用，让设备马上使用新的曲线。
+        """
+        from trigger_curves import CurveSet
+
+        old_curves, self.curves = self.curves, curves or None
+        if self.recorder:
+            self.recorder.record_settings({"curves": self.curves.to_data() if self.curves else None})
+        names = (curves or CurveSet()).changed(old_curves)
+        compiled_config = self.compiled_config
+        if compiled_config is None or not names:
+            return
+        changed = compiled_config.apply_curves(self.curves, names)
+        self.log(f"响应曲线变化的参数: {', '.join(sorted(names))}，重新编译 {len(changed)} 个武器配置")
+        if not changed:
+            return
+        if self.applied_profile in changed:
+            self.applied_profile = None
+        if self.slot_store and self.device.connected:
+            self.sync_slots()
+        weapon = self.current_weapon
+        if weapon and self.find_profile(compiled_config, weapon) in changed:
+            self.apply_weapon(weapon)
+
+    def set_mode(self, mode):
+        """发送模式到设备并记录当前模式"""
+        self.current_mode = mode
+        self.applied_profile = None
+        self.device.send_mode(mode)
+        self.notify_state_changed()
+
+    def set_parameter(self, param_id, value, frame=None):
+        """发送参数到设备并记录最后发送的值（值会限制在参数范围内）
+
+        frame 为预先编码好的参数帧（序列和过渡使用），传入时值不再检查。
+        """
+        if frame is None:
+            spec = PARAMS.get(param_id)
+            if spec is None:
+                self.log(f"未知参数ID: {param_id}")
+                return
+            value = spec.clamp(value)
+        self.param_values[param_id] = value
+        self.applied_profile = None
+        self.device.send_parameter(param_id, value, frame)
+        self.notify_state_changed()
+
+    def send_parameters(self, values):
+        """按顺序发送一组参数 [(param_id, value), ...]，参数之间添加延迟"""
+        for i, (param_id, value) in enumerate(values):
+            self.set_parameter(param_id, value)
+
+            # 如果不是最后一个参数，添加延迟
+            if i < len(values) - 1:
+                if self.idle_callback:
+                    self.idle_callback()
+                with TRACER.span("sleep 50ms"):
+                    time.sleep(self.param_delay)
+
+    def notify_state_changed(self):
+        for listener in self.state_listeners:
+            listener()
+
+    def export_state(self):
+        """返回可持久化的状态（只含基本类型）"""
+        compiled_config = self.compiled_config
+        return {
+            "config_path": self.config_path,
+            "config": compiled_config.to_state() if compiled_config else None,
+            "weapon": self.current_weapon,
+            "mode": self.current_mode,
+            "params": dict(self.param_values),
+        }
+
+    def restore_state(self, state):
+        """从 export_state 的结果恢复状态（不写入设备，见 restore_device）"""
+        config = state.get("config")
+        if config:
+            self.compiled_config = CompiledConfig.from_state(config, self.curves, self.log)
+            self.applied_profile = None
+            self.slot_table = None
+            self.current_config_data = None
+            self.config_path = state.get("config_path")
+            self.weapon_names = self.compiled_config.weapon_names
+
+        for param_id, value in state.get("params", {}).items():
+            spec = PARAMS.get(param_id)
+            if spec is not None:
+                self.param_values[param_id] = spec.clamp(value)
+
+        mode = state.get("mode")
+        self.current_mode = mode if mode in MODES else None
+        self.current_weapon = state.get("weapon") if self.compiled_config else None
+        self.log(f"已恢复状态: 配置={self.config_path}, 武器={self.current_weapon}, 模式={self.current_mode}")
+
+        for listener in list(self.config_listeners):
+            listener(self.config_path, list(self.weapon_names))
+        if self.poll_options is not None:
+            self._restart_poller()
+
+    def restore_device(self):
+        """把当前模式和参数值重新写入设备（恢复状态或设备重新连接后）"""
+        if not self.current_mode:
+            return False
+        self.set_mode(self.current_mode)
+        self.send_parameters(self.mode_values(self.current_mode))
+        self.device_synced = True
+        return True
+
+    def enable_slots(self, store="ram"):
+        """把配置上传到设备的配置槽，切换武器时只发送激活命令（见 trigger_slots）"""
+        self.slot_store = store
+        if self.recorder:
+            self.recorder.record_settings({"slots": store})
+        if self.device.connected:
+            self.dispatch(self.sync_slots)
+
+    def sync_slots(self):
+        """把当前配置的所有武器上传到设备的配置槽，设备已有相同内容时跳过，返回槽是否可用
+
+        在执行武器切换的线程中调用（写入设备）。
+        """
+        from trigger_slots import SlotTable, parse_slot_reply
+
+        self.slot_table = None
+        compiled_config = self.compiled_config
+        if not self.slot_store or not compiled_config or not self.device.connected:
+            return False
+
+        table = SlotTable.from_config(compiled_config)
+        reply = self.device.request(CMD_TYPE_SLOT_QUERY, [])
+        if reply is None:
+            self.log("设备没有应答配置槽查询，使用逐帧发送")
+            return False
+        capacity, count, device_hash = parse_slot_reply(reply)
+        if len(table.profiles) > capacity:
+            self.log(f"配置有 {len(table.profiles)} 个武器，超过设备的配置槽容量 {capacity}，使用逐帧发送")
+            return False
+
+        if count == len(table.profiles) and device_hash == table.hash:
+            self.log(f"设备已有相同的配置槽 ({count} 个, 哈希 {table.hash:08X})，跳过上传")
+        else:
+            frames = table.upload_frames(self.slot_store)
+            start = time.perf_counter()
+            for frame in frames:
+                if not self.device.write_report(frame):
+                    self.log("上传配置槽失败")
+                    return False
+            reply = self.device.request(CMD_TYPE_SLOT_QUERY, [])
+            if reply is None or parse_slot_reply(reply)[2] != table.hash:
+                self.log("设备保存的配置槽与上传的内容不一致，使用逐帧发送")
+                return False
+            self.log(f"已上传 {len(table.profiles)} 个配置槽到设备{'Flash' if self.slot_store == 'flash' else 'RAM'}: "
+                     f"{len(frames)} 帧, {(time.perf_counter() - start) * 1000:.0f}ms, 哈希 {table.hash:08X}")
+        self.slot_table = table
+        return True
+
+    def send_frames(self, frames):
+        """按顺序发送预先编码好的参数帧 ((ParamSpec, 值, 帧), ...)，参数之间添加延迟"""
+        last = len(frames) - 1
+        for i, (spec, value, frame) in enumerate(frames):
+            self.set_parameter(spec.name, value, frame)
+            if i < last:
+                if self.idle_callback:
+                    self.idle_callback()
+                with TRACER.span("sleep 50ms"):
+                    time.sleep(self.param_delay)
+
+    def mode_values(self, mode):
+        """返回某个模式当前的全部参数值（含开关参数）"""
+        param_values = self.param_values
+        return [(spec.name, param_values[spec.name]) for spec in MODES.get(mode, DEFAULT_MODE).all_params]
+
+    def apply_weapon(self, weapon_name, config_file_path=None):
+        """应用武器配置到设备
+
+        Args:
+            weapon_name: 武器名称
+            config_file_path: 配置文件路径，如果为None则使用上次加载的配置
+        """
+        # 先停止上一个武器的序列，之后的帧不会再被序列覆盖
+        self.sequencer.cancel()
+
+        if config_file_path and not self.load_config(config_file_path):
+            return False
+
+        compiled_config = self.compiled_config
+        if not compiled_config:
+            self.log("错误: 未加载配置文件")
+            return False
+
+        with TRACER.span("apply_weapon_config"):
+            applied = self._apply_weapon_trigger_config(compiled_config, weapon_name)
+        if applied:
+            metrics.SWITCHES_APPLIED.inc()
+        return applied
+
+    def find_profile(self, compiled_config, weapon_name):
+        """按武器名称查找编译后的配置，找不到时使用默认配置"""
+        if not weapon_name:
+            return None
+
+        profile = compiled_config.profiles.get(weapon_name)
+        if profile is not None:
+            mode_name = profile.mode.name
+            self.log(f"找到武器 '{weapon_name}' 配置: 模式={mode_name}, 参数={list(profile.params)}")
+            if not profile.values:
+                self.log(f"警告: 武器 '{weapon_name}' 在 {mode_name} 模式下没有有效参数")
+            return profile
+
+        # 如果没有找到，尝试使用默认配置
+        profile = compiled_config.default
+        if profile is not None:
+            self.log(f"未找到武器 '{weapon_name}'，使用默认配置: 模式={profile.mode.name}, 参数={list(profile.params)}")
+            return profile
+
+        self.log(f"未找到武器 '{weapon_name}' 配置，且无默认配置")
+        return None
+
+    def _apply_weapon_trigger_config(self, compiled_config, weapon_name):
+        """查找武器配置并发送到设备"""
+        # 获取武器配置
+        with TRACER.span("get_weapon_trigger_config"):
+            profile = self.find_profile(compiled_config, weapon_name)
+        if not profile:
+            return False
+
+        mode_spec = profile.mode
+        mode_name = mode_spec.name
+
+        # 参数数组按位置对应模式参数，0表示保留当前值（编译时已限制范围）
+        param_values = self.param_values
+        old_values = {spec.name: param_values[spec.name] for spec in mode_spec.params}
+        new_values = dict(old_values)
+        for spec, value in profile.values:
+            new_values[spec.name] = value
+
+        # 模式不变且启用过渡时，切换时一次算好过渡表，由序列线程逐步发送
+        morph = None
+        if self.morph_duration > 0 and self.current_mode == mode_name and self.device.connected:
+            morph = build_morph(weapon_name, mode_spec, old_values, new_values,
+                                self.morph_duration, self.morph_rate_hz)
+
+        # 设备上是刚应用完的同一模式配置时，直接取切换表中预先编码好的差异帧
+        applied = self.applied_profile
+        delta = None
+        if not morph and applied is not None and self.current_mode == mode_name:
+            delta = compiled_config.transitions.get(applied, profile)
+
+        # 设备配置槽中有这个配置时只发送一个激活命令（差异为空时什么都不用发送）
+        slot_frame = None
+        slot_table = self.slot_table
+        if not morph and slot_table is not None and self.device_synced and (delta is None or delta):
+            slot_frame = slot_table.frames.get(profile)
+
+        if morph:
+            self.log(f"过渡到武器 '{weapon_name}' 的参数: {len(morph.keyframes)} 步, "
+                     f"{self.morph_duration * 1000:.0f}ms")
+        elif slot_frame is not None:
+            param_values.update(new_values)
+            self.current_mode = mode_name
+            with TRACER.span("activate_slot"):
+                self.device.write_report(slot_frame)
+        elif delta is not None:
+            param_values.update(new_values)
+            with TRACER.span("send_delta"):
+                self.send_frames(delta)
+        else:
+            param_values.update(new_values)
+
+            # 切换到对应的模式并发送所有参数
+            with TRACER.span("send_mode"):
+                self.set_mode(mode_name)
+            with TRACER.span("send_all_parameters"):
+                self.send_parameters(self.mode_values(mode_name))
+            self.device_synced = True
+
+        # 过渡在序列线程中进行，设备上还不是目标状态
+        self.applied_profile = None if morph else profile
+        self.current_weapon = weapon_name
+        self.notify_state_changed()
+        self.log(f"已应用武器 '{weapon_name}' 的配置并发送到设备")
+
+        # 过渡和武器配置中的序列（加载配置时已编译）依次播放
+        sequence = profile.compiled_sequence if profile.name == weapon_name else None
+        if morph or sequence:
+            self.sequencer.play(morph, sequence, cid=TRACER.current_correlation())
+
+        # 监听器收到的是目标值（过渡时设备上的值会在过渡结束后到达）
+        values = dict(self.mode_values(mode_name))
+        values.update(new_values)
+        for listener in list(self.weapon_listeners):
+            listener(weapon_name, mode_name, values)
+        return True
+
+    def run_udp_server(self):
+        """运行UDP服务器线程"""
+        self.log("启动UDP服务器...")
+        try:
+            # 创建UDP套接字
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.bind((self.udp_host, self.udp_port))
+            self.log(f"UDP服务器已启动，监听 {self.udp_host}:{self.udp_port}")
+
+            while not self.stop_udp_server:
+                # 接收数据
+                data, addr = self.udp_socket.recvfrom(1024)
+                received_at = time.perf_counter()
+                trace_start = TRACER.now()
+                metrics.UDP_DATAGRAMS.inc()
+
+                # 以 ! 开头的是控制命令，不作为武器切换处理
+                if data[:1] == b"!":
+                    self.handle_control(data, addr)
+                    continue
+
+                # 启用代理时按客户端限流，超过速率的命令直接丢弃（只计数，不写日志）
+                client = None
+                if self.broker:
+                    client = self.broker.admit(addr)
+                    if client is None:
+                        continue
+
+                if self.recorder:
+                    self.recorder.record_udp(data)
+
+                # 每个数据报作为一次切换，分配新的关联ID
+                TRACER.new_correlation()
+                self.log(f"收到UDP数据: {data} ({addr[0]}:{addr[1]})")
+
+                # 处理数据
+                self.handle_udp_data(data, received_at, client)
+                TRACER.record("udp_receive", trace_start)
+
+        except Exception as e:
+            if not self.stop_udp_server:
+                self.log(f"UDP服务器错误: {e}")
+                traceback.print_exc()
+
+        finally:
+            # 关闭UDP套接字
+            if self.udp_socket:
+                self.udp_socket.close()
+                self.log("UDP服务器已关闭")
+
+    def handle_control(self, data, addr):
+        """处理控制命令（例如 !profile cpu 30），只接受本机发送的命令"""
+        if not (addr[0].startswith("127.") or addr[0] == "::1"):
+            self.log(f"忽略来自 {addr[0]} 的控制命令")
+            return
+        try:
+            command = data[1:].decode("utf-8").strip()
+            if command.split(" ", 1)[0] == "curves":
+                # !curves [文件路径]：重新加载响应曲线（不指定路径时重新加载当前的曲线文件）
+                file_path = command[len("curves"):].strip() or self.curves_path
+                if file_path:
+                    self.load_curves(file_path)
+                else:
+                    self.log("错误: 没有指定响应曲线文件")
+                return
+            if self.profiler is None:
+                # 第一次收到控制命令时才导入分析模块
+                from trigger_profiling import ProfilingController
+                self.profiler = ProfilingController(self.log, self.run_task, self.wake_udp_server)
+            self.profiler.handle_command(command)
+        except Exception as e:
+            self.log(f"处理控制命令错误: {e}")
+            traceback.print_exc()
+
+    def _execute(self, fn):
+        """在执行线程中运行任务，出错时记录日志（执行线程继续处理之后的任务）"""
+        try:
+            fn()
+        except Exception as e:
+            self.log(f"执行任务错误: {e}")
+            traceback.print_exc()
+
+    def run_task(self, fn):
+        """在执行武器切换的线程中运行函数（启用代理时为代理的执行顺序）"""
+        if self.broker:
+            self.broker.call(fn)
+        else:
+            self.dispatch(fn)
+
+    def wake_udp_server(self):
+        """向自己的UDP端口发送一个空控制命令，唤醒阻塞在 recvfrom 中的UDP线程"""
+        if not self.udp_socket:
+            return
+        host, port = self.udp_socket.getsockname()[:2]
+        if host in ("0.0.0.0", ""):
+            host = "127.0.0.1"
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sender.sendto(b"!", (host, port))
+        finally:
+            sender.close()
+
+    def handle_udp_data(self, data, received_at=None, client=None):
+        """处理UDP数据（client 为代理中的客户端，未启用代理时为 None）"""
+        if received_at is None:
+            received_at = time.perf_counter()
+        with TRACER.span("handle_udp_data"):
+            self._handle_udp_data(data, received_at, client)
+
+    def _handle_udp_data(self, data, received_at, client=None):
+        """解析武器名称并发布到状态来源（来源 "udp"）"""
+        try:
+            # 解码数据
+            weapon_name = data.decode('utf-8').strip()
+            self.log(f"收到武器名称: {weapon_name}")
+
+            # 检查当前是否已加载配置
+            if not self.compiled_config:
+                self.log("错误: 未加载配置文件，无法应用武器配置")
+                return
+
+            # 获取配置中的武器列表
+            if not self.weapon_names:
+                self.log("错误: 配置中没有武器选项")
+                return
+
+            self.sources.publish("udp", weapon_name, received_at, client)
+
+        except Exception as e:
+            self.log(f"处理UDP数据错误: {e}")
+            traceback.print_exc()
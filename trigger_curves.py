@@ -0,0 +1,140 @@
+"""参数响应曲线
+
+按用户或设备调整灵敏度时不需要修改每个配置中每把武器的参数：在曲线文件中为参数定义一次响应曲线，
+配置中的参数值（武器、默认配置和序列关键帧）在编译时经过曲线映射后再发送到设备。
+
+曲线在加载时编译为查找表（参数最大值小于256时256项，否则65536项），编译配置时每个值只查一次表，
+武器切换时没有额外开销。修改曲线后只重新编译用到了变化参数的武器配置和它们的差异帧。
+
+曲线文件格式（环境变量 TRIGGER_CURVES 或守护进程 --curves 指定）:
+
+    {
+      "curves": {
+        "RESISTANCE": {"type": "gamma", "gamma": 0.7},
+        "START_POS": {"type": "linear", "scale": 0.9, "offset": 10},
+        "VIB_INTENSITY": {"type": "table", "points": [[1, 1], [100, 60], [255, 255]]}
+      }
+    }
+
+  - linear: 输出 = 输入 * scale + offset
+  - gamma:  在参数范围内归一化后取幂，输出 = 最小值 + (最大值 - 最小值) * t ** gamma
+  - table:  分段线性插值，points 为按输入排列的 [输入, 输出]，范围外使用两端的输出
+输出四舍五入并限制在参数范围内。没有定义曲线的参数直接限制范围（与不使用曲线相同）。
+"""
+import json
+from array import array
+
+from trigger_schema import PARAMS
+
+
+class ResponseCurve:
+    """一个参数的响应曲线和编译好的查找表"""
+
+    __slots__ = ("spec", "kind", "definition", "table")
+
+    def __init__(self, spec, definition):
+        self.spec = spec
+        self.definition = definition
+        self.kind = definition.get("type", "linear")
+        function = self._function()
+        size = 256 if spec.maximum < 256 else 65536
+        self.table = array("B" if size == 256 else "H", (spec.clamp(round(function(x))) for x in range(size)))
+
+    def _function(self):
+        spec, definition = self.spec, self.definition
+        if self.kind == "linear":
+            scale = float(definition.get("scale", 1.0))
+            offset = float(definition.get("offset", 0.0))
+            return lambda x: x * scale + offset
+        if self.kind == "gamma":
+            gamma = float(definition.get("gamma", 1.0))
+            if gamma <= 0:
+                raise ValueError("gamma 必须大于0")
+            low, span = spec.minimum, spec.maximum - spec.minimum
+            if span <= 0:
+                return lambda x: low
+            return lambda x: low + span * (min(max(x - low, 0), span) / span) ** gamma
+        if self.kind == "table":
+            points = sorted((float(x), float(y)) for x, y in definition.get("points", []))
+            if not points:
+                raise ValueError("曲线表没有点")
+            return lambda x: _interpolate(points, x)
+        raise ValueError(f"未知的曲线类型 {self.kind}")
+
+    def __call__(self, value):
+        value = int(value)
+        table = self.table
+        if value < 0:
+            value = 0
+        elif value >= len(table):
+            value = len(table) - 1
+        return table[value]
+
+    def __eq__(self, other):
+        return isinstance(other, ResponseCurve) and self.spec is other.spec and self.table == other.table
+
+    def __hash__(self):
+        return hash(self.spec.name)
+
+
+def _interpolate(points, x):
+    if x <= points[0][0]:
+        return points[0][1]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        if x <= x1:
+            return y0 if x1 == x0 else y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+    return points[-1][1]
+
+
+class CurveSet:
+    """一组参数响应曲线：参数名称 -> ResponseCurve"""
+
+    def __init__(self, curves=None):
+        self.curves = dict(curves or {})
+
+    def __bool__(self):
+        return bool(self.curves)
+
+    def map(self, spec, value):
+        """把配置中的参数值映射为发送到设备的值"""
+        curve = self.curves.get(spec.name)
+        return curve(value) if curve is not None else spec.clamp(value)
+
+    def to_data(self):
+        """还原为曲线文件的内容（parse_curves 可以再次解析，录制会话时使用）"""
+        return {"curves": {name: curve.definition for name, curve in self.curves.items()}}
+
+    def changed(self, other):
+        """返回与另一组曲线相比映射结果不同的参数名称集合（other 可以为 None）"""
+        other_curves = other.curves if other is not None else {}
+        return {name for name in set(self.curves) | set(other_curves)
+                if self.curves.get(name) != other_curves.get(name)}
+
+
+def parse_curves(data):
+    """解析曲线文件的内容，格式错误时抛出 ValueError"""
+    definitions = data.get("curves", {}) if isinstance(data, dict) else None
+    if not isinstance(definitions, dict):
+        raise ValueError("曲线文件需要 curves 对象")
+    curves = {}
+    for name, definition in definitions.items():
+        spec = PARAMS.get(name)
+        if spec is None or spec.is_toggle:
+            raise ValueError(f"未知的数值参数: {name}")
+        if not isinstance(definition, dict):
+            raise ValueError(f"参数 {name} 的曲线定义需要是对象")
+        try:
+            curves[name] = ResponseCurve(spec, definition)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"参数 {name} 的曲线无效: {e}")
+    return CurveSet(curves)
+
+
+def load_curves(file_path):
+    """加载曲线文件，文件不存在或格式错误时抛出 ValueError"""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"无法读取曲线文件 {file_path}: {e}")
+    return parse_curves(data)
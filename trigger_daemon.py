@@ -0,0 +1,213 @@
+"""触发器配置守护进程（无界面）
+
+在没有显示器的机器上运行 UDP→HID 管线：加载配置文件、监听武器切换命令、
+驱动设备并把日志写入文件。加上 --gui 时图形界面作为可选前端附加到同一个管线上。
+
+用法:
+    python -m trigger_daemon --config Sniper5_dx12.default.json
+    python -m trigger_daemon --config Sniper5_dx12.default.json --weapon 主武器 --log-file trigger.log
+    python -m trigger_daemon --config Sniper5_dx12.default.json --gui
+    python -m trigger_daemon                      # 从状态文件恢复上次的配置和设备状态
+"""
+import argparse
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+
+import trigger_metrics as metrics
+from trigger_broker import DEFAULT_BURST, DEFAULT_RATE, ClientPolicy, parse_client_rule
+from trigger_core import TriggerPipeline, timestamped
+from trigger_pacing import DEFAULT_PACING_FILE
+from trigger_poller import MAX_FACTOR, MIN_FACTOR
+from trigger_sources import make_source
+from trigger_state import DEFAULT_STATE_FILE, StateStore
+from trigger_trace import TRACER
+
+
+def make_file_log(file_path, echo=False):
+    """创建写入日志文件的日志函数，echo为True时同时打印到标准输出"""
+    logger = logging.getLogger("trigger_daemon")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.FileHandler(file_path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+
+    def log(message):
+        line = timestamped(message)
+        logger.info(line)
+        if echo:
+            print(line)
+
+    return log
+
+
+def client_rule(text):
+    try:
+        return parse_client_rule(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def source_spec(text):
+    try:
+        return make_source(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="trigger_daemon",
+        description="无界面运行触发器配置程序：监听UDP武器切换命令并驱动HID设备")
+    parser.add_argument("--config", help="武器配置JSON文件")
+    parser.add_argument("--weapon", help="启动后（设备连接时）应用的武器")
+    parser.add_argument("--host", default="127.0.0.1", help="UDP监听地址 (默认 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=12345, help="UDP监听端口 (默认 12345)")
+    parser.add_argument("--log-file", default="trigger_daemon.log", help="日志文件 (默认 trigger_daemon.log)")
+    parser.add_argument("--verbose", action="store_true", help="同时把日志打印到标准输出")
+    parser.add_argument("--trace", metavar="FILE", help="启用延迟追踪，退出时导出 Chrome Trace JSON")
+    parser.add_argument("--record", metavar="FILE", help="录制UDP数据报和HID报告到文件（用 trigger_replay.py 回放）")
+    parser.add_argument("--metrics-port", type=int, help="在该端口启动 Prometheus 指标端点")
+    parser.add_argument("--morph-ms", type=float, default=0,
+                        help="同一模式的武器之间切换时参数过渡的毫秒数 (默认 0，直接切换)")
+    parser.add_argument("--morph-rate", type=float, default=50, help="参数过渡的最大帧率 (默认 50 帧/秒)")
+    parser.add_argument("--state", metavar="FILE", default=DEFAULT_STATE_FILE,
+                        help=f"状态文件，启动时恢复上次的配置和设备状态 (默认 {DEFAULT_STATE_FILE})")
+    parser.add_argument("--no-state", action="store_true", help="不恢复也不保存状态文件")
+    parser.add_argument("--client", metavar="RULE", action="append", type=client_rule, default=[],
+                        help="客户端规则 名称@主机[:端口][,priority=N][,rate=R][,burst=B]，可重复；"
+                             "指定后启用按客户端限流和公平调度")
+    parser.add_argument("--client-rate", type=float,
+                        help=f"其他客户端每秒最多命令数（默认 {DEFAULT_RATE:g}，0不限速），指定后启用客户端代理")
+    parser.add_argument("--client-burst", type=int, default=DEFAULT_BURST,
+                        help=f"其他客户端的突发命令数 (默认 {DEFAULT_BURST})")
+    parser.add_argument("--telemetry", action="store_true", help="读取设备的遥测输入报告（GUI中实时显示）")
+    parser.add_argument("--telemetry-record", metavar="FILE", help="把遥测录制为按列存储的文件（同时启用 --telemetry）")
+    parser.add_argument("--poll", action="store_true",
+                        help="按配置中的 vDefines/vCondition 轮询游戏内存并自动切换武器")
+    parser.add_argument("--poll-min-factor", type=float, default=MIN_FACTOR,
+                        help=f"最小轮询间隔相对配置 period 的倍数 (默认 {MIN_FACTOR:g})")
+    parser.add_argument("--poll-max-factor", type=float, default=MAX_FACTOR,
+                        help=f"值不变时最大轮询间隔相对配置 period 的倍数 (默认 {MAX_FACTOR:g})")
+    parser.add_argument("--slots", choices=("ram", "flash"),
+                        help="把配置上传到设备的配置槽（RAM或Flash），切换武器时只发送一个激活命令")
+    parser.add_argument("--library", metavar="DIR", action="append", default=[],
+                        help="配置库目录：监视其中配置的游戏进程，游戏启动时自动加载对应的配置（可重复）")
+    parser.add_argument("--pacing", metavar="FILE", default=DEFAULT_PACING_FILE,
+                        help=f"写入节奏配置文件，设备连接时按 VID:PID 加载 (默认 {DEFAULT_PACING_FILE}，"
+                             "用 trigger_pacing.py 测量生成；空字符串表示不加载)")
+    parser.add_argument("--curves", metavar="FILE",
+                        help="参数响应曲线文件：配置中的参数值编译时经过曲线映射（发送 !curves 控制命令重新加载）")
+    parser.add_argument("--source", metavar="SPEC", action="append", type=source_spec, default=[],
+                        help="添加游戏状态来源（可重复）：stdin、pipe:路径、tail:路径、udp-bin:[主机:]端口、"
+                             "py:模块.类名[:参数]")
+    parser.add_argument("--gui", action="store_true", help="附加图形界面作为前端")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.trace:
+        TRACER.enable()
+
+    log = make_file_log(args.log_file, echo=args.verbose)
+    pipeline = TriggerPipeline(log_handlers=[log], udp_host=args.host, udp_port=args.port)
+    pipeline.morph_duration = args.morph_ms / 1000.0
+    pipeline.morph_rate_hz = args.morph_rate
+    pipeline.device.pacing_path = args.pacing or None
+    pipeline.log("触发器配置守护进程已启动")
+
+    if args.slots:
+        pipeline.enable_slots(args.slots)
+
+    # 响应曲线在恢复状态和加载配置之前设置，编译配置时直接使用
+    if args.curves and not pipeline.load_curves(args.curves):
+        return 1
+
+    if args.client or args.client_rate is not None:
+        rate = DEFAULT_RATE if args.client_rate is None else args.client_rate
+        pipeline.enable_broker(args.client, ClientPolicy(rate=rate, burst=args.client_burst))
+
+    if args.metrics_port:
+        metrics_server = metrics.MetricsServer(metrics.REGISTRY, port=args.metrics_port)
+        pipeline.log(f"指标端点: http://127.0.0.1:{metrics_server.start()}/metrics")
+
+    # 先从状态文件恢复（不解析配置JSON），--config 会覆盖恢复的配置
+    restored = False
+    if not args.no_state:
+        state_store = StateStore(pipeline, args.state)
+        restored = state_store.restore()
+        state_store.attach()
+        if restored and args.weapon:
+            pipeline.current_weapon = None  # 指定的启动武器优先于恢复的武器
+
+    if args.record:
+        pipeline.start_recording(args.record)
+
+    if args.config and not pipeline.load_config(args.config):
+        return 1
+
+    # 设备连接（包括重新连接）后重新应用当前武器，让设备回到守护进程记录的状态
+    # 恢复状态后的第一次连接直接写入保存的模式和参数（指定了 --weapon 时应用该武器）
+    startup_weapon = args.weapon
+    restore_pending = [restored and not startup_weapon]
+
+    def on_device_event(event):
+        if event != "connected":
+            return
+        if restore_pending[0]:
+            restore_pending[0] = False
+            pipeline.dispatch(pipeline.restore_device)
+            return
+        weapon = pipeline.current_weapon or startup_weapon
+        if weapon and pipeline.compiled_config:
+            pipeline.dispatch(lambda: pipeline.apply_weapon(weapon))
+
+    pipeline.device.add_listener(on_device_event)
+    pipeline.start()
+    if args.telemetry or args.telemetry_record:
+        pipeline.start_telemetry(record_path=args.telemetry_record)
+    if args.poll:
+        pipeline.start_poller(args.poll_min_factor, args.poll_max_factor)
+    if args.library:
+        pipeline.start_process_watcher(args.library)
+    for source in args.source:
+        pipeline.add_source(source)
+
+    if args.gui:
+        import tkinter as tk
+        from trigger_config_gui import TriggerConfigApp
+
+        root = tk.Tk()
+        TriggerConfigApp(root, pipeline=pipeline)
+        root.mainloop()
+    else:
+        stop_event = threading.Event()
+
+        def on_signal(signum, frame):
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, on_signal)
+        signal.signal(signal.SIGTERM, on_signal)
+
+        # 带超时等待，Windows上Ctrl+C也能及时响应
+        while not stop_event.wait(1.0):
+            pass
+
+    pipeline.stop()
+    pipeline.log("触发器配置守护进程已退出")
+
+    if args.trace:
+        count = TRACER.export_chrome_trace(args.trace)
+        pipeline.log(f"已导出 {count} 条追踪事件到 {args.trace}")
+    return 0
+
+
+if __name__ == "__main__":
+    # 打包后的程序启动游戏状态进程时需要（见 trigger_gamestate）
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""软件模拟的触发器HID设备
+
+提供与 hidapi 相同的接口（enumerate / device），可以传给 TriggerDevice(backend=...)，
+在没有硬件的机器上运行管线、回放录制文件和基准测试。
+
+模拟设备会校验每一帧（命令头、长度、校验和、命令尾），记录收到的帧和时间，
+并像固件一样维护当前模式和参数值。设置 telemetry_rate 后按该频率产生遥测输入报告
+（扳机位置按1秒周期往复，力按当前模式和参数粗略计算）。
+
+模拟设备也实现了配置槽命令（见 trigger_slots）：查询、分块上传、校验后保存和激活，
+slot_capacity 为0时模拟不支持配置槽的旧固件（不应答查询）。
+"""
+import threading
+import time
+import zlib
+
+from trigger_schema import (
+    CMD_HEADER, CMD_FOOTER, CMD_TYPE_MODE, CMD_TYPE_PARAM, CMD_TYPE_SLOT_ACTIVATE, CMD_TYPE_SLOT_BEGIN,
+    CMD_TYPE_SLOT_COMMIT, CMD_TYPE_SLOT_DATA, CMD_TYPE_SLOT_QUERY, CMD_TYPE_TELEMETRY, MODE_LIST, PARAMS_BY_ID,
+    encode_report,
+)
+from trigger_slots import parse_slot_blob
+
+SIM_VENDOR_ID = 0x2341
+SIM_PRODUCT_ID = 0x8036
+SIM_PATH = b"sim://trigger"
+
+_MODES_BY_ID = {mode.id: mode for mode in MODE_LIST}
+
+
+def decode_report(report):
+    """解析HID报告，返回 (命令类型, 数据字节)，格式错误时抛出 ValueError"""
+    report = bytes(report)
+    if len(report) < 6:
+        raise ValueError(f"报告太短: {len(report)} 字节")
+    if report[1] != CMD_HEADER:
+        raise ValueError(f"命令头错误: 0x{report[1]:02X}")
+    cmd_type, length = report[2], report[3]
+    data = report[4:4 + length]
+    if len(data) != length or len(report) < 6 + length:
+        raise ValueError(f"数据长度错误: {length}")
+    checksum, footer = report[4 + length], report[5 + length]
+    if checksum != (cmd_type + sum(data)) & 0xFF:
+        raise ValueError(f"校验和错误: 0x{checksum:02X}")
+    if footer != CMD_FOOTER:
+        raise ValueError(f"命令尾错误: 0x{footer:02X}")
+    return cmd_type, data
+
+
+class SimulatedDevice:
+    """模拟的 hid.device 对象"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.opened = False
+
+    def open_path(self, path):
+        if path != SIM_PATH or not self.backend.present:
+            raise OSError("open failed")
+        self.opened = True
+
+    def open(self, vendor_id=SIM_VENDOR_ID, product_id=SIM_PRODUCT_ID):
+        self.open_path(SIM_PATH)
+
+    def write(self, report):
+        if not self.opened or not self.backend.present:
+            raise OSError("write error")
+        return self.backend._receive(bytes(report))
+
+    def read(self, size, timeout_ms=0):
+        if not self.opened or not self.backend.present:
+            raise OSError("read error")
+        return self.backend._read(timeout_ms)
+
+    def close(self):
+        self.opened = False
+
+
+class SimulatedHid:
+    """模拟的 hid 模块：一个始终（或按需）连接的触发器设备
+
+    Args:
+        write_latency: 每次写入的模拟耗时（秒）
+        present: 设备是否连接，可以在运行中修改来模拟拔插
+    """
+
+    def __init__(self, write_latency=0.0, present=True,
+                 vendor_id=SIM_VENDOR_ID, product_id=SIM_PRODUCT_ID, telemetry_rate=0, slot_capacity=64):
+        self.write_latency = write_latency
+        self.present = present
+        self.telemetry_rate = telemetry_rate   # 遥测报告频率（Hz），0表示不产生
+        self._next_telemetry = 0.0
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+
+        self.frames = []        # [(perf_counter_ns, 报告字节), ...]
+        self.errors = []        # 无法解析的帧的错误信息
+        self.mode = None        # 当前模式（ModeSpec）
+        self.params = {}        # 参数名称 -> 当前值
+        self.lock = threading.Lock()
+        self.frame_listeners = []   # fn(timestamp_ns, report)
+
+        # 配置槽
+        self.slot_capacity = slot_capacity
+        self.slots = {}             # 槽号 -> (模式ID, [(参数ID, 值), ...])
+        self.slot_hash = 0
+        self.slot_store = None      # 0 RAM / 1 Flash
+        self.slot_activations = 0
+        self._upload = None         # 上传中的 (槽数, 哈希, 存储位置, bytearray)
+        self._replies = []          # 待读取的应答报告
+
+    # hidapi 接口
+    def enumerate(self, vendor_id=0, product_id=0):
+        if not self.present:
+            return []
+        if vendor_id and vendor_id != self.vendor_id:
+            return []
+        if product_id and product_id != self.product_id:
+            return []
+        return [{"vendor_id": self.vendor_id, "product_id": self.product_id, "path": SIM_PATH}]
+
+    def device(self):
+        return SimulatedDevice(self)
+
+    # 模拟固件
+    def _receive(self, report):
+        if self.write_latency:
+            time.sleep(self.write_latency)
+        timestamp = time.perf_counter_ns()
+        with self.lock:
+            self.frames.append((timestamp, report))
+            try:
+                cmd_type, data = decode_report(report)
+                if cmd_type == CMD_TYPE_MODE and data:
+                    self.mode = _MODES_BY_ID.get(data[0])
+                elif cmd_type == CMD_TYPE_PARAM and len(data) >= 3:
+                    spec = PARAMS_BY_ID.get(data[0])
+                    if spec is not None:
+                        self.params[spec.name] = (data[1] << 8) | data[2]
+                elif self.slot_capacity:
+                    self._slot_command(cmd_type, data)
+            except ValueError as e:
+                self.errors.append(str(e))
+        for listener in list(self.frame_listeners):
+            listener(timestamp, report)
+        return len(report)
+
+    def _slot_command(self, cmd_type, data):
+        """配置槽命令（持有 self.lock 时调用），错误时抛出 ValueError"""
+        if cmd_type == CMD_TYPE_SLOT_QUERY:
+            reply = [self.slot_capacity, len(self.slots)] + list(self.slot_hash.to_bytes(4, "big"))
+            self._replies.append(list(encode_report(CMD_TYPE_SLOT_QUERY, reply)[1:]))
+        elif cmd_type == CMD_TYPE_SLOT_BEGIN and len(data) >= 6:
+            if data[0] > self.slot_capacity:
+                raise ValueError(f"配置槽数量 {data[0]} 超过容量 {self.slot_capacity}")
+            self._upload = (data[0], int.from_bytes(data[1:5], "big"), data[5], bytearray())
+        elif cmd_type == CMD_TYPE_SLOT_DATA and len(data) >= 2:
+            if self._upload is None:
+                raise ValueError("配置槽数据块在开始上传之前")
+            blob = self._upload[3]
+            offset = (data[0] << 8) | data[1]
+            if offset != len(blob):
+                raise ValueError(f"配置槽数据块偏移错误: {offset}")
+            blob += data[2:]
+        elif cmd_type == CMD_TYPE_SLOT_COMMIT and len(data) >= 4:
+            upload, self._upload = self._upload, None
+            if upload is None:
+                raise ValueError("配置槽结束命令在开始上传之前")
+            count, expected, store, blob = upload
+            if zlib.crc32(blob) != expected or int.from_bytes(data[:4], "big") != expected:
+                raise ValueError("配置槽哈希不匹配")
+            slots = parse_slot_blob(bytes(blob))
+            if len(slots) != count:
+                raise ValueError("配置槽数量不匹配")
+            self.slots, self.slot_hash, self.slot_store = slots, expected, store
+        elif cmd_type == CMD_TYPE_SLOT_ACTIVATE and data:
+            slot = self.slots.get(data[0])
+            if slot is None:
+                raise ValueError(f"配置槽不存在: {data[0]}")
+            mode_id, params = slot
+            self.mode = _MODES_BY_ID.get(mode_id)
+            for param_id, value in params:
+                spec = PARAMS_BY_ID.get(param_id)
+                if spec is not None:
+                    self.params[spec.name] = value
+            self.slot_activations += 1
+
+    def _read(self, timeout_ms):
+        """返回待读取的命令应答，没有时返回遥测报告"""
+        with self.lock:
+            if self._replies:
+                return self._replies.pop(0)
+        return self._telemetry(timeout_ms)
+
+    def _telemetry(self, timeout_ms):
+        """等到下一个遥测样本的时间并返回报告，超时返回空列表"""
+        if self.telemetry_rate <= 0:
+            time.sleep(timeout_ms / 1000.0)
+            return []
+        now = time.perf_counter()
+        delay = self._next_telemetry - now
+        if delay > timeout_ms / 1000.0:
+            time.sleep(timeout_ms / 1000.0)
+            return []
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter()
+        self._next_telemetry = max(self._next_telemetry + 1.0 / self.telemetry_rate, now)
+
+        phase = now % 1.0
+        position = int(255 * (phase * 2 if phase < 0.5 else 2 - phase * 2))
+        mode = self.mode
+        force = 0
+        if mode is not None and mode.params:
+            values = [self.params.get(spec.name, spec.default) for spec in mode.params]
+            if position >= values[0]:
+                force = values[1] if len(values) > 1 else 255
+        data = [position, force, mode.id if mode else 0, 1]
+        checksum = (CMD_TYPE_TELEMETRY + sum(data)) & 0xFF
+        report = [CMD_HEADER, CMD_TYPE_TELEMETRY, len(data)] + data + [checksum, CMD_FOOTER]
+        return report + [0] * (64 - len(report))
+
+    def reset(self):
+        """清除记录的帧和状态"""
+        with self.lock:
+            self.frames = []
+            self.errors = []
+            self.mode = None
+            self.params = {}
+            self._replies = []
@@ -0,0 +1,291 @@
+"""游戏状态进程
+
+读取游戏内存（指针链）放在独立的进程中进行，慢的读取不会和Tk界面、条件判断、HID写入争用同一个GIL。
+游戏状态进程按 trigger_poller 的自适应间隔轮询每个定义，把值写入共享内存中的数值表，
+值变化时通过管道发送一条很短的通知（只有定义序号），主进程收到通知后直接从共享内存读取该定义的值。
+游戏状态进程意外退出时监听线程在1秒后自动重新启动它。
+
+数值表布局（小端）:
+    表头  <8s 标识> <Q 游戏状态进程PID> <Q 游戏进程PID，未连接为0>
+    每个定义一个槽 <Q 序号> <Q 状态> <d 当前间隔> <8s 值> <Q 轮询次数> <Q 变化次数> <Q 错误次数>
+                   <d 最近一次检测延迟> <d 检测延迟总和>
+
+每个槽用顺序锁（seqlock）保护：写入前把序号加1（变为奇数），写完再加1（变为偶数）；
+读取时序号为奇数或读取前后序号不同表示读到了写入中的数据，重新读取。只有游戏状态进程写入，
+读取不加锁，也不复制整个表（struct.unpack_from 直接读取共享内存）。
+
+管道消息（游戏状态进程 -> 主进程）:
+    ("changed", 序号)  定义的值变化
+    ("detached",)      游戏进程断开，之前的值不再有效
+    ("stats",)         到了写入统计日志的时间
+    ("log", 文本)      日志
+主进程发送 ("stop",) 让游戏状态进程退出；主进程退出时管道关闭，游戏状态进程也随之退出。
+"""
+import heapq
+import multiprocessing
+import struct
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+
+from trigger_poller import ATTACH_RETRY, MAX_FACTOR, MIN_FACTOR, STATS_INTERVAL, ProcessMemory, define_polls
+
+MAGIC = b"TRGGST1\0"
+HEADER = struct.Struct("<8sQQ")
+SLOT = struct.Struct("<QQd8sQQQdd")
+SEQ = struct.Struct("<Q")
+VALUE_OFFSET = 24           # 槽中值的偏移
+SEQLOCK_RETRIES = 1000      # 读取时最多重试次数（游戏状态进程在写入中途退出时不会一直重试）
+RESTART_DELAY = 1.0         # 游戏状态进程退出后重新启动的延迟（秒）
+STOP_TIMEOUT = 2.0          # 等待游戏状态进程退出的最长时间（秒）
+
+
+class ValueTable:
+    """共享内存中的定义数值表（游戏状态进程写入，主进程读取）"""
+
+    def __init__(self, buf, formats):
+        self.buf = buf
+        self.formats = formats      # 每个定义的值格式 (struct.Struct)
+
+    @staticmethod
+    def size(count):
+        return HEADER.size + SLOT.size * count
+
+    def clear(self):
+        self.buf[:] = bytes(len(self.buf))
+        HEADER.pack_into(self.buf, 0, MAGIC, 0, 0)
+
+    def set_pids(self, worker_pid, game_pid):
+        HEADER.pack_into(self.buf, 0, MAGIC, worker_pid, game_pid)
+
+    def pids(self):
+        """返回 (游戏状态进程PID, 游戏进程PID)"""
+        _, worker_pid, game_pid = HEADER.unpack_from(self.buf, 0)
+        return worker_pid, game_pid
+
+    def write(self, index, poll, valid=True):
+        """写入一个定义的值和计数（只在游戏状态进程中调用）"""
+        buf = self.buf
+        offset = HEADER.size + SLOT.size * index
+        seq = SEQ.unpack_from(buf, offset)[0] + 1
+        SEQ.pack_into(buf, offset, seq)
+        value = poll.format.pack(poll.value) if valid else b""
+        SLOT.pack_into(buf, offset, seq, 1 if valid else 0, poll.interval, value,
+                       poll.polls, poll.changes, poll.errors, poll.latency, poll.latency_sum)
+        SEQ.pack_into(buf, offset, seq + 1)
+
+    def read(self, index):
+        """读取一个定义，返回 (值, 槽字段)，没有值时值为 None，一直读不到完整的槽时返回 (None, None)"""
+        buf = self.buf
+        offset = HEADER.size + SLOT.size * index
+        value_format = self.formats[index]
+        for _ in range(SEQLOCK_RETRIES):
+            seq = SEQ.unpack_from(buf, offset)[0]
+            if seq & 1:
+                continue
+            fields = SLOT.unpack_from(buf, offset)
+            value = value_format.unpack_from(buf, offset + VALUE_OFFSET)[0] if fields[1] else None
+            if SEQ.unpack_from(buf, offset)[0] == seq:
+                return value, fields
+        return None, None
+
+
+class GameStateReader:
+    """游戏状态进程中的轮询循环"""
+
+    def __init__(self, table, game, min_factor, max_factor, conn, open_process=None):
+        self.table = table
+        self.process_name = game.get("process_name")
+        self.defines = define_polls(game, min_factor, max_factor)
+        self.conn = conn
+        self.open_process = open_process or (lambda name: ProcessMemory(name).open())
+        self.process = None
+
+    def log(self, message):
+        self.conn.send(("log", message))
+
+    def wait(self, timeout):
+        """等待 timeout 秒，收到停止命令时返回 True（主进程退出时抛出 EOFError）"""
+        if self.conn.poll(timeout):
+            self.conn.recv()
+            return True
+        return False
+
+    def attach(self):
+        try:
+            self.process = self.open_process(self.process_name)
+        except OSError:
+            return False
+        self.table.set_pids(multiprocessing.current_process().pid, self.process.pid)
+        self.log(f"已连接游戏进程 {self.process_name} (PID {self.process.pid})")
+        return True
+
+    def detach(self):
+        process, self.process = self.process, None
+        if process is not None:
+            process.close()
+        for index, poll in enumerate(self.defines):
+            poll.reset()
+            self.table.write(index, poll, valid=False)
+        self.table.set_pids(multiprocessing.current_process().pid, 0)
+        self.conn.send(("detached",))
+
+    def run(self):
+        perf_counter = time.perf_counter
+        table, conn = self.table, self.conn
+        next_stats = perf_counter() + STATS_INTERVAL
+        while True:
+            if self.process is None and not self.attach():
+                if self.wait(ATTACH_RETRY):
+                    return
+                continue
+
+            # 按下一次轮询时间排序的堆，每次取最早到期的定义
+            now = perf_counter()
+            heap = [(now, index) for index in range(len(self.defines))]
+            while heap:
+                due, index = heap[0]
+                now = perf_counter()
+                if due > now:
+                    if self.wait(due - now):
+                        return
+                    continue
+                poll = self.defines[index]
+                try:
+                    value = self.process.read_define(poll.define, poll.format)
+                except (OSError, struct.error) as e:
+                    poll.errors += 1
+                    self.log(f"读取 {poll.name} 失败，断开游戏进程: {e}")
+                    self.detach()
+                    break
+                now = perf_counter()
+                changed = poll.update(value, now)
+                table.write(index, poll)
+                if changed:
+                    conn.send(("changed", index))
+                heapq.heapreplace(heap, (now + poll.interval, index))
+
+                if now >= next_stats:
+                    next_stats = now + STATS_INTERVAL
+                    conn.send(("stats",))
+            else:
+                # 没有可轮询的定义
+                if self.wait(ATTACH_RETRY):
+                    return
+
+
+def run_worker(shm_name, game, min_factor, max_factor, conn, open_process=None):
+    """游戏状态进程入口"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        formats = [poll.format for poll in define_polls(game, min_factor, max_factor)]
+        GameStateReader(ValueTable(shm.buf, formats), game, min_factor, max_factor, conn, open_process).run()
+    except (EOFError, BrokenPipeError, KeyboardInterrupt):
+        pass
+    finally:
+        conn.close()
+        shm.close()
+
+
+class GameStateWorker:
+    """在主进程中创建数值表、启动游戏状态进程，并在它退出时重新启动
+
+    Args:
+        game: 编译后配置中的游戏信息 {"process_name", "period", "defines"}
+        formats: 每个定义的值格式 (struct.Struct)
+        on_message: 收到 changed / detached / stats 消息时调用（在监听线程中）
+        log: 日志函数
+        open_process: 传给游戏状态进程的 fn(process_name)，必须是模块级函数
+    """
+
+    def __init__(self, game, formats, min_factor=MIN_FACTOR, max_factor=MAX_FACTOR, on_message=None,
+                 log=print, open_process=None):
+        self.game = game
+        self.formats = formats
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.on_message = on_message or (lambda message: None)
+        self.log = log
+        self.open_process = open_process
+        self.shm = None
+        self.table = None
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.shm = shared_memory.SharedMemory(create=True, size=ValueTable.size(len(self.formats)))
+        self.table = ValueTable(self.shm.buf, self.formats)
+        self._stop.clear()
+        self._spawn()
+        self._thread = threading.Thread(target=self._run, name="gamestate-listener", daemon=True)
+        self._thread.start()
+
+    def _spawn(self):
+        self.table.clear()
+        conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=run_worker, name="trigger-gamestate", daemon=True,
+            args=(self.shm.name, self.game, self.min_factor, self.max_factor, child_conn, self.open_process))
+        self.process.start()
+        child_conn.close()
+        self.conn = conn
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.conn.poll(0.5):
+                    if self.process.is_alive():
+                        continue
+                    raise EOFError
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                if self._stop.is_set():
+                    return
+                self.process.join(STOP_TIMEOUT)
+                self.log(f"游戏状态进程已退出 (退出码 {self.process.exitcode})，{RESTART_DELAY:g} 秒后重新启动")
+                self.on_message(("detached",))
+                self.conn.close()
+                if self._stop.wait(RESTART_DELAY):
+                    return
+                self.restarts += 1
+                self._spawn()
+                continue
+
+            if message[0] == "log":
+                self.log(message[1])
+                continue
+            try:
+                self.on_message(message)
+            except Exception as e:
+                # 处理一条消息出错不能结束监听线程，否则之后的变化都不会再处理
+                self.log(f"处理游戏状态消息错误: {e}")
+                traceback.print_exc()
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.conn.send(("stop",))
+        except (OSError, AttributeError):
+            pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(STOP_TIMEOUT)
+        self._thread = None
+        if self.process is not None:
+            self.process.join(STOP_TIMEOUT)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(STOP_TIMEOUT)
+            self.process = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.shm is not None:
+            self.table = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
@@ -0,0 +1,297 @@
+"""UDP→HID 链路指标
+
+进程内指标注册表：计数器、仪表和直方图，通过本地HTTP端点以 Prometheus 文本格式导出。
+
+更新指标时不加锁：每个线程第一次更新时获得自己的分片（一个普通列表），
+之后只写自己的分片；导出时把所有分片相加。只有线程第一次注册分片时才需要加锁。
+"""
+import threading
+from bisect import bisect_left
+
+# 默认直方图分桶（秒）
+WRITE_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+SWITCH_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+JITTER_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05)
+
+
+def _format_labels(labels, extra=None):
+    """格式化标签为 {a="b",...}"""
+    items = list(labels.items())
+    if extra:
+        items.extend(extra)
+    if not items:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in items
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    """格式化数值"""
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+class Counter:
+    """单调递增计数器"""
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text, labels, index):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._index = index
+
+    def inc(self, amount=1):
+        """增加计数（不加锁，只写当前线程的分片）"""
+        self._registry._shard()[self._index] += amount
+
+    def value(self):
+        return self._registry._sum_slot(self._index)
+
+    def samples(self):
+        yield self.name, self.labels, None, self.value()
+
+
+class Gauge:
+    """可任意设置的仪表（单次赋值在GIL下是原子的）"""
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text, labels):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        return self._value
+
+    def samples(self):
+        yield self.name, self.labels, None, self._value
+
+
+class Histogram:
+    """累积分桶直方图"""
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labels, buckets, index):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # 槽位布局: [各分桶..., +Inf桶, 总和]
+        self._index = index
+        self._sum_index = index + len(self.buckets) + 1
+
+    def observe(self, value):
+        """记录一个观测值（不加锁，只写当前线程的分片）"""
+        shard = self._registry._shard()
+        shard[self._index + bisect_left(self.buckets, value)] += 1
+        shard[self._sum_index] += value
+
+    def counts(self):
+        """返回各分桶（含+Inf）的非累积计数"""
+        return [self._registry._sum_slot(self._index + i) for i in range(len(self.buckets) + 1)]
+
+    def samples(self):
+        counts = self.counts()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield self.name + "_bucket", self.labels, ("le", _format_value(float(bound))), cumulative
+        yield self.name + "_sum", self.labels, None, float(self._registry._sum_slot(self._sum_index))
+        yield self.name + "_count", self.labels, None, cumulative
+
+
+class LabeledCounter:
+    """按标签值分开的一组计数器，每组标签值在第一次使用时注册"""
+
+    def __init__(self, registry, name, help_text, label_names):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """返回这组标签值对应的计数器"""
+        counter = self._counters.get(values)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.get(values)
+                if counter is None:
+                    counter = self._registry.counter(self.name, self.help, dict(zip(self.label_names, values)))
+                    self._counters[values] = counter
+        return counter
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._size = 0
+        self._shards = []
+        self._shard_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _allocate(self, slots):
+        index = self._size
+        self._size += slots
+        return index
+
+    def _shard(self):
+        """返回当前线程的分片，必要时创建或扩展"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = [0] * self._size
+            self._local.shard = shard
+            with self._shard_lock:
+                self._shards.append(shard)
+        elif len(shard) < self._size:
+            # 分片创建后又注册了新指标，由所属线程自己扩展
+            shard.extend([0] * (self._size - len(shard)))
+        return shard
+
+    def _sum_slot(self, index):
+        total = 0
+        for shard in list(self._shards):
+            if index < len(shard):
+                total += shard[index]
+        return total
+
+    def counter(self, name, help_text, labels=None):
+        metric = Counter(self, name, help_text, labels or {}, self._allocate(1))
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, labels=None):
+        metric = Gauge(self, name, help_text, labels or {})
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets, labels=None):
+        index = self._allocate(len(buckets) + 2)
+        metric = Histogram(self, name, help_text, labels or {}, buckets, index)
+        self._metrics.append(metric)
+        return metric
+
+    def labeled_counter(self, name, help_text, label_names):
+        return LabeledCounter(self, name, help_text, label_names)
+
+    def render(self):
+        """以 Prometheus 文本格式导出所有指标"""
+        lines = []
+        described = set()
+        # 同名（不同标签）的指标只输出一次 HELP/TYPE
+        for metric in sorted(self._metrics, key=lambda m: m.name):
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, extra, value in metric.samples():
+                extra_labels = [extra] if extra else None
+                lines.append(f"{sample_name}{_format_labels(labels, extra_labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """本地HTTP指标端点（GET /metrics）"""
+
+    def __init__(self, registry, host="127.0.0.1", port=9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        # http.server 导入较慢（会带入 email/ssl 等模块），只在启用端点时导入
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 不把每次抓取打印到控制台
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# 全局注册表和UDP→HID链路的指标
+REGISTRY = MetricsRegistry()
+
+UDP_DATAGRAMS = REGISTRY.counter(
+    "trigger_udp_datagrams_received_total", "收到的UDP数据报数量")
+SWITCHES_APPLIED = REGISTRY.counter(
+    "trigger_switches_applied_total", "成功应用的武器切换次数")
+FRAMES_WRITTEN = REGISTRY.counter(
+    "trigger_hid_frames_written_total", "写入设备的HID帧数量")
+PARTIAL_WRITES = REGISTRY.counter(
+    "trigger_hid_partial_writes_total", "写入字节数少于报告长度的次数")
+WRITE_ERRORS = REGISTRY.counter(
+    "trigger_hid_write_errors_total", "HID写入失败次数")
+RECONNECTS = REGISTRY.counter(
+    "trigger_device_reconnects_total", "设备断开后重新连接的次数")
+DEVICE_CONNECTED = REGISTRY.gauge(
+    "trigger_device_connected", "设备当前是否已连接 (1/0)")
+UDP_TO_HID_LATENCY = REGISTRY.histogram(
+    "trigger_udp_to_hid_latency_seconds", "从收到UDP数据报到最后一帧写入设备的耗时",
+    SWITCH_LATENCY_BUCKETS)
+FRAME_WRITE_LATENCY = REGISTRY.histogram(
+    "trigger_hid_write_latency_seconds", "单帧 device.write 调用耗时",
+    WRITE_LATENCY_BUCKETS)
+SEQUENCE_JITTER = REGISTRY.histogram(
+    "trigger_sequence_jitter_seconds", "序列关键帧实际发送时间晚于计划时间的量",
+    JITTER_BUCKETS)
+SEQUENCE_KEYFRAMES = REGISTRY.counter(
+    "trigger_sequence_keyframes_total", "序列播放的关键帧数量")
+SEQUENCES_CANCELLED = REGISTRY.counter(
+    "trigger_sequences_cancelled_total", "因武器切换等原因被取消的序列数量")
+CLIENT_COMMANDS = REGISTRY.labeled_counter(
+    "trigger_client_commands_total", "按客户端和结果统计的UDP命令数量", ("client", "result"))
+DEFINE_POLLS = REGISTRY.labeled_counter(
+    "trigger_define_polls_total", "按定义和结果统计的游戏内存轮询次数", ("define", "result"))
+DEFINE_DETECTION_LATENCY = REGISTRY.histogram(
+    "trigger_define_detection_latency_seconds", "游戏内存值变化的检测延迟上限（两次轮询的间隔）",
+    SWITCH_LATENCY_BUCKETS)
+SOURCE_STATES = REGISTRY.labeled_counter(
+    "trigger_source_states_total", "按来源和结果统计的游戏状态数量", ("source", "result"))
+SOURCE_LATENCY = REGISTRY.histogram(
+    "trigger_source_to_hid_latency_seconds", "从来源收到游戏状态到武器切换写完设备的耗时",
+    SWITCH_LATENCY_BUCKETS)
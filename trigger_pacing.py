@@ -0,0 +1,354 @@
+"""HID写入节奏配置和写入路径测量工具
+
+每帧写入后的等待时间、连续写入的帧数和报告长度按设备（VID:PID）保存在节奏配置文件中
+（默认 trigger_pacing.json），设备连接时 TriggerDevice 加载与它匹配的配置:
+
+    {
+      "devices": {
+        "2341:8036": {"frame_delay_ms": 3.0, "burst": 4, "report_size": 16, "param_delay_ms": 50.0,
+                      "measured": {...}}
+      }
+    }
+
+  - frame_delay_ms: 每 burst 帧之后的等待时间（原来固定为每帧10毫秒）
+  - burst: 连续写入多少帧之后等待一次
+  - report_size: 报告长度（原来固定填充到64字节），不会短于帧本身
+  - param_delay_ms: 管线中参数帧之间的额外延迟（默认50毫秒，测量工具不修改）
+
+测量工具对真实设备或模拟设备扫描帧间隔、连续帧数和报告长度的组合，测量每次 write 调用的耗时分布、
+部分写入和错误；设备应答配置槽查询时，每批帧之后发送一次查询，从最后一帧写完到收到应答的时间作为
+应用延迟（固件按顺序处理命令，应答到达时之前的帧都已经处理）。选出可靠（没有部分写入、错误和应答超时）
+且每帧总耗时最短的组合，帧间隔不小于 --min-gap（默认1毫秒）并乘以安全系数后写入节奏配置文件；
+设备不应答查询时不能确认固件处理了帧，不生成配置。参数帧之间的延迟不测量，保持默认的50毫秒:
+
+    python trigger_pacing.py --sim                  # 模拟设备
+    python trigger_pacing.py --gaps 0,1,2,5,10 --bursts 1,2,4,8 --sizes 64,32,16
+    python trigger_pacing.py --dry-run --json sweep.json
+
+测量会写入参数帧（狙击模式各参数的默认值），测量前请退出正在使用设备的程序。
+"""
+import json
+import os
+import sys
+import time
+
+DEFAULT_PACING_FILE = "trigger_pacing.json"
+DEFAULT_GAPS_MS = (0, 1, 2, 5, 10)
+DEFAULT_BURSTS = (1, 2, 4, 8)
+DEFAULT_SIZES = (64, 32, 16)
+DEFAULT_FRAMES = 48         # 每个组合写入的帧数
+DEFAULT_MARGIN = 1.5        # 推荐的帧间隔乘以的安全系数
+DEFAULT_MIN_GAP_MS = 1.0    # 推荐的帧间隔至少为它乘以安全系数（测得不等待也可靠时）
+ACK_TIMEOUT = 0.5
+
+
+def device_key(vendor_id, product_id):
+    return f"{vendor_id:04X}:{product_id:04X}"
+
+
+class PacingProfile:
+    """一个设备的写入节奏"""
+
+    __slots__ = ("frame_delay", "burst", "report_size", "param_delay", "measured")
+
+    def __init__(self, frame_delay=0.01, burst=1, report_size=64, param_delay=0.05, measured=None):
+        self.frame_delay = frame_delay      # 秒
+        self.burst = max(1, int(burst))
+        self.report_size = int(report_size)
+        self.param_delay = param_delay      # 秒
+        self.measured = measured            # 测量结果摘要（只用于记录）
+
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            return cls(float(data.get("frame_delay_ms", 10)) / 1000.0, data.get("burst", 1),
+                       data.get("report_size", 64), float(data.get("param_delay_ms", 50)) / 1000.0,
+                       data.get("measured"))
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"节奏配置格式错误: {e}")
+
+    def to_dict(self):
+        data = {
+            "frame_delay_ms": round(self.frame_delay * 1000, 3),
+            "burst": self.burst,
+            "report_size": self.report_size,
+            "param_delay_ms": round(self.param_delay * 1000, 3),
+        }
+        if self.measured:
+            data["measured"] = self.measured
+        return data
+
+    def __repr__(self):
+        return (f"PacingProfile(帧间隔 {self.frame_delay * 1000:g}ms, 连续 {self.burst} 帧, "
+                f"报告 {self.report_size} 字节, 参数间隔 {self.param_delay * 1000:g}ms)")
+
+
+def load_pacing(file_path, vendor_id, product_id):
+    """读取节奏配置文件中该设备的配置，文件不存在或没有该设备时返回 None，格式错误时抛出 ValueError"""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise ValueError(f"无法读取节奏配置文件 {file_path}: {e}")
+    devices = data.get("devices", {}) if isinstance(data, dict) else None
+    if not isinstance(devices, dict):
+        raise ValueError(f"节奏配置文件 {file_path} 需要 devices 对象")
+    entry = devices.get(device_key(vendor_id, product_id))
+    if entry is None:
+        return None
+    if not isinstance(entry, dict):
+        raise ValueError(f"节奏配置文件 {file_path} 中 {device_key(vendor_id, product_id)} 的配置需要是对象")
+    return PacingProfile.from_dict(entry)
+
+
+def save_pacing(file_path, vendor_id, product_id, profile):
+    """把设备的节奏配置写入文件（保留其他设备的配置，原子替换）"""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    if not isinstance(data.get("devices"), dict):
+        data["devices"] = {}
+    data["devices"][device_key(vendor_id, product_id)] = profile.to_dict()
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, file_path)
+
+
+class _TimedDevice:
+    """包装 hid.device，记录每次 write 调用的耗时"""
+
+    def __init__(self, device):
+        self.device = device
+        self.latencies = []
+
+    def write(self, report):
+        start = time.perf_counter()
+        try:
+            return self.device.write(report)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+
+class SweepResult:
+    """一个组合的测量结果"""
+
+    def __init__(self, gap, burst, size, frames):
+        self.gap = gap
+        self.burst = burst
+        self.size = size
+        self.frames = frames
+        self.latencies = []
+        self.partial = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.ack_latency = None     # 秒，没有应答时为 None
+        self.ack_failed = False
+
+    @property
+    def reliable(self):
+        return not self.partial and not self.errors and not self.ack_failed
+
+    @property
+    def per_frame(self):
+        """每帧的总耗时（写入、等待和应用延迟）"""
+        return (self.elapsed + (self.ack_latency or 0.0)) / self.frames
+
+    def to_dict(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else None
+
+        return {
+            "gap_ms": self.gap * 1000,
+            "burst": self.burst,
+            "report_size": self.size,
+            "frames": self.frames,
+            "write_p50_ms": percentile(0.5),
+            "write_p90_ms": percentile(0.9),
+            "write_p99_ms": percentile(0.99),
+            "write_max_ms": latencies[-1] * 1000 if latencies else None,
+            "write_mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else None,
+            "partial_writes": self.partial,
+            "errors": self.errors,
+            "ack_latency_ms": self.ack_latency * 1000 if self.ack_latency is not None else None,
+            "ack_failed": self.ack_failed,
+            "per_frame_ms": self.per_frame * 1000,
+            "reliable": self.reliable,
+        }
+
+
+def _test_frames(count):
+    """测量用的参数帧：依次写入狙击模式各参数的默认值"""
+    from trigger_schema import MODES
+
+    specs = MODES["SNIPER"].params
+    return [specs[i % len(specs)].encode(specs[i % len(specs)].default) for i in range(count)]
+
+
+def probe_ack(device):
+    """设备是否应答配置槽查询（用于测量应用延迟）"""
+    from trigger_schema import CMD_TYPE_SLOT_QUERY
+
+    device.frame_delay = 0
+    return device.request(CMD_TYPE_SLOT_QUERY, [], ACK_TIMEOUT) is not None
+
+
+def measure(device, gap, burst, size, frames, ack):
+    """用给定的节奏写入 frames 帧，返回 SweepResult"""
+    from trigger_schema import CMD_TYPE_SLOT_QUERY
+
+    result = SweepResult(gap, burst, size, len(frames))
+    device.frame_delay = gap
+    device.burst = burst
+    device.report_size = size
+    timed = _TimedDevice(device.device)
+    device.device = timed
+    try:
+        start = time.perf_counter()
+        for frame in frames:
+            written = device.write_report(frame)
+            if written == 0:
+                result.errors += 1
+            elif written < min(len(frame), max(size, frame[3] + 6)):
+                result.partial += 1
+        result.elapsed = time.perf_counter() - start
+        result.latencies = list(timed.latencies)
+        if ack:
+            # 查询帧不计入写入耗时；应答前不等待帧间隔
+            device.frame_delay = 0
+            ack_start = time.perf_counter()
+            reply = device.request(CMD_TYPE_SLOT_QUERY, [], ACK_TIMEOUT)
+            if reply is None:
+                result.ack_failed = True
+            else:
+                result.ack_latency = time.perf_counter() - ack_start
+    finally:
+        if device.device is timed:
+            device.device = timed.device
+    return result
+
+
+def sweep(device, gaps, bursts, sizes, frame_count=DEFAULT_FRAMES, ack=True, log=print):
+    """扫描所有组合，返回 SweepResult 列表"""
+    frames = _test_frames(frame_count)
+    results = []
+    for size in sizes:
+        for burst in bursts:
+            for gap in gaps:
+                # 不等待时连续帧数没有意义，只测一次
+                if gap == 0 and burst != bursts[0]:
+                    continue
+                result = measure(device, gap, burst, size, frames, ack)
+                summary = result.to_dict()
+                log(f"间隔 {gap * 1000:5.1f}ms 连续 {burst} 帧 报告 {size:2d} 字节: "
+                    f"write p50 {summary['write_p50_ms']:.3f}ms p99 {summary['write_p99_ms']:.3f}ms, "
+                    f"部分写入 {result.partial}, 错误 {result.errors}, "
+                    f"应用延迟 {'-' if result.ack_latency is None else f'{result.ack_latency * 1000:.2f}ms'}"
+                    f"{' (应答超时)' if result.ack_failed else ''}, 每帧 {result.per_frame * 1000:.2f}ms")
+                results.append(result)
+    return results
+
+
+def recommend(results, margin=DEFAULT_MARGIN, min_gap=DEFAULT_MIN_GAP_MS / 1000.0):
+    """选出可靠且每帧总耗时最短的组合（相同时选较长的报告、较少的连续帧），返回 PacingProfile 或 None
+
+    只考虑测到了应用延迟（设备应答了查询）的组合：没有应答时 write 返回完整长度只说明帧进入了
+    发送缓冲，不能说明固件处理了它们，这时不推荐，保留默认节奏。帧间隔取 max(测得的间隔, min_gap)
+    乘以安全系数；参数帧之间的延迟没有测量，保留默认值。
+    """
+    reliable = [result for result in results if result.reliable and result.ack_latency is not None]
+    if not reliable:
+        return None
+    best = min(reliable, key=lambda result: (round(result.per_frame, 6), -result.size, result.burst))
+    return PacingProfile(max(best.gap, min_gap) * margin, best.burst, best.size, measured=best.to_dict())
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="测量HID写入路径并生成设备的写入节奏配置")
+    parser.add_argument("--sim", action="store_true", help="使用模拟设备（trigger_device_sim）")
+    parser.add_argument("--sim-latency", type=float, default=0.1, help="模拟设备每次写入的耗时（毫秒，默认0.1）")
+    parser.add_argument("--vid", type=lambda text: int(text, 0), help="设备VID（默认与程序相同）")
+    parser.add_argument("--pid", type=lambda text: int(text, 0), help="设备PID（默认与程序相同）")
+    parser.add_argument("--gaps", default=",".join(str(gap) for gap in DEFAULT_GAPS_MS),
+                        help="帧间隔（毫秒，逗号分隔）")
+    parser.add_argument("--bursts", default=",".join(str(burst) for burst in DEFAULT_BURSTS),
+                        help="连续写入的帧数（逗号分隔）")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="报告长度（字节，逗号分隔，不小于9）")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help=f"每个组合写入的帧数 (默认 {DEFAULT_FRAMES})")
+    parser.add_argument("--no-ack", action="store_true", help="不发送配置槽查询测量应用延迟")
+    parser.add_argument("--margin", type=float, default=DEFAULT_MARGIN,
+                        help=f"推荐帧间隔的安全系数 (默认 {DEFAULT_MARGIN:g})")
+    parser.add_argument("--min-gap", type=float, default=DEFAULT_MIN_GAP_MS,
+                        help=f"推荐帧间隔的下限，乘以安全系数之前（毫秒，默认 {DEFAULT_MIN_GAP_MS:g}）")
+    parser.add_argument("--output", default=DEFAULT_PACING_FILE, help=f"节奏配置文件 (默认 {DEFAULT_PACING_FILE})")
+    parser.add_argument("--json", metavar="FILE", help="把全部测量结果写入JSON文件")
+    parser.add_argument("--dry-run", action="store_true", help="只输出推荐的节奏，不写入节奏配置文件")
+    args = parser.parse_args(argv)
+
+    try:
+        gaps = [float(value) / 1000.0 for value in args.gaps.split(",")]
+        bursts = [int(value) for value in args.bursts.split(",")]
+        sizes = [int(value) for value in args.sizes.split(",")]
+    except ValueError as e:
+        parser.error(f"参数格式错误: {e}")
+    if min(sizes) < 9 or min(bursts) < 1 or min(gaps) < 0 or args.min_gap < 0 or args.margin < 1:
+        parser.error("报告长度不能小于9，连续帧数不能小于1，帧间隔不能为负，安全系数不能小于1")
+
+    from trigger_core import PRODUCT_ID, VENDOR_ID, TriggerDevice
+
+    backend = None
+    if args.sim:
+        from trigger_device_sim import SimulatedHid
+        backend = SimulatedHid(write_latency=args.sim_latency / 1000.0)
+    vendor_id = args.vid if args.vid is not None else VENDOR_ID
+    product_id = args.pid if args.pid is not None else PRODUCT_ID
+    device = TriggerDevice(lambda message: None, vendor_id, product_id, backend)
+    device.connect()
+    if not device.connected:
+        print(f"没有找到设备 {device_key(vendor_id, product_id)}")
+        return 1
+
+    try:
+        ack = not args.no_ack and probe_ack(device)
+        print(f"设备 {device_key(vendor_id, product_id)}，"
+              f"{'使用配置槽查询测量应用延迟' if ack else '设备不应答配置槽查询，不测量应用延迟'}")
+        results = sweep(device, gaps, bursts, sizes, args.frames, ack)
+    finally:
+        device.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([result.to_dict() for result in results], f, ensure_ascii=False, indent=2)
+
+    profile = recommend(results, args.margin, args.min_gap / 1000.0)
+    if profile is None:
+        if not ack:
+            print("没有测量应用延迟，无法确认固件处理了写入的帧，不生成节奏配置（保留默认节奏）")
+        else:
+            print("没有可靠的组合（都有部分写入、错误或应答超时），不生成节奏配置")
+        return 1
+    print(f"推荐: {profile}")
+    if not args.dry_run:
+        save_pacing(args.output, vendor_id, product_id, profile)
+        print(f"已写入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,572 @@
+"""游戏内存条件轮询
+
+读取配置中 vDefines 定义的游戏内存值（例如当前武器栏位 slot），按 vFilters 的 vCondition
+判断当前武器，条件结果变化时自动应用对应的武器配置，不需要外部程序发送UDP命令。
+
+每个定义有自己的轮询间隔，由值的变化速率决定：
+  - 值变化后间隔立即降到最小值，紧接着的切换（切枪动画中栏位连续变化）能尽快检测到
+  - 值保持不变时每次轮询间隔乘以 BACKOFF，直到最大值，长时间不切枪时几乎不占CPU
+  - 最小/最大间隔为配置中的 period 乘以 min_factor / max_factor
+
+检测延迟：值在上一次轮询之后、这一次轮询之前的某个时刻变化，两次轮询的间隔是检测延迟的上限，
+按定义统计平均值和最大值，并与实际轮询频率一起定期写入日志和指标。
+
+轮询在独立的游戏状态进程中进行（见 trigger_gamestate），本模块的 ConditionPoller 在主进程中
+根据发布的值判断条件。
+
+定义格式（与 Cheat Engine 指针链相同）:
+    {"name": "slot", "offset": [模块偏移, 偏移1, ..., 偏移N], "type": "int"}
+    地址 = 主模块基址 + 模块偏移，之后每一级先读取8字节指针再加上下一个偏移，最后按 type 读取值。
+"""
+import ctypes
+import os
+import struct
+import sys
+import time
+import traceback
+from bisect import bisect_left, insort
+
+import trigger_metrics as metrics
+
+# 定义的 type -> struct 格式
+TYPES = {
+    "byte": "<B",
+    "bool": "<?",
+    "short": "<h",
+    "int": "<i",
+    "uint": "<I",
+    "int64": "<q",
+    "float": "<f",
+    "double": "<d",
+}
+POINTER = struct.Struct("<Q")
+
+DEFAULT_PERIOD = 50         # 配置中没有 period 时的基准间隔（毫秒）
+MIN_FACTOR = 0.2            # 最小间隔 = period * MIN_FACTOR
+MAX_FACTOR = 20.0           # 最大间隔 = period * MAX_FACTOR
+BACKOFF = 1.5               # 值不变时间隔的增长倍数
+ATTACH_RETRY = 2.0          # 游戏进程未运行时重新查找的间隔（秒）
+STATS_INTERVAL = 30.0       # 写入轮询统计日志的间隔（秒）
+
+
+def process_key(name):
+    """进程名称比较用的键：忽略大小写和 .exe 后缀"""
+    name = os.path.basename(name).lower()
+    return name[:-4] if name.endswith(".exe") else name
+
+
+def comm_matches(key, comm):
+    """/proc/PID/comm 是否为该进程（comm 最多15个字符，Wine/Proton 下是 Sniper5_dx12.ex 这样的截断名称）
+
+    只用于 /proc/PID/comm；Windows 上的完整可执行文件名用 process_key 比较。
+    """
+    comm = comm.lower()
+    return bool(comm) and (comm == key or key[:15] == comm or f"{key}.exe"[:15] == comm)
+
+
+if sys.platform == "win32":
+    from ctypes import wintypes
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    _kernel32.CreateToolhelp32Snapshot.argtypes = (wintypes.DWORD, wintypes.DWORD)
+    _kernel32.OpenProcess.restype = wintypes.HANDLE
+    _kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    _kernel32.ReadProcessMemory.argtypes = (wintypes.HANDLE, ctypes.c_void_p, ctypes.c_void_p,
+                                            ctypes.c_size_t, ctypes.POINTER(ctypes.c_size_t))
+    _kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+    TH32CS_SNAPPROCESS = 0x2
+    TH32CS_SNAPMODULE = 0x8
+    TH32CS_SNAPMODULE32 = 0x10
+    PROCESS_VM_READ = 0x10
+    PROCESS_QUERY_INFORMATION = 0x400
+    INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+
+    class PROCESSENTRY32W(ctypes.Structure):
+        _fields_ = [
+            ("dwSize", wintypes.DWORD),
+            ("cntUsage", wintypes.DWORD),
+            ("th32ProcessID", wintypes.DWORD),
+            ("th32DefaultHeapID", ctypes.c_size_t),
+            ("th32ModuleID", wintypes.DWORD),
+            ("cntThreads", wintypes.DWORD),
+            ("th32ParentProcessID", wintypes.DWORD),
+            ("pcPriClassBase", wintypes.LONG),
+            ("dwFlags", wintypes.DWORD),
+            ("szExeFile", wintypes.WCHAR * 260),
+        ]
+
+    class MODULEENTRY32W(ctypes.Structure):
+        _fields_ = [
+            ("dwSize", wintypes.DWORD),
+            ("th32ModuleID", wintypes.DWORD),
+            ("th32ProcessID", wintypes.DWORD),
+            ("GlblcntUsage", wintypes.DWORD),
+            ("ProccntUsage", wintypes.DWORD),
+            ("modBaseAddr", ctypes.c_void_p),
+            ("modBaseSize", wintypes.DWORD),
+            ("hModule", wintypes.HMODULE),
+            ("szModule", wintypes.WCHAR * 256),
+            ("szExePath", wintypes.WCHAR * 260),
+        ]
+
+    _kernel32.Process32FirstW.argtypes = (wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W))
+    _kernel32.Process32NextW.argtypes = (wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W))
+    _kernel32.Module32FirstW.argtypes = (wintypes.HANDLE, ctypes.POINTER(MODULEENTRY32W))
+
+
+def list_processes():
+    """返回 {PID: 可执行文件名}（Windows 进程快照，Linux 上见 trigger_procwatch 读取 /proc）"""
+    snapshot = _kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if snapshot == INVALID_HANDLE_VALUE:
+        raise ctypes.WinError(ctypes.get_last_error())
+    processes = {}
+    try:
+        entry = PROCESSENTRY32W()
+        entry.dwSize = ctypes.sizeof(entry)
+        found = _kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+        while found:
+            processes[entry.th32ProcessID] = entry.szExeFile
+            found = _kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+    finally:
+        _kernel32.CloseHandle(snapshot)
+    return processes
+
+
+class ProcessMemory:
+    """按进程名称打开游戏进程并读取内存（Windows 使用 ReadProcessMemory，Linux 使用 /proc/PID/mem）
+
+    找不到进程或没有权限时 open 抛出 OSError。
+    """
+
+    def __init__(self, process_name):
+        self.process_name = process_name
+        self.pid = None
+        self.base = 0
+        self._handle = None
+
+    def open(self):
+        if sys.platform == "win32":
+            self._open_windows()
+        else:
+            self._open_proc()
+        return self
+
+    def close(self):
+        handle, self._handle = self._handle, None
+        if handle is None:
+            return
+        if sys.platform == "win32":
+            _kernel32.CloseHandle(handle)
+        else:
+            handle.close()
+
+    def read(self, address, size):
+        """读取 size 字节，失败时抛出 OSError"""
+        if sys.platform == "win32":
+            buffer = ctypes.create_string_buffer(size)
+            read = ctypes.c_size_t()
+            if not _kernel32.ReadProcessMemory(self._handle, address, buffer, size, ctypes.byref(read)) \
+                    or read.value != size:
+                raise OSError(f"读取内存失败: 0x{address:X}")
+            return buffer.raw
+        self._handle.seek(address)
+        data = self._handle.read(size)
+        if len(data) != size:
+            raise OSError(f"读取内存失败: 0x{address:X}")
+        return data
+
+    def read_define(self, define, value_format):
+        """按定义的指针链读取值"""
+        offsets = define["offset"]
+        address = self.base + offsets[0]
+        for offset in offsets[1:]:
+            pointer = POINTER.unpack(self.read(address, POINTER.size))[0]
+            if not pointer:
+                raise OSError(f"空指针: {define['name']}")
+            address = pointer + offset
+        return value_format.unpack(self.read(address, value_format.size))[0]
+
+    def _open_windows(self):
+        key = process_key(self.process_name)
+        self.pid = next((pid for pid, exe in list_processes().items() if process_key(exe) == key), None)
+        if self.pid is None:
+            raise OSError(f"游戏进程未运行: {self.process_name}")
+
+        # 主模块是模块快照中的第一个模块
+        snapshot = _kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPMODULE | TH32CS_SNAPMODULE32, self.pid)
+        if snapshot == INVALID_HANDLE_VALUE:
+            raise ctypes.WinError(ctypes.get_last_error())
+        try:
+            module = MODULEENTRY32W()
+            module.dwSize = ctypes.sizeof(module)
+            if not _kernel32.Module32FirstW(snapshot, ctypes.byref(module)):
+                raise ctypes.WinError(ctypes.get_last_error())
+            self.base = module.modBaseAddr or 0
+        finally:
+            _kernel32.CloseHandle(snapshot)
+
+        handle = _kernel32.OpenProcess(PROCESS_VM_READ | PROCESS_QUERY_INFORMATION, False, self.pid)
+        if not handle:
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._handle = handle
+
+    def _open_proc(self):
+        key = process_key(self.process_name)
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/comm", encoding="utf-8", errors="replace") as f:
+                    comm = f.read().strip()
+            except OSError:
+                continue
+            if comm_matches(key, comm):
+                self.pid = int(entry)
+                break
+        else:
+            raise OSError(f"游戏进程未运行: {self.process_name}")
+
+        # 主模块基址：第一个映射了进程可执行文件的区域，找不到时使用第一个映射
+        base = None
+        with open(f"/proc/{self.pid}/maps", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields = line.split(None, 5)
+                start = int(fields[0].split("-")[0], 16)
+                if base is None:
+                    base = start
+                if len(fields) == 6 and process_key(fields[5].strip()) == key:
+                    base = start
+                    break
+        self.base = base or 0
+        self._handle = open(f"/proc/{self.pid}/mem", "rb", buffering=0)
+
+
+class DefinePoll:
+    """一个定义的轮询状态和累计统计（在游戏状态进程中更新，见 trigger_gamestate）"""
+
+    __slots__ = ("name", "define", "format", "value", "interval", "min_interval", "max_interval",
+                 "last_poll", "polls", "changes", "errors", "latency", "latency_sum")
+
+    def __init__(self, define, min_interval, max_interval):
+        self.name = define["name"]
+        self.define = define
+        self.format = struct.Struct(TYPES.get(define.get("type", "int"), "<i"))
+        self.value = None
+        self.interval = min_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.last_poll = None
+        self.polls = 0
+        self.changes = 0
+        self.errors = 0
+        self.latency = 0.0          # 最近一次变化的检测延迟上限
+        self.latency_sum = 0.0
+
+    def update(self, value, now):
+        """记录一次读取结果，调整下一次的间隔，返回值是否变化"""
+        self.polls += 1
+        previous_poll, self.last_poll = self.last_poll, now
+        if value == self.value:
+            self.interval = min(self.max_interval, self.interval * BACKOFF)
+            return False
+
+        first = self.value is None
+        self.value = value
+        self.interval = self.min_interval
+        if not first and previous_poll is not None:
+            # 变化发生在上一次轮询之后，间隔是检测延迟的上限
+            self.latency = now - previous_poll
+            self.changes += 1
+            self.latency_sum += self.latency
+        return True
+
+    def reset(self):
+        """进程断开后清除值，重新连接后的第一次读取按变化处理"""
+        self.value = None
+        self.last_poll = None
+        self.interval = self.min_interval
+
+
+def define_polls(game, min_factor=MIN_FACTOR, max_factor=MAX_FACTOR):
+    """按配置中的 period 和倍数创建每个定义的轮询状态"""
+    period = (game.get("period") or DEFAULT_PERIOD) / 1000.0
+    min_interval = period * min_factor
+    max_interval = max(min_interval, period * max_factor)
+    return [DefinePoll(define, min_interval, max_interval)
+            for define in game.get("defines", []) if define.get("name") and define.get("offset")]
+
+
+def evaluate_condition(condition, values):
+    """按当前定义值判断 vCondition，引用的定义还没有值时不匹配"""
+    items = condition.get("items", [])
+    results = (evaluate_item(item, values) for item in items)
+    if condition.get("match_type", "and") == "or":
+        return any(results)
+    return bool(items) and all(results)
+
+
+def evaluate_item(item, values):
+    if "items" in item:
+        return evaluate_condition(item, values)
+    value = values.get(item.get("use_define"))
+    if value is None:
+        return False
+    target = item.get("value")
+    op = item.get("op", "=")
+    if op in ("=", "=="):
+        return value == target
+    if op == "!=":
+        return value != target
+    if op == ">":
+        return value > target
+    if op == "<":
+        return value < target
+    if op == ">=":
+        return value >= target
+    if op == "<=":
+        return value <= target
+    return False
+
+
+def check_item(item):
+    """检查条件项，比较大小（>、<、>=、<=）的值不是数值时抛出 ValueError（定义的值都是数值）"""
+    if "items" in item:
+        for child in item["items"]:
+            check_item(child)
+        return
+    op, target = item.get("op", "="), item.get("value")
+    if op in (">", "<", ">=", "<=") and (isinstance(target, bool) or not isinstance(target, (int, float))):
+        raise ValueError(f"条件项 {item.get('use_define')} {op} {target!r} 的比较值不是数值")
+
+
+def item_defines(item):
+    """返回条件项（可以是嵌套的条件组）读取的定义名称"""
+    if "items" in item:
+        return {name for child in item["items"] for name in item_defines(child)}
+    return {item.get("use_define")}
+
+
+class ConditionIndex:
+    """定义 -> 条件项的依赖索引，定义值变化时只重新判断读取该定义的条件项
+
+    每个武器缓存每个条件项的结果和成立的条件项数量（and 需要全部成立，or 需要至少一个），
+    当前匹配的武器按 (-优先级, 配置顺序) 保存在有序列表中，第一个即为匹配结果。
+    一次更新的开销与读取该定义的条件项数量有关，与配置中的武器总数无关。
+
+    Args:
+        filters: [(武器名称, 优先级, vCondition)]，优先级高的先匹配，同优先级按配置顺序
+        log: 日志函数，条件无效（见 check_item）的武器记录警告后不参与匹配
+    """
+
+    def __init__(self, filters, log=print):
+        self.names = []
+        self.keys = []          # 武器序号 -> 有序列表中的键 (-优先级, 序号)
+        self.required = []      # 武器序号 -> 需要成立的条件项数量
+        self.items = []         # 武器序号 -> [条件项结果]
+        self.true_counts = []   # 武器序号 -> 成立的条件项数量
+        self.dependents = {}    # 定义名称 -> [(武器序号, 条件项序号, 条件项)]
+        self.matching = []      # 当前匹配的武器键（有序）
+        self.evaluations = 0    # 条件项判断次数（统计用）
+        for name, priority, condition in filters:
+            items = condition.get("items", []) if condition else []
+            if not items:
+                continue
+            try:
+                for item in items:
+                    check_item(item)
+            except ValueError as e:
+                log(f"警告: 武器 '{name}' 的 vCondition 无效，不参与自动匹配: {e}")
+                continue
+            index = len(self.names)
+            self.names.append(name)
+            self.keys.append((-priority, index))
+            self.required.append(1 if condition.get("match_type", "and") == "or" else len(items))
+            self.items.append([False] * len(items))
+            self.true_counts.append(0)
+            for item_index, item in enumerate(items):
+                for define in item_defines(item):
+                    self.dependents.setdefault(define, []).append((index, item_index, item))
+
+    def best(self):
+        """返回当前匹配的优先级最高的武器名称，没有匹配时返回 None"""
+        return self.names[self.matching[0][1]] if self.matching else None
+
+    def update(self, define, values):
+        """定义值变化后重新判断依赖它的条件项，返回当前匹配的武器名称"""
+        items, true_counts, required = self.items, self.true_counts, self.required
+        for index, item_index, item in self.dependents.get(define, ()):
+            result = evaluate_item(item, values)
+            self.evaluations += 1
+            if result == items[index][item_index]:
+                continue
+            items[index][item_index] = result
+            before = true_counts[index] >= required[index]
+            true_counts[index] += 1 if result else -1
+            after = true_counts[index] >= required[index]
+            if after != before:
+                key = self.keys[index]
+                if after:
+                    insort(self.matching, key)
+                else:
+                    del self.matching[bisect_left(self.matching, key)]
+        return self.best()
+
+    def reset(self):
+        """所有定义都没有值时的状态（没有武器匹配）"""
+        for results in self.items:
+            results[:] = [False] * len(results)
+        self.true_counts = [0] * len(self.true_counts)
+        self.matching.clear()
+
+
+class ConditionPoller:
+    """按游戏状态进程发布的定义值判断条件，匹配的武器变化时调用 on_match(weapon_name)
+
+    读取游戏内存在独立的游戏状态进程中进行（见 trigger_gamestate），本进程只在值变化时
+    从共享内存数值表读取变化的定义并更新条件索引，指针链读取再慢也不会占用本进程的GIL。
+
+    Args:
+        game: 编译后配置中的游戏信息 {"process_name", "period", "defines"}
+        filters: [(武器名称, 优先级, vCondition)]，优先级高的先匹配，同优先级按配置顺序
+        on_match: 匹配的武器变化时调用（在监听线程中）
+        log: 日志函数
+        min_factor / max_factor: 最小/最大轮询间隔相对 period 的倍数
+        open_process: fn(process_name) -> 已打开的 ProcessMemory，在游戏状态进程中调用，
+            必须是模块级函数（测试时可替换）
+    """
+
+    def __init__(self, game, filters, on_match, log, min_factor=MIN_FACTOR, max_factor=MAX_FACTOR,
+                 open_process=None):
+        self.game = game
+        self.process_name = game.get("process_name")
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.defines = define_polls(game, min_factor, max_factor)
+        self.index = ConditionIndex(filters, log)
+        self.on_match = on_match
+        self.log = log
+        self.open_process = open_process
+        self.values = {}
+        self.matched = None
+        self.worker = None
+        count = len(self.defines)
+        self._changes_seen = [0] * count
+        self._snapshot = [(0, 0, 0, 0.0)] * count     # 上次统计时的 (轮询, 变化, 错误, 延迟总和)
+        self._latency_max = [0.0] * count
+        self._stats_start = time.perf_counter()
+        self._polls = [(metrics.DEFINE_POLLS.labels(poll.name, "unchanged"),
+                        metrics.DEFINE_POLLS.labels(poll.name, "changed"),
+                        metrics.DEFINE_POLLS.labels(poll.name, "error")) for poll in self.defines]
+
+    def start(self):
+        from trigger_gamestate import GameStateWorker
+
+        if self.defines:
+            min_interval, max_interval = self.defines[0].min_interval, self.defines[0].max_interval
+            self.log(f"开始轮询游戏进程 {self.process_name}: {len(self.defines)} 个定义，"
+                     f"间隔 {min_interval * 1000:.0f}-{max_interval * 1000:.0f}ms")
+        self.worker = GameStateWorker(self.game, [poll.format for poll in self.defines], self.min_factor,
+                                      self.max_factor, self._on_message, self.log, self.open_process)
+        self.worker.start()
+
+    def stop(self):
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+
+    def match(self):
+        """返回当前条件匹配的武器名称，没有匹配时返回 None"""
+        return self.index.best()
+
+    def stats(self, now=None):
+        """返回上次统计以来每个定义的统计:
+        [(名称, 轮询频率, 当前间隔, 变化次数, 平均检测延迟, 最大检测延迟)]
+        """
+        if now is None:
+            now = time.perf_counter()
+        elapsed = max(now - self._stats_start, 1e-9)
+        result = []
+        for index, poll in enumerate(self.defines):
+            counters, interval = self._counters(index)
+            polls, changes, _, latency_sum = self._delta(index, counters)
+            result.append((poll.name, polls / elapsed, interval, changes,
+                           latency_sum / changes if changes else 0.0, self._latency_max[index]))
+        return result
+
+    def log_stats(self, now=None):
+        if now is None:
+            now = time.perf_counter()
+        for name, rate, interval, changes, latency_avg, latency_max in self.stats(now):
+            self.log(f"轮询 {name}: {rate:.1f} 次/秒, 当前间隔 {interval * 1000:.0f}ms, 变化 {changes} 次, "
+                     f"检测延迟 平均 {latency_avg * 1000:.1f}ms 最大 {latency_max * 1000:.1f}ms")
+        self.log(f"条件项判断 {self.index.evaluations} 次（{len(self.index.names)} 个武器条件）")
+        self.index.evaluations = 0
+
+        # 把本次统计区间的轮询次数计入指标，开始新的统计区间
+        for index in range(len(self.defines)):
+            counters, _ = self._counters(index)
+            polls, changes, errors, _ = self._delta(index, counters)
+            unchanged, changed, error = self._polls[index]
+            unchanged.inc(polls - changes)
+            changed.inc(changes)
+            error.inc(errors)
+            self._snapshot[index] = counters
+            self._latency_max[index] = 0.0
+        self._stats_start = now
+
+    def _counters(self, index):
+        """从数值表读取一个定义的累计计数 ((轮询, 变化, 错误, 延迟总和), 当前间隔)"""
+        worker = self.worker
+        fields = worker.table.read(index)[1] if worker is not None else None
+        if fields is None:
+            return self._snapshot[index], 0.0
+        return (fields[4], fields[5], fields[6], fields[8]), fields[2]
+
+    def _delta(self, index, counters):
+        last = self._snapshot[index]
+        if counters[0] < last[0]:
+            # 游戏状态进程重新启动后计数从0开始
+            last = (0, 0, 0, 0.0)
+        return tuple(value - previous for value, previous in zip(counters, last))
+
+    def _on_message(self, message):
+        kind = message[0]
+        if kind == "changed":
+            index = message[1]
+            value, fields = self.worker.table.read(index)
+            if value is None:
+                return
+            # 变化次数增加时记录检测延迟（游戏状态进程重新启动后计数从0开始）
+            if fields[5] and fields[5] != self._changes_seen[index]:
+                latency = fields[7]
+                metrics.DEFINE_DETECTION_LATENCY.observe(latency)
+                self._latency_max[index] = max(self._latency_max[index], latency)
+            self._changes_seen[index] = fields[5]
+            name = self.defines[index].name
+            self.values[name] = value
+            self._evaluate(name)
+        elif kind == "detached":
+            # 游戏进程断开或游戏状态进程重新启动，之前的值不再有效
+            self.values.clear()
+            self.index.reset()
+            self.matched = None
+        elif kind == "stats":
+            self.log_stats()
+
+    def _evaluate(self, define):
+        weapon_name = self.index.update(define, self.values)
+        if weapon_name is None:
+            # 没有条件匹配时清除上次的匹配，之后再匹配到同一把武器时重新切换
+            # （期间其他来源可能已经切换到别的武器）
+            self.matched = None
+            return
+        if weapon_name == self.matched:
+            return
+        self.matched = weapon_name
+        try:
+            self.on_match(weapon_name)
+        except Exception as e:
+            self.log(f"应用条件匹配的武器错误: {e}")
+            traceback.print_exc()
@@ -0,0 +1,252 @@
+"""游戏进程监视
+
+监视配置库中已知游戏（配置的 process_name）的启动和退出，游戏启动时自动加载对应的配置。
+
+Linux 上订阅内核的进程事件（netlink proc connector）：进程 exec 时读取 /proc/PID/stat 判断是否为
+已知游戏，退出时直接按PID查找，不需要反复扫描 /proc。订阅需要 root 或 CAP_NET_ADMIN，
+不能订阅时（以及 Windows 上）改为定期扫描：只读取新出现的PID，每30秒完整扫描一次，
+发现已经运行的进程 exec 成了游戏。
+
+PID 重用：运行中的游戏按 (PID, 进程启动时间) 识别，同一个PID的启动时间变化表示原进程已退出、
+PID 被新进程使用。
+"""
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+from trigger_poller import comm_matches, process_key
+
+# netlink proc connector（linux/connector.h, linux/cn_proc.h）
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+PROC_CN_MCAST_LISTEN = 1
+PROC_EVENT_EXEC = 0x00000002
+PROC_EVENT_EXIT = 0x80000000
+NLMSG_DONE = 3
+NLMSG_HDR = struct.Struct("=IHHII")       # 长度, 类型, 标志, 序号, 端口
+CN_MSG = struct.Struct("=IIIIHH")         # idx, val, 序号, ack, 数据长度, 标志
+PROC_EVENT = struct.Struct("=IIQ")        # 事件类型, CPU, 时间戳
+PROC_IDS = struct.Struct("=II")           # pid, tgid（exec 和 exit 事件数据的开头）
+
+SCAN_INTERVAL = 2.0         # 定期扫描的间隔（秒）
+FULL_SCAN_INTERVAL = 30.0   # 完整扫描的间隔（秒）
+
+
+def read_proc_stat(pid):
+    """读取 /proc/PID/stat，返回 (comm, 启动时间)，进程不存在时返回 None"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # comm 可以包含空格和括号，取第一个 ( 和最后一个 ) 之间的内容
+    left, right = data.find(b"("), data.rfind(b")")
+    fields = data[right + 2:].split()
+    if left < 0 or len(fields) < 20:
+        return None
+    return data[left + 1:right].decode("utf-8", "replace"), int(fields[19])
+
+
+class ProfileLibrary:
+    """配置库：按配置中的 process_name 查找配置文件
+
+    同一个游戏有多个配置文件时使用最近修改的一个。
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.by_process = {}        # 进程名称键 -> 配置文件
+
+    def scan(self):
+        from trigger_analyze import find_config_files
+
+        found = {}
+        for file_path in find_config_files(self.paths):
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    process_name = json.load(f).get("process_name")
+                mtime = os.path.getmtime(file_path)
+            except (OSError, ValueError, AttributeError):
+                continue
+            if not process_name:
+                continue
+            key = process_key(process_name)
+            if key not in found or mtime > found[key][1]:
+                found[key] = (file_path, mtime)
+        self.by_process = {key: file_path for key, (file_path, _) in found.items()}
+        return self.by_process
+
+    def match(self, comm, exe_name=False):
+        """返回进程名称对应的 (键, 配置文件)，不是已知游戏时返回 None
+
+        exe_name 为 True 时 comm 是完整的可执行文件名（Windows 进程快照的 szExeFile），按 process_key
+        精确比较；否则是 /proc/PID/comm，可能截断为15个字符。
+        """
+        if exe_name:
+            key = process_key(comm)
+            file_path = self.by_process.get(key)
+            return (key, file_path) if file_path else None
+        for key, file_path in self.by_process.items():
+            if comm_matches(key, comm):
+                return key, file_path
+        return None
+
+
+class ProcessWatcher:
+    """后台线程：监视已知游戏进程的启动和退出
+
+    on_start(pid, key, config_path) 和 on_exit(pid, key, config_path) 在监视线程中调用。
+    """
+
+    def __init__(self, library, on_start, on_exit, log):
+        self.library = library
+        self.on_start = on_start
+        self.on_exit = on_exit
+        self.log = log
+        self.running = {}       # PID -> (启动时间, 键, 配置文件)，只在监视线程中修改
+        self.mode = None        # "netlink" 或 "scan"
+        self.events = 0         # 处理的进程事件数量
+        self._cache = {}        # 扫描时的 PID -> (comm, 启动时间)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="process-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(2.0)
+        self._thread = None
+
+    def _run(self):
+        # 先订阅再扫描，扫描期间启动的进程也不会漏掉
+        sock = self._open_netlink()
+        self.scan(full=True)
+        if sock is not None:
+            self.mode = "netlink"
+            self.log("进程监视: 订阅内核进程事件")
+            try:
+                self._run_netlink(sock)
+            finally:
+                sock.close()
+        else:
+            self.mode = "scan"
+            self._run_scan()
+
+    def _open_netlink(self):
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+            sock.bind((0, CN_IDX_PROC))
+            payload = struct.pack("=I", PROC_CN_MCAST_LISTEN)
+            header = CN_MSG.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0)
+            sock.send(NLMSG_HDR.pack(NLMSG_HDR.size + len(header) + len(payload), NLMSG_DONE, 0, 0, 0)
+                      + header + payload)
+        except (OSError, AttributeError) as e:
+            self.log(f"进程监视: 无法订阅内核进程事件（需要 root 或 CAP_NET_ADMIN），改为定期扫描 /proc: {e}")
+            return None
+        sock.settimeout(0.5)
+        return sock
+
+    def _run_netlink(self, sock):
+        while not self._stop.is_set():
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                # ENOBUFS: 短时间内事件太多，接收缓冲区溢出，完整扫描一次重新同步
+                self.log(f"进程监视: 事件接收错误，重新扫描: {e}")
+                self.scan(full=True)
+                continue
+            self._handle_netlink(data)
+
+    def _handle_netlink(self, data):
+        offset = 0
+        while offset + NLMSG_HDR.size <= len(data):
+            length = NLMSG_HDR.unpack_from(data, offset)[0]
+            if length < NLMSG_HDR.size:
+                break
+            event = offset + NLMSG_HDR.size + CN_MSG.size
+            if event + PROC_EVENT.size + PROC_IDS.size <= offset + length:
+                what = PROC_EVENT.unpack_from(data, event)[0]
+                pid, tgid = PROC_IDS.unpack_from(data, event + PROC_EVENT.size)
+                # 只关心进程（线程组），忽略线程的 exec/exit
+                if pid == tgid:
+                    if what == PROC_EVENT_EXEC:
+                        self.events += 1
+                        self._update(pid, read_proc_stat(pid))
+                    elif what == PROC_EVENT_EXIT and pid in self.running:
+                        self.events += 1
+                        self._update(pid, None)
+            offset += (length + 3) & ~3
+
+    def _run_scan(self):
+        next_full = time.monotonic() + FULL_SCAN_INTERVAL
+        while not self._stop.wait(SCAN_INTERVAL):
+            now = time.monotonic()
+            full = now >= next_full
+            if full:
+                next_full = now + FULL_SCAN_INTERVAL
+            self.scan(full)
+
+    def scan(self, full=False):
+        """扫描进程列表，只读取新出现的PID（full 时读取全部），更新运行中的游戏"""
+        if sys.platform == "win32":
+            from trigger_poller import list_processes
+
+            # Windows 进程快照没有启动时间，按可执行文件名判断PID重用
+            processes = {pid: (exe, 0) for pid, exe in list_processes().items()}
+            pids = processes.keys()
+            read_stat = processes.get
+        else:
+            pids = {int(entry) for entry in os.listdir("/proc") if entry.isdigit()}
+            read_stat = read_proc_stat
+
+        cache = self._cache
+        for pid in list(cache):
+            if pid not in pids:
+                del cache[pid]
+                if pid in self.running:
+                    self._update(pid, None)
+        for pid in pids:
+            if full or pid not in cache or pid in self.running:
+                # 运行中的游戏每次都检查启动时间，发现PID重用
+                stat = read_stat(pid)
+                if stat is None:
+                    cache.pop(pid, None)
+                    if pid in self.running:
+                        self._update(pid, None)
+                    continue
+                cache[pid] = stat
+                self._update(pid, stat)
+
+    def _update(self, pid, stat):
+        """按进程当前的 (comm, 启动时间) 更新运行中的游戏，stat 为 None 表示进程已退出"""
+        previous = self.running.get(pid)
+        match = self.library.match(stat[0], sys.platform == "win32") if stat else None
+        if previous is not None:
+            if match is not None and previous[0] == stat[1] and previous[1] == match[0]:
+                return
+            # 进程退出、PID 被新进程重用，或者 exec 成了其他程序
+            del self.running[pid]
+            self._notify(self.on_exit, pid, previous)
+        if match is not None:
+            entry = (stat[1], match[0], match[1])
+            self.running[pid] = entry
+            self._notify(self.on_start, pid, entry)
+
+    def _notify(self, callback, pid, entry):
+        try:
+            callback(pid, entry[1], entry[2])
+        except Exception as e:
+            self.log(f"进程监视回调错误: {e}")
@@ -0,0 +1,249 @@
+"""运行时性能分析
+
+通过UDP监听端口上的控制命令（以 ! 开头的数据报，只接受本机地址）在运行中
+启动和停止分析，不需要重启程序：
+
+    !profile cpu [秒数]                 cProfile，分析执行武器切换和设备写入的线程
+    !profile mem [秒数]                 tracemalloc 内存快照
+    !profile sample [秒数] [间隔毫秒]   采样所有线程的调用栈（开销低）
+    !profile stop                       立即停止所有正在进行的分析
+    !profile status                     显示正在进行的分析
+
+到时间后把结果写入输出目录（pstats / tracemalloc 快照 / 折叠调用栈文本，
+可用 flamegraph.pl 或 speedscope 查看），并在日志中输出前N个函数。
+未启用时不安装任何钩子、不运行任何线程；本模块在收到第一条控制命令时才导入。
+"""
+import os
+import sys
+import threading
+import time
+import traceback
+
+DEFAULT_DURATION = 10.0         # 默认分析时长（秒）
+DEFAULT_SAMPLE_INTERVAL = 5.0   # 默认采样间隔（毫秒）
+DEFAULT_TOP_N = 15
+
+
+class StackSampler:
+    """采样分析器：后台线程定时读取所有线程的调用栈并计数"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = {}        # "线程;外层函数;...;内层函数" -> 采样次数
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                functions = []
+                while frame is not None:
+                    code = frame.f_code
+                    functions.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                functions.append(names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(functions))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def top_functions(self, count):
+        """返回 [(函数, 自身采样数, 包含采样数), ...]，按自身采样数排序"""
+        own, inclusive = {}, {}
+        for key, hits in self.stacks.items():
+            functions = key.split(";")[1:]
+            if not functions:
+                continue
+            own[functions[-1]] = own.get(functions[-1], 0) + hits
+            for function in set(functions):
+                inclusive[function] = inclusive.get(function, 0) + hits
+        ranked = sorted(own.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [(function, hits, inclusive[function]) for function, hits in ranked]
+
+    def write_collapsed(self, file_path):
+        """写入折叠调用栈格式（每行 "栈 次数"）"""
+        with open(file_path, "w", encoding="utf-8") as f:
+            for key, hits in sorted(self.stacks.items()):
+                f.write(f"{key} {hits}\n")
+
+
+class ProfilingController:
+    """处理 !profile 控制命令
+
+    Args:
+        log: 日志函数
+        dispatch: 在执行武器切换的线程中运行函数（cProfile 只分析启用它的线程）
+        wake: 唤醒UDP线程的函数（无界面时切换在UDP线程中执行，cProfile 需要回到该线程停止）
+        output_dir: 结果文件目录
+    """
+
+    def __init__(self, log, dispatch, wake=None, output_dir=None):
+        self.log = log
+        self.dispatch = dispatch
+        self.wake = wake
+        self.output_dir = output_dir or os.environ.get("TRIGGER_PROFILE_DIR", "profiles")
+        self.top_n = DEFAULT_TOP_N
+        self.active = {}        # 分析类型 -> (停止函数, 计时器)
+        self.lock = threading.Lock()
+        self.cprofile_thread = None     # 启用 cProfile 的线程
+        self.pending_cprofile = None    # 等待回到该线程停止的 cProfile
+
+    def handle_command(self, text):
+        """处理一条控制命令（不含开头的 !），空命令只用于唤醒"""
+        self._flush_pending()
+        parts = text.split()
+        if not parts:
+            return
+        if len(parts) < 2 or parts[0] != "profile":
+            self.log(f"未知控制命令: !{text}")
+            return
+        action, args = parts[1], parts[2:]
+        try:
+            if action == "stop":
+                self.stop_all()
+            elif action == "status":
+                self.log(f"正在进行的分析: {', '.join(self.active) or '无'}")
+            elif action in ("cpu", "mem", "sample"):
+                duration = float(args[0]) if args else DEFAULT_DURATION
+                if action == "cpu":
+                    self.start_cprofile(duration)
+                elif action == "mem":
+                    self.start_tracemalloc(duration)
+                else:
+                    interval = float(args[1]) if len(args) > 1 else DEFAULT_SAMPLE_INTERVAL
+                    self.start_sampler(duration, interval / 1000.0)
+            else:
+                self.log(f"未知分析命令: {action}")
+        except ValueError:
+            self.log(f"控制命令参数无效: !{text}")
+
+    def _output_path(self, kind, extension):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.output_dir, f"{kind}-{stamp}.{extension}")
+
+    def _register(self, kind, stop, duration):
+        """记录正在进行的分析，到时间后自动停止，已在进行时返回 False"""
+        with self.lock:
+            if kind in self.active:
+                self.log(f"{kind} 分析已在进行中")
+                return False
+            timer = threading.Timer(duration, self._finish, args=(kind,))
+            timer.daemon = True
+            self.active[kind] = (stop, timer)
+        timer.start()
+        return True
+
+    def _finish(self, kind):
+        with self.lock:
+            entry = self.active.pop(kind, None)
+        if entry is None:
+            return
+        stop, timer = entry
+        timer.cancel()
+        try:
+            stop()
+        except Exception as e:
+            self.log(f"停止 {kind} 分析错误: {e}")
+            traceback.print_exc()
+
+    def stop_all(self):
+        """立即停止所有正在进行的分析并写出结果"""
+        for kind in list(self.active):
+            self._finish(kind)
+
+    def start_cprofile(self, duration):
+        """在执行切换的线程上启用 cProfile"""
+        import cProfile
+
+        profiler = cProfile.Profile()
+
+        def enable():
+            self.cprofile_thread = threading.get_ident()
+            profiler.enable()
+
+        def stop():
+            # 必须在启用它的线程上停止
+            self.dispatch(lambda: self._stop_cprofile(profiler))
+
+        if self._register("cpu", stop, duration):
+            self.dispatch(enable)
+            self.log(f"cProfile 已启动，{duration:g} 秒后停止")
+
+    def _flush_pending(self):
+        """在启用 cProfile 的线程上完成等待中的停止"""
+        profiler = self.pending_cprofile
+        if profiler is not None and threading.get_ident() == self.cprofile_thread:
+            self.pending_cprofile = None
+            self._stop_cprofile(profiler)
+
+    def _stop_cprofile(self, profiler):
+        import io
+        import pstats
+
+        if threading.get_ident() != self.cprofile_thread:
+            # 直接调度时（无界面）会在计时器线程中执行，交给UDP线程停止
+            self.pending_cprofile = profiler
+            if self.wake:
+                self.wake()
+            return
+
+        profiler.disable()
+        file_path = self._output_path("cprofile", "pstats")
+        profiler.dump_stats(file_path)
+
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(self.top_n)
+        self.log(f"cProfile 结果已保存: {file_path}")
+        for line in stream.getvalue().splitlines():
+            if line.strip():
+                self.log(line)
+
+    def start_tracemalloc(self, duration):
+        """启动 tracemalloc，到时间后保存快照"""
+        import tracemalloc
+
+        def stop():
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            file_path = self._output_path("tracemalloc", "snapshot")
+            snapshot.dump(file_path)
+            self.log(f"tracemalloc 快照已保存: {file_path}")
+            for stat in snapshot.statistics("lineno")[:self.top_n]:
+                self.log(str(stat))
+
+        if tracemalloc.is_tracing():
+            self.log("tracemalloc 已在运行（由其他代码启动）")
+            return
+        if self._register("mem", stop, duration):
+            tracemalloc.start(10)
+            self.log(f"tracemalloc 已启动，{duration:g} 秒后保存快照")
+
+    def start_sampler(self, duration, interval):
+        """启动调用栈采样"""
+        sampler = StackSampler(interval)
+
+        def stop():
+            sampler.stop()
+            file_path = self._output_path("samples", "txt")
+            sampler.write_collapsed(file_path)
+            self.log(f"采样结果已保存: {file_path} ({sampler.samples} 次采样)")
+            for function, own, inclusive in sampler.top_functions(self.top_n):
+                self.log(f"  自身 {own:6d}  包含 {inclusive:6d}  {function}")
+
+        if self._register("sample", stop, duration):
+            sampler.start()
+            self.log(f"调用栈采样已启动（间隔 {interval * 1000:g}ms），{duration:g} 秒后停止")
@@ -0,0 +1,94 @@
+"""会话录制
+
+把收到的每个UDP数据报、发送的每个HID报告、加载的配置和影响发送内容的设置
+按单调时钟时间戳追加写入紧凑的二进制文件，之后可以用 trigger_replay.py 回放，比较帧序列和延迟。
+
+文件格式:
+    文件头  b"TRGREC1\\n"
+    记录    <B 类型> <q 距录制开始的纳秒数> <I 数据长度> <数据>
+
+记录类型见 KIND_*。只追加写入，程序异常退出时已写入的完整记录仍可读取。
+"""
+import struct
+import threading
+import time
+
+MAGIC = b"TRGREC1\n"
+RECORD_HEADER = struct.Struct("<BqI")
+
+KIND_UDP = 1        # 收到的UDP数据报
+KIND_HID = 2        # 写入设备的HID报告
+KIND_CONFIG = 3     # 加载的配置（JSON文本，UTF-8）
+KIND_SETTINGS = 4   # 设置（JSON对象，只包含变化的项）：curves 响应曲线、slots 配置槽、pacing 写入节奏
+
+KIND_NAMES = {KIND_UDP: "udp", KIND_HID: "hid", KIND_CONFIG: "config", KIND_SETTINGS: "settings"}
+
+
+class SessionRecorder:
+    """追加写入录制文件（多线程安全）"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, "wb")
+        self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self.count = 0
+
+    def record(self, kind, payload, timestamp_ns=None):
+        """追加一条记录"""
+        if timestamp_ns is None:
+            timestamp_ns = time.perf_counter_ns()
+        header = RECORD_HEADER.pack(kind, timestamp_ns - self._origin, len(payload))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(header)
+            self._file.write(payload)
+            self.count += 1
+
+    def record_udp(self, data, timestamp_ns=None):
+        self.record(KIND_UDP, bytes(data), timestamp_ns)
+
+    def record_hid(self, report, timestamp_ns=None):
+        self.record(KIND_HID, bytes(report), timestamp_ns)
+
+    def record_config(self, config_data):
+        import json
+        self.record(KIND_CONFIG, json.dumps(config_data, ensure_ascii=False).encode("utf-8"))
+
+    def record_settings(self, settings):
+        import json
+        self.record(KIND_SETTINGS, json.dumps(settings, ensure_ascii=False).encode("utf-8"))
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_recording(file_path):
+    """读取录制文件，返回 [(类型, 纳秒时间戳, 数据), ...]
+
+    文件末尾不完整的记录（程序异常退出时）会被忽略。
+    """
+    records = []
+    with open(file_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是录制文件: {file_path}")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            kind, timestamp_ns, length = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                break
+            records.append((kind, timestamp_ns, payload))
+    return records
@@ -0,0 +1,192 @@
+"""回放会话录制文件并与原始结果比较
+
+把录制的UDP数据报按原始时间（或尽快）送入 TriggerPipeline.handle_udp_data，
+设备使用软件模拟设备，按录制的配置和设置（响应曲线、配置槽、写入节奏）发送，
+然后比较产生的HID帧序列和每次切换的延迟：
+
+    python trigger_replay.py session.trec
+    python trigger_replay.py session.trec --fast
+    python trigger_replay.py session.trec --tolerance 0.2 --slack-ms 5 --output replay.json
+
+帧序列不同或延迟超过 原始延迟×(1+tolerance)+slack 时退出码为1，可在CI中发现行为和延迟回归。
+--fast 模式不等待原始时间间隔、不做帧间延时，只比较帧序列。
+配置槽的查询和上传帧取决于设备上原有的内容，比较时忽略，只比较激活等其他帧。
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from trigger_core import TriggerDevice, TriggerPipeline
+from trigger_device_sim import SimulatedHid
+from trigger_recorder import KIND_CONFIG, KIND_HID, KIND_SETTINGS, KIND_UDP, read_recording
+from trigger_schema import CMD_TYPE_SLOT_BEGIN, CMD_TYPE_SLOT_COMMIT, CMD_TYPE_SLOT_DATA, CMD_TYPE_SLOT_QUERY
+
+# 配置槽查询和上传的命令类型（见 compare）
+SLOT_SYNC_TYPES = (CMD_TYPE_SLOT_QUERY, CMD_TYPE_SLOT_BEGIN, CMD_TYPE_SLOT_DATA, CMD_TYPE_SLOT_COMMIT)
+
+
+def switch_latencies(udp_times, frame_times):
+    """每个UDP数据报到下一个数据报之前最后一帧的时间（纳秒），没有帧时为 None"""
+    latencies = []
+    frame_index = 0
+    for i, udp_time in enumerate(udp_times):
+        next_udp = udp_times[i + 1] if i + 1 < len(udp_times) else None
+        last = None
+        while frame_index < len(frame_times) and frame_times[frame_index] < udp_time:
+            frame_index += 1
+        while frame_index < len(frame_times) and (next_udp is None or frame_times[frame_index] < next_udp):
+            last = frame_times[frame_index]
+            frame_index += 1
+        latencies.append(None if last is None else last - udp_time)
+    return latencies
+
+
+def summarize_ms(latencies):
+    values = [latency / 1e6 for latency in latencies if latency is not None]
+    if not values:
+        return None
+    return {"median_ms": statistics.median(values), "max_ms": max(values), "count": len(values)}
+
+
+def apply_settings(pipeline, settings, fast=False):
+    """按录制的设置配置回放用的管线（只应用记录中出现的项，fast 时不使用帧间延时）"""
+    pacing = settings.get("pacing")
+    if pacing:
+        device = pipeline.device
+        device.burst = pacing["burst"]
+        device.report_size = pacing["report_size"]
+        if not fast:
+            device.frame_delay = pacing["frame_delay"]
+            if pacing.get("param_delay") is not None:
+                pipeline.param_delay = pacing["param_delay"]
+    if "curves" in settings:
+        from trigger_curves import parse_curves
+
+        pipeline.set_curves(parse_curves(settings["curves"]) if settings["curves"] else None)
+    if settings.get("slots"):
+        pipeline.enable_slots(settings["slots"])
+
+
+def replay(records, fast=False, write_latency=0.0, morph_ms=0.0, log=None):
+    """回放录制记录，返回 (UDP时间列表, [(帧时间, 帧), ...])，时间为相对回放开始的纳秒数"""
+    log = log or (lambda message: None)
+    sim = SimulatedHid(write_latency=write_latency)
+    device = TriggerDevice(log, backend=sim)
+    pipeline = TriggerPipeline(device=device, log_handlers=[log])
+    pipeline.morph_duration = morph_ms / 1000.0
+    if fast:
+        device.frame_delay = 0
+        pipeline.param_delay = 0
+    device.connect()
+
+    events = [record for record in records if record[0] in (KIND_UDP, KIND_CONFIG, KIND_SETTINGS)]
+    end_time = max((record[1] for record in records), default=0)
+    udp_times = []
+
+    start = time.perf_counter_ns()
+    for kind, timestamp_ns, payload in events:
+        if not fast:
+            delay = (start + timestamp_ns - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+        if kind == KIND_CONFIG:
+            pipeline.set_config(json.loads(payload.decode("utf-8")))
+        elif kind == KIND_SETTINGS:
+            apply_settings(pipeline, json.loads(payload.decode("utf-8")), fast)
+        else:
+            udp_times.append(time.perf_counter_ns() - start)
+            pipeline.handle_udp_data(payload)
+
+    # 等到原始会话结束，让序列和过渡播放完，再停止
+    if not fast:
+        delay = (start + end_time - time.perf_counter_ns()) / 1e9
+        if delay > 0:
+            time.sleep(delay)
+    pipeline.sequencer.cancel()
+    device.close()
+
+    frames = [(timestamp - start, report) for timestamp, report in sim.frames]
+    return udp_times, frames
+
+
+def compare(records, udp_times, frames, fast=False, tolerance=0.2, slack_ms=5.0):
+    """比较原始和回放结果，返回结果字典"""
+    original_hid = [(timestamp, payload) for kind, timestamp, payload in records
+                    if kind == KIND_HID and payload[2] not in SLOT_SYNC_TYPES]
+    frames = [(timestamp, report) for timestamp, report in frames if report[2] not in SLOT_SYNC_TYPES]
+    original_frames = [payload for _, payload in original_hid]
+    replay_frames = [report for _, report in frames]
+
+    first_mismatch = None
+    for index, (original, replayed) in enumerate(zip(original_frames, replay_frames)):
+        if original != replayed:
+            first_mismatch = index
+            break
+    if first_mismatch is None and len(original_frames) != len(replay_frames):
+        first_mismatch = min(len(original_frames), len(replay_frames))
+
+    result = {
+        "frames_original": len(original_frames),
+        "frames_replay": len(replay_frames),
+        "sequence_match": first_mismatch is None,
+        "first_mismatch": first_mismatch,
+        "mode": "fast" if fast else "realtime",
+    }
+    if first_mismatch is not None:
+        result["mismatch_detail"] = {
+            "original": original_frames[first_mismatch][:10].hex() if first_mismatch < len(original_frames) else None,
+            "replay": replay_frames[first_mismatch][:10].hex() if first_mismatch < len(replay_frames) else None,
+        }
+
+    if not fast:
+        original_latencies = switch_latencies(
+            [timestamp for kind, timestamp, _ in records if kind == KIND_UDP],
+            [timestamp for timestamp, _ in original_hid])
+        replay_latencies = switch_latencies(udp_times, [timestamp for timestamp, _ in frames])
+
+        regressions = []
+        for index, (original, replayed) in enumerate(zip(original_latencies, replay_latencies)):
+            if original is None or replayed is None:
+                continue
+            limit = original * (1 + tolerance) + slack_ms * 1e6
+            if replayed > limit:
+                regressions.append({"switch": index, "original_ms": original / 1e6, "replay_ms": replayed / 1e6})
+
+        result["latency_original"] = summarize_ms(original_latencies)
+        result["latency_replay"] = summarize_ms(replay_latencies)
+        result["latency_regressions"] = regressions
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放会话录制文件并比较帧序列和延迟")
+    parser.add_argument("recording", help="录制文件（trigger_daemon --record 或 TRIGGER_RECORD 生成）")
+    parser.add_argument("--fast", action="store_true", help="尽快回放，只比较帧序列")
+    parser.add_argument("--write-latency", type=float, default=0.0, help="模拟设备每次写入的耗时（毫秒）")
+    parser.add_argument("--morph-ms", type=float, default=0.0, help="回放时的参数过渡毫秒数（应与录制时一致）")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对延迟增加 (默认 0.2)")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="允许的绝对延迟增加（毫秒，默认 5）")
+    parser.add_argument("--verbose", action="store_true", help="打印管线日志")
+    parser.add_argument("--output", help="把比较结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    records = read_recording(args.recording)
+    log = print if args.verbose else None
+    udp_times, frames = replay(records, fast=args.fast, write_latency=args.write_latency / 1000.0,
+                               morph_ms=args.morph_ms, log=log)
+    result = compare(records, udp_times, frames, fast=args.fast,
+                     tolerance=args.tolerance, slack_ms=args.slack_ms)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    failed = not result["sequence_match"] or result.get("latency_regressions")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""触发器协议的参数和模式注册表
+
+导入时构建一次、之后不可修改。每个参数记录数字ID、取值范围、默认值、
+在配置文件 param 数组中的位置和预先编码好的帧头字节；每个模式记录模式ID、
+所属参数和完整的模式帧。发送路径只查表和拼接字节，不再每次构建字典。
+"""
+from types import MappingProxyType
+
+# 命令格式常量
+CMD_HEADER = 0xAA       # 命令头
+CMD_FOOTER = 0x55       # 命令尾
+
+# 命令类型
+CMD_TYPE_MODE = 0x01    # 模式设置命令
+CMD_TYPE_PARAM = 0x02   # 参数设置命令
+CMD_TYPE_SLOT_QUERY = 0x03      # 查询配置槽，设备应答 [槽容量, 已存槽数, 内容哈希(4字节)]
+CMD_TYPE_SLOT_BEGIN = 0x04      # 开始上传配置槽: [槽数, 内容哈希(4字节), 存储位置]
+CMD_TYPE_SLOT_DATA = 0x05       # 配置槽数据块: [偏移高字节, 偏移低字节, 数据...]
+CMD_TYPE_SLOT_COMMIT = 0x06     # 结束上传: [内容哈希(4字节)]，设备校验后保存
+CMD_TYPE_SLOT_ACTIVATE = 0x07   # 激活配置槽: [槽号]
+CMD_TYPE_TELEMETRY = 0x80   # 遥测输入报告（设备→主机）: 数据为 [扳机位置, 力, 模式ID, 状态标志]
+
+# 模式ID
+MODE_GENERAL = 0x10     # 通用模式
+MODE_RACING = 0x11      # 赛车模式
+MODE_RECOIL = 0x12      # 后座力模式
+MODE_SNIPER = 0x13      # 狙击模式
+MODE_LOCK = 0x14        # 锁定模式
+
+# HID报告长度（含报告ID）
+REPORT_SIZE = 64
+
+
+def decode_input_report(report):
+    """解析设备的输入报告，返回 (命令类型, 数据字节)，格式或校验和错误时返回 None
+
+    hidapi 不带报告ID时没有开头的0，两种格式都接受。
+    """
+    if len(report) < 5:
+        return None
+    offset = 1 if report[0] == 0 and report[1] == CMD_HEADER else 0
+    if report[offset] != CMD_HEADER:
+        return None
+    cmd_type, length = report[offset + 1], report[offset + 2]
+    end = offset + 3 + length
+    if len(report) < end + 2:
+        return None
+    data = bytes(report[offset + 3:end])
+    if report[end] != (cmd_type + sum(data)) & 0xFF or report[end + 1] != CMD_FOOTER:
+        return None
+    return cmd_type, data
+
+
+def encode_report(cmd_type, data, report_size=REPORT_SIZE):
+    """编码命令帧: [报告ID, 命令头, 命令类型, 数据长度, ...数据, 校验和, 命令尾, 填充]"""
+    checksum = (cmd_type + sum(data)) & 0xFF
+    report = bytes([0, CMD_HEADER, cmd_type, len(data)]) + bytes(data) + bytes([checksum, CMD_FOOTER])
+    return report + bytes(report_size - len(report))
+
+
+class _Frozen:
+    """构建完成后禁止修改属性"""
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} 是只读的")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} 是只读的")
+
+
+class ParamSpec(_Frozen):
+    """一个参数的定义"""
+    __slots__ = ("name", "id", "mode", "position", "minimum", "maximum", "default",
+                 "is_toggle", "label", "help", "_prefix", "_checksum_base", "_padding")
+
+    def __init__(self, name, param_id, mode, position, minimum, maximum, default, label, help_text,
+                 is_toggle=False):
+        setter = object.__setattr__
+        setter(self, "name", name)
+        setter(self, "id", param_id)
+        setter(self, "mode", mode)
+        setter(self, "position", position)  # 在 param 数组中的位置，开关参数为 None
+        setter(self, "minimum", minimum)
+        setter(self, "maximum", maximum)
+        setter(self, "default", default)
+        setter(self, "is_toggle", is_toggle)
+        setter(self, "label", label)
+        setter(self, "help", help_text)
+        # 预编码: [报告ID, 命令头, 参数命令, 数据长度3, 参数ID]，之后只需追加值的两个字节
+        setter(self, "_prefix", bytes([0, CMD_HEADER, CMD_TYPE_PARAM, 3, param_id]))
+        setter(self, "_checksum_base", (CMD_TYPE_PARAM + param_id) & 0xFF)
+        setter(self, "_padding", bytes(REPORT_SIZE - 9))
+
+    def clamp(self, value):
+        """把值限制在参数范围内"""
+        value = int(value)
+        if value < self.minimum:
+            return self.minimum
+        if value > self.maximum:
+            return self.maximum
+        return value
+
+    def encode(self, value):
+        """编码参数帧（值会先限制在范围内）: [参数ID, 值高字节, 值低字节]"""
+        value = self.clamp(value)
+        high = (value >> 8) & 0xFF
+        low = value & 0xFF
+        return self._prefix + bytes([high, low, (self._checksum_base + high + low) & 0xFF, CMD_FOOTER]) + self._padding
+
+    def __repr__(self):
+        return f"ParamSpec({self.name}, 0x{self.id:02X}, {self.minimum}-{self.maximum})"
+
+
+class ModeSpec(_Frozen):
+    """一个模式的定义"""
+    __slots__ = ("name", "value", "id", "label", "params", "toggles", "all_params", "frame")
+
+    def __init__(self, name, value, mode_id, label, params, toggles):
+        setter = object.__setattr__
+        setter(self, "name", name)
+        setter(self, "value", value)        # 配置文件 trigger.right.mode 的取值
+        setter(self, "id", mode_id)         # 协议中的模式ID
+        setter(self, "label", label)
+        setter(self, "params", tuple(params))    # 数值参数，按 param 数组位置排列
+        setter(self, "toggles", tuple(toggles))  # 开关参数
+        setter(self, "all_params", self.params + self.toggles)
+        setter(self, "frame", encode_report(CMD_TYPE_MODE, [mode_id]))  # 完整的模式帧
+
+    def __repr__(self):
+        return f"ModeSpec({self.name}, 0x{self.id:02X})"
+
+
+def _build():
+    """构建注册表"""
+    def slider(name, param_id, mode, position, minimum, maximum, default, label, help_text):
+        return ParamSpec(name, param_id, mode, position, minimum, maximum, default, label, help_text)
+
+    def toggle(name, param_id, mode, label, help_text):
+        return ParamSpec(name, param_id, mode, None, 0, 1, 0, label, help_text, is_toggle=True)
+
+    # 赛车模式参数
+    damping_start = slider("DAMPING_START", 0x21, "RACING", 0, 0, 192, 0, "阻尼开始位置",
+                           "阻尼开始位置（0-192）- 设置阻尼效果开始的触发器位置")
+    damping_strength = slider("DAMPING_STRENGTH", 0x22, "RACING", 1, 1, 255, 30, "阻尼强度",
+                              "阻尼强度（1-255）- 控制阻尼效果的强度")
+
+    # 后座力模式参数
+    vib_start_pos = slider("VIB_START_POS", 0x31, "RECOIL", 0, 0, 192, 0, "振动开始位置",
+                           "振动开始位置（0-192）- 设置振动效果开始的触发器位置")
+    vib_start_strength = slider("VIB_START_STRENGTH", 0x32, "RECOIL", 1, 1, 255, 1, "振动初始强度",
+                                "振动初始强度（1-255）- 控制振动开始时的初始强度")
+    vib_intensity = slider("VIB_INTENSITY", 0x33, "RECOIL", 2, 1, 255, 50, "振动强度",
+                           "振动强度（1-255）- 控制振动效果的整体强度")
+    vib_frequency = slider("VIB_FREQUENCY", 0x34, "RECOIL", 3, 1, 255, 15, "振动频率",
+                           "振动频率（1-255）- 控制振动效果的频率")
+    vib_start_data = toggle("VIB_START_DATA", 0x35, "RECOIL", "从振动开始位置开始输出数据",
+                            "启用时，从振动开始位置开始输出数据")
+
+    # 狙击模式参数
+    start_pos = slider("START_POS", 0x41, "SNIPER", 0, 0, 192, 50, "开始位置",
+                       "开始位置（0-192）- 设置狙击模式效果开始的触发器位置")
+    trigger_stroke = slider("TRIGGER_STROKE", 0x42, "SNIPER", 1, 1, 255, 30, "触发行程",
+                            "触发行程（1-255）- 控制触发器的行程距离")
+    resistance = slider("RESISTANCE", 0x43, "SNIPER", 2, 1, 255, 1, "阻力",
+                        "阻力（1-255）- 控制狙击模式下的阻力大小")
+    break_start_data = toggle("BREAK_START_DATA", 0x44, "SNIPER", "从断开开始位置开始输出数据",
+                              "启用时，从断开开始位置开始输出数据")
+
+    # 锁定模式参数
+    lock_damping_start = slider("LOCK_DAMPING_START", 0x51, "LOCK", 0, 20, 200, 80, "阻尼开始位置",
+                                "锁定阻尼开始位置（20-200）- 设置锁定模式下阻尼效果开始的位置")
+
+    modes = (
+        ModeSpec("GENERAL", 0, MODE_GENERAL, "通用模式", [], []),
+        ModeSpec("RACING", 1, MODE_RACING, "赛车模式", [damping_start, damping_strength], []),
+        ModeSpec("RECOIL", 2, MODE_RECOIL, "后座力模式",
+                 [vib_start_pos, vib_start_strength, vib_intensity, vib_frequency], [vib_start_data]),
+        ModeSpec("SNIPER", 3, MODE_SNIPER, "狙击模式",
+                 [start_pos, trigger_stroke, resistance], [break_start_data]),
+        ModeSpec("LOCK", 4, MODE_LOCK, "锁定模式", [lock_damping_start], []),
+    )
+    return modes
+
+
+# 模式按配置文件取值排列，MODE_LIST[mode_value] 即对应模式
+MODE_LIST = _build()
+MODES = MappingProxyType({mode.name: mode for mode in MODE_LIST})
+PARAMS = MappingProxyType({param.name: param for mode in MODE_LIST for param in mode.all_params})
+PARAMS_BY_ID = MappingProxyType({param.id: param for param in PARAMS.values()})
+DEFAULT_MODE = MODES["GENERAL"]
+
+
+def mode_by_value(mode_value):
+    """按配置文件中的 mode 取值返回模式，未知取值返回通用模式"""
+    if isinstance(mode_value, int) and 0 <= mode_value < len(MODE_LIST):
+        return MODE_LIST[mode_value]
+    return DEFAULT_MODE
@@ -0,0 +1,292 @@
+"""触发器效果序列
+
+武器配置可以在 trigger 旁边加上 sequence，描述随时间变化的参数（例如逐发变化的
+后座力、与射速同步的振动）。应用武器配置后，序列在独立的线程中按单调时钟播放：
+
+    "sequence": {
+        "repeat": 0,
+        "period": 600,
+        "keyframes": [
+            {"t": 0,   "param": [0, 0, 200, 0]},
+            {"t": 100, "param": [0, 0, 60, 0]},
+            {"t": 300, "values": {"VIB_FREQUENCY": 30}}
+        ]
+    }
+
+t 为相对序列开始的毫秒数；param 与 trigger.right.param 一样按位置对应模式参数
+（0表示不变），values 按参数名称设置。repeat 为播放次数（0表示一直循环，默认1），
+period 为每次循环的长度（毫秒，默认为最后一个关键帧的时间）。
+
+关键帧按绝对时间（开始时间+t）调度，单帧的延迟不会累积到后面的关键帧；
+每个关键帧的实际发送时间与计划时间之差记入抖动统计。
+新的武器切换到达时序列立即取消。
+
+同一模式的武器之间切换时，可以用 build_morph 生成的过渡序列把数值参数
+从旧值平滑过渡到新值（见 TriggerPipeline.morph_duration）。
+"""
+import math
+import threading
+import time
+import traceback
+
+import trigger_metrics as metrics
+from trigger_schema import PARAMS
+from trigger_trace import TRACER
+
+# 距离计划时间小于该值（秒）时不再睡眠，改为自旋等待，减少睡眠唤醒的误差
+SPIN_THRESHOLD = 0.002
+
+
+class Keyframe:
+    """一个关键帧：计划时间和要发送的参数（帧在编译时已编码好）"""
+    __slots__ = ("at", "values")
+
+    def __init__(self, at, values):
+        self.at = at            # 相对循环开始的秒数
+        self.values = tuple((spec, value, spec.encode(value)) for spec, value in values)
+        # ((ParamSpec, 已限制范围的值, 参数帧), ...)
+
+
+class Sequence:
+    """编译后的序列"""
+    __slots__ = ("weapon", "keyframes", "period", "repeat")
+
+    def __init__(self, weapon, keyframes, period, repeat):
+        self.weapon = weapon
+        self.keyframes = keyframes  # 按时间排序的 Keyframe 元组
+        self.period = period        # 每次循环的秒数
+        self.repeat = repeat        # 播放次数，0表示一直循环
+
+
+def _number(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{what}不是数值: {value!r}")
+    return value
+
+
+def compile_sequence(weapon_name, mode_spec, sequence_data, curves=None):
+    """把配置中的 sequence 编译为 Sequence，没有关键帧时返回 None（curves 为参数响应曲线，见 trigger_curves）
+
+    在加载配置时调用，切换武器时只播放编译好的序列。关键帧缺少时间、值不是数值或参数不属于
+    武器的模式时抛出 ValueError，信息中包含武器名称和关键帧序号。
+    """
+    map_value = curves.map if curves else (lambda spec, value: spec.clamp(value))
+    prefix = f"武器 '{weapon_name}' 的序列"
+    if not isinstance(sequence_data, dict) or not isinstance(sequence_data.get("keyframes", []), list):
+        raise ValueError(f"{prefix}格式错误，需要包含 keyframes 数组的对象")
+    keyframes = []
+    for index, frame in enumerate(sequence_data.get("keyframes", [])):
+        where = f"{prefix}第 {index + 1} 个关键帧"
+        if not isinstance(frame, dict):
+            raise ValueError(f"{where}不是对象")
+        if "t" not in frame:
+            raise ValueError(f"{where}缺少时间 t")
+        at = _number(frame["t"], f"{where}的时间") / 1000.0
+        if at < 0:
+            raise ValueError(f"{where}的时间为负")
+
+        values = []
+        # 按位置对应模式参数，0表示不变
+        params = frame.get("param", [])
+        if not isinstance(params, list):
+            raise ValueError(f"{where}的 param 不是数组")
+        for spec, value in zip(mode_spec.params, params):
+            if _number(value, f"{where}的 {spec.name} ") != 0:
+                values.append((spec, map_value(spec, value)))
+        # 按名称设置，只接受当前模式的参数
+        named = frame.get("values", {})
+        if not isinstance(named, dict):
+            raise ValueError(f"{where}的 values 不是对象")
+        for name, value in named.items():
+            spec = PARAMS.get(name)
+            if spec is None or spec.mode != mode_spec.name:
+                raise ValueError(f"{where}的参数 '{name}' 不属于 {mode_spec.name} 模式")
+            values.append((spec, map_value(spec, _number(value, f"{where}的 {name} "))))
+
+        if values:
+            keyframes.append(Keyframe(at, values))
+
+    if not keyframes:
+        return None
+
+    keyframes.sort(key=lambda keyframe: keyframe.at)
+    last = keyframes[-1].at
+    period = _number(sequence_data.get("period", last * 1000.0), f"{prefix}的 period ") / 1000.0
+    repeat = _number(sequence_data.get("repeat", 1), f"{prefix}的 repeat ")
+    if repeat < 0 or repeat != int(repeat):
+        raise ValueError(f"{prefix}的 repeat 必须是非负整数")
+    repeat = int(repeat)
+    if repeat != 1 and max(period, last) <= 0:
+        raise ValueError(f"{prefix}循环播放时 period 必须大于0")
+    return Sequence(weapon_name, tuple(keyframes), max(period, last), repeat)
+
+
+def build_morph(weapon_name, mode_spec, old_values, new_values, duration, rate_hz):
+    """生成从旧参数值过渡到新参数值的序列，没有需要过渡的参数时返回 None
+
+    过渡表在切换时一次算好（每一步的值和编码好的帧），播放时只写入帧。
+    每一步只包含值发生变化的参数；总帧率不超过 rate_hz，
+    步数也不超过参数的最大变化量（整数值，再多的步也不会产生新值）。
+
+    Args:
+        old_values / new_values: {参数名称: 值}，只使用模式的数值参数
+        duration: 过渡时长（秒）
+        rate_hz: 最大帧率（帧/秒）
+    """
+    changes = []
+    for spec in mode_spec.params:
+        old = old_values.get(spec.name, spec.default)
+        new = new_values.get(spec.name, spec.default)
+        if old != new:
+            changes.append((spec, old, new))
+    if not changes or duration <= 0 or rate_hz <= 0:
+        return None
+
+    # 每一步最多发送 len(changes) 帧，按帧率预算确定步数：
+    # 第一步立即发送，最后一步在 duration 时发送，相邻两步至少间隔 len(changes)/rate_hz 秒
+    max_delta = max(abs(new - old) for _, old, new in changes)
+    steps = int(duration * rate_hz / len(changes)) + 1
+    steps = max(1, min(steps, max_delta))
+    interval = duration / (steps - 1) if steps > 1 else 0.0
+
+    keyframes = []
+    previous = {spec.name: old for spec, old, _ in changes}
+    for step in range(1, steps + 1):
+        fraction = step / steps
+        values = []
+        for spec, old, new in changes:
+            value = round(old + (new - old) * fraction)
+            if value != previous[spec.name]:
+                previous[spec.name] = value
+                values.append((spec, value))
+        if values:
+            keyframes.append(Keyframe((step - 1) * interval, values))
+    return Sequence(weapon_name, tuple(keyframes), duration, 1)
+
+
+class JitterStats:
+    """关键帧抖动统计（秒）"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.max = 0.0
+
+    def add(self, lateness):
+        self.count += 1
+        self.total += lateness
+        self.total_sq += lateness * lateness
+        if lateness > self.max:
+            self.max = lateness
+
+    def summary(self):
+        """返回 {count, mean, stdev, max}（秒）"""
+        if not self.count:
+            return {"count": 0, "mean": 0.0, "stdev": 0.0, "max": 0.0}
+        mean = self.total / self.count
+        variance = max(self.total_sq / self.count - mean * mean, 0.0)
+        return {"count": self.count, "mean": mean, "stdev": math.sqrt(variance), "max": self.max}
+
+
+class TriggerSequencer:
+    """在独立线程中播放序列，写入经由管线（和设备的 io_lock）完成"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.spin_threshold = SPIN_THRESHOLD
+        self.last_stats = None   # 上一个序列的抖动统计
+        self._thread = None
+        self._cancel = None
+
+    @property
+    def playing(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def play(self, *sequences, cid=0):
+        """取消正在播放的序列并依次播放新序列（例如先过渡再播放武器的序列）"""
+        self.cancel()
+        sequences = [sequence for sequence in sequences if sequence]
+        if not sequences:
+            return
+        cancel = threading.Event()
+        self._cancel = cancel
+        self._thread = threading.Thread(
+            target=self._run_all, args=(sequences, cancel, cid), name="trigger-sequencer", daemon=True)
+        self._thread.start()
+
+    def cancel(self, timeout=0.5):
+        """立即取消正在播放的序列
+
+        等待序列线程退出（最多等完正在写入的一帧），保证之后发送的帧不会被序列覆盖。
+        timeout 为0时只通知序列停止，不等待（已经通知过的序列再次调用时仍会等待）。
+        """
+        cancel, thread = self._cancel, self._thread
+        if cancel is None:
+            return
+        cancel.set()
+        if timeout and thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _wait_until(self, target, cancel):
+        """等待到 target（perf_counter 秒），被取消时返回 False"""
+        remaining = target - time.perf_counter()
+        if remaining > self.spin_threshold:
+            if cancel.wait(remaining - self.spin_threshold):
+                return False
+        while time.perf_counter() < target:
+            if cancel.is_set():
+                return False
+        return not cancel.is_set()
+
+    def _run_all(self, sequences, cancel, cid):
+        TRACER.set_correlation(cid)
+        for sequence in sequences:
+            if cancel.is_set() or not self._run(sequence, cancel):
+                break
+
+    def _run(self, sequence, cancel):
+        """播放一个序列，完整播放完时返回 True"""
+        pipeline = self.pipeline
+        stats = JitterStats()
+        pipeline.log(f"开始播放武器 '{sequence.weapon}' 的序列: {len(sequence.keyframes)} 个关键帧")
+        try:
+            start = time.perf_counter()
+            cycle = 0
+            while sequence.repeat == 0 or cycle < sequence.repeat:
+                # 每次循环的开始时间由起点推算，不受之前延迟的影响
+                base = start + cycle * sequence.period
+                for keyframe in sequence.keyframes:
+                    target = base + keyframe.at
+                    if not self._wait_until(target, cancel):
+                        return False
+                    if not pipeline.device.connected:
+                        pipeline.log("设备未连接，停止播放序列")
+                        return False
+
+                    lateness = time.perf_counter() - target
+                    stats.add(lateness)
+                    metrics.SEQUENCE_JITTER.observe(lateness)
+                    metrics.SEQUENCE_KEYFRAMES.inc()
+
+                    # 帧已在编译时编码，这里只写入
+                    with TRACER.span("sequence_keyframe"):
+                        for spec, value, frame in keyframe.values:
+                            if cancel.is_set():
+                                return False
+                            pipeline.set_parameter(spec.name, value, frame)
+                cycle += 1
+            return True
+        except Exception as e:
+            pipeline.log(f"播放序列错误: {e}")
+            traceback.print_exc()
+            return False
+        finally:
+            if cancel.is_set():
+                metrics.SEQUENCES_CANCELLED.inc()
+            self.last_stats = stats.summary()
+            summary = self.last_stats
+            pipeline.log(
+                f"序列{'已取消' if cancel.is_set() else '播放完成'}: {summary['count']} 个关键帧, "
+                f"抖动 平均 {summary['mean'] * 1000:.3f}ms, 标准差 {summary['stdev'] * 1000:.3f}ms, "
+                f"最大 {summary['max'] * 1000:.3f}ms")
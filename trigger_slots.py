@@ -0,0 +1,87 @@
+"""设备配置槽
+
+把一个配置中所有武器（和默认配置）的模式与参数一次性上传到设备的编号配置槽（RAM或Flash），
+之后切换武器只需发送一个“激活配置槽N”命令，不再逐帧发送模式和参数。
+
+槽数据是所有槽记录依次拼接的字节串，每条记录:
+    [槽号, 模式ID, 参数数量, (参数ID, 值高字节, 值低字节) * 参数数量]
+只包含配置中非0的参数（与逐帧发送相同，0表示保留设备上的当前值）。
+内容哈希为槽数据的 CRC32，设备保存后在查询应答中返回，哈希相同时不需要重新上传。
+
+上传过程:
+    SLOT_BEGIN [槽数, 哈希, 存储位置] -> SLOT_DATA [偏移, 最多56字节]... -> SLOT_COMMIT [哈希]
+"""
+import zlib
+
+from trigger_schema import (
+    CMD_TYPE_SLOT_ACTIVATE, CMD_TYPE_SLOT_BEGIN, CMD_TYPE_SLOT_COMMIT, CMD_TYPE_SLOT_DATA, encode_report,
+)
+
+SLOT_CHUNK = 56         # 每个数据块的字节数（64字节报告去掉帧头、偏移、校验和与命令尾）
+MAX_SLOTS = 255         # 槽号为一个字节
+STORES = {"ram": 0, "flash": 1}
+
+
+class SlotTable:
+    """一个配置的槽数据：武器配置 -> 槽号，以及预先编码好的激活帧
+
+    Args:
+        profiles: WeaponProfile 列表，按顺序分配槽号
+    """
+
+    __slots__ = ("profiles", "blob", "hash", "frames")
+
+    def __init__(self, profiles):
+        self.profiles = list(profiles)[:MAX_SLOTS]
+        blob = bytearray()
+        self.frames = {}    # WeaponProfile -> 激活帧
+        for slot, profile in enumerate(self.profiles):
+            blob += bytes([slot, profile.mode.id, len(profile.values)])
+            for spec, value in profile.values:
+                blob += bytes([spec.id, (value >> 8) & 0xFF, value & 0xFF])
+            self.frames[profile] = encode_report(CMD_TYPE_SLOT_ACTIVATE, [slot])
+        self.blob = bytes(blob)
+        self.hash = zlib.crc32(self.blob)
+
+    @classmethod
+    def from_config(cls, compiled_config):
+        profiles = list(compiled_config.profiles.values())
+        if compiled_config.default is not None:
+            profiles.append(compiled_config.default)
+        return cls(profiles)
+
+    def upload_frames(self, store="ram"):
+        """返回上传全部槽的帧（开始、数据块、结束）"""
+        hash_bytes = list(self.hash.to_bytes(4, "big"))
+        frames = [encode_report(CMD_TYPE_SLOT_BEGIN, [len(self.profiles)] + hash_bytes + [STORES[store]])]
+        blob = self.blob
+        for offset in range(0, len(blob), SLOT_CHUNK):
+            frames.append(encode_report(CMD_TYPE_SLOT_DATA, [offset >> 8, offset & 0xFF]
+                                        + list(blob[offset:offset + SLOT_CHUNK])))
+        frames.append(encode_report(CMD_TYPE_SLOT_COMMIT, hash_bytes))
+        return frames
+
+
+def parse_slot_reply(data):
+    """解析查询应答 [槽容量, 已存槽数, 哈希(4字节)]，返回 (槽容量, 已存槽数, 哈希)"""
+    if len(data) < 6:
+        raise ValueError(f"配置槽应答长度错误: {len(data)}")
+    return data[0], data[1], int.from_bytes(data[2:6], "big")
+
+
+def parse_slot_blob(blob):
+    """解析槽数据（模拟设备使用），返回 {槽号: (模式ID, [(参数ID, 值), ...])}"""
+    slots = {}
+    offset = 0
+    while offset + 3 <= len(blob):
+        slot, mode_id, count = blob[offset:offset + 3]
+        offset += 3
+        params = []
+        for _ in range(count):
+            param_id, high, low = blob[offset:offset + 3]
+            params.append((param_id, (high << 8) | low))
+            offset += 3
+        slots[slot] = (mode_id, params)
+    if offset != len(blob):
+        raise ValueError("配置槽数据不完整")
+    return slots
@@ -0,0 +1,400 @@
+"""游戏状态来源
+
+武器切换可以来自多个来源：UDP文本命令、二进制UDP、游戏内存条件轮询、标准输入/命名管道和日志文件。
+每个来源把它观察到的游戏状态（武器名称或武器序号）发布到同一个 SourceHub，由它解析为配置中的武器
+并调度到执行武器切换的线程:
+
+  - 每个来源一个有界队列（默认8条），执行跟不上时丢弃该来源最旧的状态，不影响其他来源
+  - 每个来源一次只在调度队列中放一个取出任务，取出一条后再重新调度，多个来源轮流执行
+  - 重复的状态（与该来源队列中最后一条相同，或者设备上已经是这把武器）直接丢弃
+  - 按来源统计收到、重复、丢弃、未知和应用的状态数量，以及从收到到写完设备的延迟
+  - 启用客户端代理时，带客户端的UDP命令交给代理（代理按客户端只保留最新的一条命令）
+
+UDP文本命令（管线的UDP服务器）和游戏内存轮询是管线内置的来源，其他来源用规格字符串创建
+（守护进程 --source，GUI 环境变量 TRIGGER_SOURCES，多条用 ; 分隔）:
+
+    stdin                       从标准输入逐行读取武器名称
+    pipe:路径                   从命名管道逐行读取（写入端关闭后重新打开）
+    tail:路径                   跟踪文件末尾新写入的行（文件被截断或替换后从头读取）
+    udp-bin:[主机:]端口          二进制UDP数据报 <2s "TW"> <B 版本=1> <B 保留> <H 武器序号>（小端）
+    py:模块.类名[:参数]          导入自定义来源类，用 cls(参数) 创建
+
+自定义来源继承 StateSource，实现 run()，用 self.publish(状态) 发布，循环中检查 self.stopped；
+也可以用 register_source_type(前缀, 工厂函数) 注册新的规格前缀。
+"""
+import collections
+import importlib
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+
+import trigger_metrics as metrics
+from trigger_trace import TRACER
+
+DEFAULT_CAPACITY = 8        # 每个来源的队列长度
+TAIL_INTERVAL = 0.05        # 跟踪文件时检查新内容的间隔（秒）
+BINARY_MAGIC = b"TW"
+BINARY_VERSION = 1
+BINARY_STATE = struct.Struct("<2sBBH")
+
+
+class StateEvent:
+    """来源发布的一个游戏状态"""
+
+    __slots__ = ("state", "weapon", "received_at", "client", "cid", "queued_at")
+
+    def __init__(self, state, weapon, received_at, client=None):
+        self.state = state
+        self.weapon = weapon
+        self.received_at = received_at
+        self.client = client
+        # 关联ID和排队时间随事件传递，用于追踪调度跳转
+        self.cid = TRACER.current_correlation()
+        self.queued_at = TRACER.now()
+
+
+class SourceChannel:
+    """一个来源的有界队列和统计"""
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.queue = collections.deque()
+        self.scheduled = False      # 调度队列中有这个来源的取出任务
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.received = metrics.SOURCE_STATES.labels(name, "received")
+        self.deduped = metrics.SOURCE_STATES.labels(name, "deduped")
+        self.dropped = metrics.SOURCE_STATES.labels(name, "dropped")
+        self.unknown = metrics.SOURCE_STATES.labels(name, "unknown")
+        self.applied = metrics.SOURCE_STATES.labels(name, "applied")
+
+    def observe(self, latency):
+        self.latency_count += 1
+        self.latency_sum += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+        metrics.SOURCE_LATENCY.observe(latency)
+
+    def stats(self):
+        count = self.latency_count
+        return {
+            "received": self.received.value(),
+            "deduped": self.deduped.value(),
+            "dropped": self.dropped.value(),
+            "unknown": self.unknown.value(),
+            "applied": self.applied.value(),
+            "pending": len(self.queue),
+            "latency_avg_ms": self.latency_sum / count * 1000 if count else 0.0,
+            "latency_max_ms": self.latency_max * 1000,
+        }
+
+
+class SourceHub:
+    """把所有来源的状态汇合到管线的武器切换
+
+    Args:
+        pipeline: TriggerPipeline（解析武器、调度和应用切换）
+        capacity: 每个来源的队列长度
+    """
+
+    def __init__(self, pipeline, capacity=DEFAULT_CAPACITY):
+        self.pipeline = pipeline
+        self.capacity = max(1, capacity)
+        self.channels = {}      # 来源名称 -> SourceChannel
+        self.sources = []       # 有自己线程的来源（StateSource）
+        self._lock = threading.Lock()
+
+    def channel(self, name):
+        channel = self.channels.get(name)
+        if channel is None:
+            with self._lock:
+                channel = self.channels.get(name)
+                if channel is None:
+                    channel = SourceChannel(name, self.capacity)
+                    self.channels[name] = channel
+        return channel
+
+    def add_source(self, source):
+        """添加并启动一个来源"""
+        self.channel(source.name)
+        self.sources.append(source)
+        source.start(self)
+        self.pipeline.log(f"状态来源: {source.name}")
+        return source
+
+    def stop(self):
+        for source in self.sources:
+            source.stop()
+        self.sources = []
+
+    def publish(self, name, state, received_at=None, client=None):
+        """发布来源 name 观察到的状态（在来源的线程中调用），返回状态是否进入队列"""
+        if received_at is None:
+            received_at = time.perf_counter()
+        pipeline = self.pipeline
+        channel = self.channel(name)
+        channel.received.inc()
+
+        if isinstance(state, str) and not state.strip():
+            channel.unknown.inc()
+            pipeline.log(f"忽略空的武器名称 (来源 {name})")
+            return False
+        weapon = pipeline.resolve_weapon(state)
+        if weapon is None:
+            channel.unknown.inc()
+            pipeline.log(f"错误: 未知的武器 '{state}' (来源 {name})")
+            return False
+
+        with self._lock:
+            queue = channel.queue
+            if queue:
+                duplicate = queue[-1].weapon == weapon
+            else:
+                # 设备上已经是这把武器（没有过渡和其他写入）时不用再切换
+                duplicate = pipeline.current_weapon == weapon and pipeline.applied_profile is not None
+            if duplicate:
+                channel.deduped.inc()
+                return False
+
+            event = StateEvent(state, weapon, received_at, client)
+            brokered = client is not None and pipeline.broker
+            schedule = False
+            if not brokered:
+                if len(queue) >= channel.capacity:
+                    queue.popleft()
+                    channel.dropped.inc()
+                queue.append(event)
+                schedule = not channel.scheduled
+                channel.scheduled = True
+
+        # 新的状态到达时立即通知正在播放的序列停止，不等调度执行；不在这里等待序列线程退出
+        # （会阻塞其他来源），apply_weapon 写入之前会等待
+        pipeline.sequencer.cancel(timeout=0)
+        if brokered:
+            # 代理按客户端限流并只保留最新的命令
+            pipeline.broker.submit(client, lambda: self._apply(channel, event))
+        elif schedule:
+            pipeline.run_task(lambda: self._drain(channel))
+        return True
+
+    def _drain(self, channel):
+        """取出来源队列中最早的状态并应用（在执行武器切换的线程中）"""
+        with self._lock:
+            if not channel.queue:
+                channel.scheduled = False
+                return
+            event = channel.queue.popleft()
+            more = bool(channel.queue)
+            channel.scheduled = more
+        try:
+            self._apply(channel, event)
+        finally:
+            if more:
+                self.pipeline.run_task(lambda: self._drain(channel))
+
+    def _apply(self, channel, event):
+        try:
+            if self.pipeline.apply_state(channel.name, event):
+                channel.applied.inc()
+                channel.observe(time.perf_counter() - event.received_at)
+        except Exception as e:
+            self.pipeline.log(f"应用武器配置错误: {e}")
+            traceback.print_exc()
+
+    def stats(self):
+        """返回 {来源名称: 统计}"""
+        return {name: channel.stats() for name, channel in list(self.channels.items())}
+
+    def log_stats(self):
+        for name, stats in sorted(self.stats().items()):
+            self.pipeline.log(
+                f"来源 {name}: 收到 {stats['received']:.0f}, 应用 {stats['applied']:.0f}, "
+                f"重复 {stats['deduped']:.0f}, 丢弃 {stats['dropped']:.0f}, 未知 {stats['unknown']:.0f}, "
+                f"延迟 平均 {stats['latency_avg_ms']:.2f}ms / 最大 {stats['latency_max_ms']:.2f}ms")
+
+
+class StateSource:
+    """有自己后台线程的状态来源，子类实现 run()"""
+
+    def __init__(self, name):
+        self.name = name
+        self.hub = None
+        self.stopped = False
+        self._thread = None
+
+    def start(self, hub):
+        self.hub = hub
+        self.stopped = False
+        self._thread = threading.Thread(target=self._run, name=f"source-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stopped = True
+
+    def log(self, message):
+        self.hub.pipeline.log(message)
+
+    def publish(self, state, received_at=None):
+        return self.hub.publish(self.name, state, received_at)
+
+    def publish_line(self, line):
+        """发布一行文本（去掉空白，忽略空行）"""
+        state = line.decode("utf-8", "replace").strip() if isinstance(line, bytes) else line.strip()
+        if state:
+            self.publish(state)
+
+    def _run(self):
+        try:
+            self.run()
+        except Exception as e:
+            if not self.stopped:
+                self.log(f"状态来源 {self.name} 错误: {e}")
+                traceback.print_exc()
+
+    def run(self):
+        raise NotImplementedError
+
+
+class StreamSource(StateSource):
+    """从标准输入或命名管道逐行读取武器名称"""
+
+    def __init__(self, path=None):
+        super().__init__(f"pipe:{path}" if path else "stdin")
+        self.path = path
+
+    def run(self):
+        if self.path is None:
+            for line in sys.stdin.buffer:
+                if self.stopped:
+                    return
+                self.publish_line(line)
+            self.log("标准输入已关闭")
+            return
+        while not self.stopped:
+            # 命名管道的写入端全部关闭后读到文件结尾，重新打开等待下一个写入者
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if self.stopped:
+                        return
+                    self.publish_line(line)
+
+
+class FileTailSource(StateSource):
+    """跟踪文件末尾新写入的行（例如游戏日志）"""
+
+    def __init__(self, path, interval=TAIL_INTERVAL):
+        super().__init__(f"tail:{path}")
+        self.path = path
+        self.interval = interval
+
+    def run(self):
+        f, identity, buffer = None, None, b""
+        try:
+            while not self.stopped:
+                try:
+                    stat = os.stat(self.path)
+                except OSError:
+                    time.sleep(self.interval)
+                    continue
+                if f is None or (stat.st_dev, stat.st_ino) != identity or stat.st_size < f.tell():
+                    # 第一次打开时从末尾开始，文件被替换或截断后从头读取
+                    first = f is None and identity is None
+                    if f is not None:
+                        f.close()
+                    f = open(self.path, "rb")
+                    identity = (stat.st_dev, stat.st_ino)
+                    buffer = b""
+                    if first:
+                        f.seek(0, os.SEEK_END)
+                data = f.read()
+                if not data:
+                    time.sleep(self.interval)
+                    continue
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    self.publish_line(line)
+        finally:
+            if f is not None:
+                f.close()
+
+
+class BinaryUdpSource(StateSource):
+    """二进制UDP数据报：<2s "TW"> <B 版本> <B 保留> <H 武器序号>，序号为配置中武器列表的位置"""
+
+    def __init__(self, host="127.0.0.1", port=12346):
+        super().__init__(f"udp-bin:{port}")
+        self.host = host
+        self.port = port
+        self.socket = None
+
+    def run(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((self.host, self.port))
+        self.socket.settimeout(0.5)
+        self.log(f"二进制UDP来源已启动，监听 {self.host}:{self.socket.getsockname()[1]}")
+        try:
+            while not self.stopped:
+                try:
+                    data, _ = self.socket.recvfrom(64)
+                except socket.timeout:
+                    continue
+                received_at = time.perf_counter()
+                if len(data) != BINARY_STATE.size:
+                    continue
+                magic, version, _, index = BINARY_STATE.unpack(data)
+                if magic == BINARY_MAGIC and version == BINARY_VERSION:
+                    self.publish(index, received_at)
+        finally:
+            self.socket.close()
+
+
+def encode_binary_state(index):
+    """编码二进制UDP数据报（发送端使用）"""
+    return BINARY_STATE.pack(BINARY_MAGIC, BINARY_VERSION, 0, index)
+
+
+def _binary_udp_source(arg):
+    host, _, port = arg.rpartition(":")
+    return BinaryUdpSource(host or "127.0.0.1", int(port))
+
+
+def _python_source(arg):
+    target, _, param = arg.partition(":")
+    module_name, _, class_name = target.rpartition(".")
+    factory = getattr(importlib.import_module(module_name), class_name)
+    return factory(param) if param else factory()
+
+
+SOURCE_TYPES = {
+    "pipe": StreamSource,
+    "tail": FileTailSource,
+    "udp-bin": _binary_udp_source,
+    "py": _python_source,
+}
+
+
+def register_source_type(prefix, factory):
+    """注册新的来源规格前缀，factory(参数) 返回 StateSource"""
+    SOURCE_TYPES[prefix] = factory
+
+
+def make_source(spec):
+    """按规格字符串创建来源，格式错误时抛出 ValueError"""
+    spec = spec.strip()
+    if spec == "stdin":
+        return StreamSource()
+    prefix, _, arg = spec.partition(":")
+    factory = SOURCE_TYPES.get(prefix)
+    if factory is None or not arg:
+        raise ValueError(f"未知的状态来源: {spec}")
+    try:
+        return factory(arg)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"无法创建状态来源 {spec}: {e}")
@@ -0,0 +1,101 @@
+"""设备状态持久化
+
+把最后加载的配置路径、编译后的配置和最后应用的武器/模式/参数保存到一个小的状态文件，
+重新启动时在创建界面之前直接从状态文件恢复，不需要重新解析配置JSON。
+
+状态文件使用 marshal 格式（只含基本类型），先写入临时文件并 fsync，再用 os.replace
+原子替换，程序在写入过程中崩溃时旧的状态文件仍然完整。版本不匹配或文件损坏时忽略。
+"""
+import marshal
+import os
+import threading
+
+STATE_VERSION = 3
+DEFAULT_STATE_FILE = "trigger_state.bin"
+SAVE_DELAY = 0.5    # 状态变化后延迟写入（秒），合并连续的变化（拖动滑块、序列播放）
+
+
+def save_state(file_path, state):
+    """原子写入状态文件"""
+    data = marshal.dumps({"version": STATE_VERSION, "state": state})
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, file_path)
+
+
+def load_state(file_path):
+    """读取状态文件，文件不存在、损坏或版本不匹配时返回 None"""
+    try:
+        with open(file_path, "rb") as f:
+            data = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != STATE_VERSION:
+        return None
+    return data.get("state")
+
+
+class StateStore:
+    """把管线状态保存到状态文件
+
+    状态变化时只设置标志，由后台线程合并后写入，不阻塞武器切换和设备写入。
+    """
+
+    def __init__(self, pipeline, file_path=DEFAULT_STATE_FILE, save_delay=SAVE_DELAY):
+        self.pipeline = pipeline
+        self.file_path = file_path
+        self.save_delay = save_delay
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def restore(self):
+        """从状态文件恢复管线状态（不写入设备），返回是否成功"""
+        state = load_state(self.file_path)
+        if not state:
+            return False
+        try:
+            self.pipeline.restore_state(state)
+        except (KeyError, TypeError, ValueError) as e:
+            self.pipeline.log(f"状态文件无效，已忽略: {e}")
+            return False
+        return True
+
+    def attach(self):
+        """开始跟踪管线状态变化并在后台写入"""
+        pipeline = self.pipeline
+        pipeline.state_store = self
+        pipeline.state_listeners.append(self._dirty.set)
+        self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._dirty.wait()
+            if self._stop.wait(self.save_delay):
+                break
+            self.flush()
+
+    def flush(self):
+        """立即写入尚未保存的状态"""
+        with self._lock:
+            if not self._dirty.is_set():
+                return
+            self._dirty.clear()
+            try:
+                save_state(self.file_path, self.pipeline.export_state())
+            except OSError as e:
+                self.pipeline.log(f"保存状态文件失败: {e}")
+
+    def close(self):
+        """停止后台线程并写入最后的状态"""
+        self._stop.set()
+        self._dirty.set()   # 唤醒后台线程，同时保证下面一定写入一次
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+        self.flush()
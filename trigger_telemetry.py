@@ -0,0 +1,225 @@
+"""触发器遥测输入
+
+后台线程读取设备的遥测输入报告（CMD_TYPE_TELEMETRY），把扳机位置、力、模式和状态标志
+写入预先分配的环形缓冲区（array 列，每个样本不分配新对象），供界面实时显示；
+也可以把会话录制为紧凑的按列存储文件，之后用 read_telemetry 读取（可直接转换为 NumPy 数组）。
+
+输入报告格式（与命令帧相同，hidapi 不带报告ID时没有开头的0）:
+    [命令头 0xAA, 0x80, 数据长度, 位置, 力, 模式ID, 状态标志, 校验和, 命令尾 0x55, 填充...]
+
+录制文件格式:
+    文件头  b"TRGTEL1\\n" 和一行列定义 "time:d,position:B,...\\n"
+    数据块  <I 样本数> <I 丢失样本数> 之后依次为每一列的原始字节
+"""
+import struct
+import threading
+import time
+from array import array
+
+from trigger_schema import CMD_FOOTER, CMD_HEADER, CMD_TYPE_TELEMETRY
+
+# 列名和 array 类型码
+COLUMNS = (("time", "d"), ("position", "B"), ("force", "B"), ("mode", "B"), ("flags", "B"))
+DEFAULT_CAPACITY = 8192
+READ_TIMEOUT_MS = 50
+FLUSH_INTERVAL = 0.5        # 录制文件写入间隔（秒）
+
+MAGIC = b"TRGTEL1\n"
+BLOCK_HEADER = struct.Struct("<II")
+
+
+def decode_telemetry(report):
+    """解析遥测输入报告，返回 (位置, 力, 模式ID, 状态标志)，不是遥测报告时返回 None"""
+    if len(report) < 9:
+        return None
+    offset = 1 if report[0] == 0 and report[1] == CMD_HEADER else 0
+    if report[offset] != CMD_HEADER or report[offset + 1] != CMD_TYPE_TELEMETRY:
+        return None
+    length = report[offset + 2]
+    if length < 4 or len(report) < offset + 5 + length:
+        return None
+    position, force, mode, flags = report[offset + 3:offset + 7]
+    checksum = (CMD_TYPE_TELEMETRY + sum(report[offset + 3:offset + 3 + length])) & 0xFF
+    if report[offset + 3 + length] != checksum or report[offset + 4 + length] != CMD_FOOTER:
+        return None
+    return position, force, mode, flags
+
+
+class TelemetryBuffer:
+    """按列存储的环形缓冲区（单个写入线程）
+
+    count 为写入过的样本总数，第 i 个样本位于下标 i % capacity。
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.columns = {name: array(code, [0]) * capacity for name, code in COLUMNS}
+        self.time = self.columns["time"]
+        self.position = self.columns["position"]
+        self.force = self.columns["force"]
+        self.mode = self.columns["mode"]
+        self.flags = self.columns["flags"]
+        self.count = 0
+
+    def append(self, timestamp, position, force, mode, flags):
+        index = self.count % self.capacity
+        self.time[index] = timestamp
+        self.position[index] = position
+        self.force[index] = force
+        self.mode[index] = mode
+        self.flags[index] = flags
+        self.count += 1
+
+    def slice(self, name, start, stop):
+        """返回第 start 到 stop 个样本的一列（新的 array），start 不能早于 stop - capacity"""
+        column = self.columns[name]
+        first, last = start % self.capacity, stop % self.capacity
+        if stop - start == 0:
+            return column[:0]
+        if first < last:
+            return column[first:last]
+        return column[first:] + column[:last]
+
+    def latest(self, name, count):
+        """返回最近 count 个样本的一列"""
+        stop = self.count
+        start = max(0, stop - min(count, self.capacity))
+        return self.slice(name, start, stop)
+
+    def numpy(self, name):
+        """返回一列的 NumPy 视图（不复制，按缓冲区下标排列，需要 numpy）"""
+        import numpy
+        return numpy.frombuffer(self.columns[name], dtype=self.columns[name].typecode)
+
+
+class TelemetryRecorder:
+    """把缓冲区中的新样本按列追加写入文件（由读取线程定期调用 flush）"""
+
+    def __init__(self, file_path, buffer):
+        self.file_path = file_path
+        self.buffer = buffer
+        self.position = buffer.count      # 下一个要写入的样本
+        self.origin = time.perf_counter()
+        self.samples = 0
+        self.dropped = 0
+        self._file = open(file_path, "wb")
+        self._file.write(MAGIC)
+        self._file.write((",".join(f"{name}:{code}" for name, code in COLUMNS) + "\n").encode("ascii"))
+        self._lock = threading.Lock()
+
+    def flush(self):
+        with self._lock:
+            if self._file is None:
+                return
+            buffer = self.buffer
+            stop = buffer.count
+            start = max(self.position, stop - buffer.capacity)
+            dropped = start - self.position
+            self.position = stop
+            if stop == start and not dropped:
+                return
+            self._file.write(BLOCK_HEADER.pack(stop - start, dropped))
+            for name, _ in COLUMNS:
+                column = buffer.slice(name, start, stop)
+                if name == "time":
+                    column = array("d", (value - self.origin for value in column))
+                self._file.write(column.tobytes())
+            self._file.flush()
+            self.samples += stop - start
+            self.dropped += dropped
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_telemetry(file_path):
+    """读取遥测录制文件，返回 ({列名: array}, 丢失样本数)"""
+    with open(file_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是遥测录制文件: {file_path}")
+        columns = [item.split(":") for item in f.readline().decode("ascii").strip().split(",")]
+        result = {name: array(code) for name, code in columns}
+        dropped = 0
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                break
+            count, block_dropped = BLOCK_HEADER.unpack(header)
+            dropped += block_dropped
+            for name, code in columns:
+                column = result[name]
+                data = f.read(count * column.itemsize)
+                if len(data) < count * column.itemsize:
+                    return result, dropped
+                column.frombytes(data)
+    return result, dropped
+
+
+class TelemetryReader:
+    """读取遥测输入报告的后台线程"""
+
+    def __init__(self, device, buffer=None):
+        self.device = device
+        self.buffer = buffer or TelemetryBuffer()
+        self.recorder = None
+        self.reports = 0
+        self.invalid = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self.device.input_reader = self
+        self._thread = threading.Thread(target=self._run, name="hid-telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+        if self.device.input_reader is self:
+            self.device.input_reader = None
+        self.stop_recording()
+
+    def start_recording(self, file_path):
+        self.stop_recording()
+        self.recorder = TelemetryRecorder(file_path, self.buffer)
+        return self.recorder
+
+    def stop_recording(self):
+        recorder = self.recorder
+        self.recorder = None
+        if recorder is not None:
+            recorder.close()
+        return recorder
+
+    def _run(self):
+        buffer = self.buffer
+        read_report = self.device.read_report
+        perf_counter = time.perf_counter
+        next_flush = perf_counter() + FLUSH_INTERVAL
+        while not self._stop.is_set():
+            report = read_report(64, READ_TIMEOUT_MS)
+            now = perf_counter()
+            if report is None:
+                # 设备未连接
+                self._stop.wait(0.2)
+            elif report:
+                sample = decode_telemetry(report)
+                if sample is None:
+                    # 命令的应答转交给等待的 request，其他报告计为无效
+                    if not self.device.deliver_input(report):
+                        self.invalid += 1
+                else:
+                    buffer.append(now, *sample)
+                    self.reports += 1
+            if now >= next_flush:
+                next_flush = now + FLUSH_INTERVAL
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.flush()
@@ -0,0 +1,200 @@
+"""触发器切换延迟追踪
+
+在预分配的环形缓冲区中记录各处理阶段的单调时钟区间（UDP接收、handle_udp_data、
+root.after跳转、apply_weapon_config、每次send_hid_report及其后的延时），
+每次武器切换分配一个关联ID，最终导出为 Chrome Trace Event 格式，
+可直接拖入 Perfetto (https://ui.perfetto.dev) 或 chrome://tracing 查看。
+
+未启用时，span() 返回共享的空上下文，record() 只做一次布尔判断。
+"""
+import itertools
+import os
+import threading
+import time
+from array import array
+
+# 默认缓冲区容量（条目数），写满后循环覆盖最旧的记录
+DEFAULT_CAPACITY = 65536
+
+
+class _NullSpan:
+    """追踪关闭时使用的空区间"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """记录一个阶段的开始和结束时间"""
+    __slots__ = ("recorder", "name", "cid", "start")
+
+    def __init__(self, recorder, name, cid):
+        self.recorder = recorder
+        self.name = name
+        self.cid = cid
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self.name, self.start, time.perf_counter_ns(), self.cid)
+        return False
+
+
+class TraceRecorder:
+    """低开销的阶段追踪器
+
+    每条记录占用环形缓冲区中的一个槽位：名称、开始时间(ns)、持续时间(ns)、
+    关联ID和线程ID。缓冲区在首次 enable() 时一次性分配，记录时不再分配内存。
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.enabled = False
+        self.capacity = capacity
+        self._names = None
+        self._written = 0
+        self._cid_counter = itertools.count(1)
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+    def _allocate(self, capacity):
+        """预分配缓冲区"""
+        self.capacity = capacity
+        self._names = [None] * capacity
+        self._starts = array("q", bytes(8 * capacity))
+        self._durations = array("q", bytes(8 * capacity))
+        self._cids = array("q", bytes(8 * capacity))
+        self._tids = array("q", bytes(8 * capacity))
+        # itertools.count 的 next() 在GIL下是原子的，多线程写入无需加锁
+        self._cursor = itertools.count()
+        self._written = 0
+
+    def enable(self, capacity=None):
+        """启用追踪（可选重新指定缓冲区容量）"""
+        if self._names is None or (capacity and capacity != self.capacity):
+            self._allocate(capacity or self.capacity)
+        self.enabled = True
+
+    def disable(self):
+        """停止追踪，已记录的数据保留"""
+        self.enabled = False
+
+    def clear(self):
+        """清空已记录的数据"""
+        if self._names is None:
+            return
+        self._cursor = itertools.count()
+        self._written = 0
+
+    def now(self):
+        """返回单调时钟时间（纳秒）"""
+        return time.perf_counter_ns()
+
+    def new_correlation(self):
+        """为一次新的武器切换分配关联ID，并设为当前线程的关联ID"""
+        cid = next(self._cid_counter)
+        self._local.cid = cid
+        return cid
+
+    def set_correlation(self, cid):
+        """在另一个线程中继续同一次切换时设置关联ID"""
+        self._local.cid = cid
+
+    def current_correlation(self):
+        """当前线程的关联ID（没有则为0）"""
+        return getattr(self._local, "cid", 0)
+
+    def span(self, name, cid=None):
+        """返回记录一个阶段的上下文管理器"""
+        if not self.enabled:
+            return _NULL_SPAN
+        if cid is None:
+            cid = getattr(self._local, "cid", 0)
+        return _Span(self, name, cid)
+
+    def record(self, name, start_ns, end_ns=None, cid=None):
+        """直接记录一个区间（用于跨线程或无法使用with的阶段）"""
+        if not self.enabled:
+            return
+        if end_ns is None:
+            end_ns = time.perf_counter_ns()
+        if cid is None:
+            cid = getattr(self._local, "cid", 0)
+        index = next(self._cursor)
+        slot = index % self.capacity
+        self._names[slot] = name
+        self._starts[slot] = start_ns
+        self._durations[slot] = end_ns - start_ns
+        self._cids[slot] = cid
+        self._tids[slot] = threading.get_native_id()
+        self._written = index + 1
+
+    def events(self):
+        """按写入顺序返回缓冲区中的记录 (name, start_ns, dur_ns, cid, tid)"""
+        total = self._written
+        if self._names is None:
+            return []
+        count = min(total, self.capacity)
+        result = []
+        for index in range(total - count, total):
+            slot = index % self.capacity
+            result.append((
+                self._names[slot],
+                self._starts[slot],
+                self._durations[slot],
+                self._cids[slot],
+                self._tids[slot],
+            ))
+        return result
+
+    def to_chrome_trace(self):
+        """转换为 Chrome Trace Event 格式的字典"""
+        pid = os.getpid()
+        thread_names = {t.native_id: t.name for t in threading.enumerate()}
+        trace_events = []
+        seen_tids = set()
+
+        for name, start, duration, cid, tid in self.events():
+            if tid not in seen_tids:
+                seen_tids.add(tid)
+                trace_events.append({
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": thread_names.get(tid, f"thread-{tid}")},
+                })
+            trace_events.append({
+                "name": name,
+                "cat": "trigger",
+                "ph": "X",
+                "ts": (start - self._origin) / 1000.0,
+                "dur": duration / 1000.0,
+                "pid": pid,
+                "tid": tid,
+                "args": {"cid": cid},
+            })
+
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, file_path):
+        """导出为 Chrome Trace Event JSON 文件，返回导出的事件数"""
+        import json
+
+        trace = self.to_chrome_trace()
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+        return len(trace["traceEvents"])
+
+
+# 全局追踪器，默认关闭
+TRACER = TraceRecorder()